@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from api import models
+
+MAX_RATING = 10
+
+SUMMARY_FIELDS = ["rating_count", "rating_mean", "rating_histogram"]
+
+# Written along with the summaries, which are part of the movie document.
+VERSION_FIELDS = ["version", "updated_at"]
+
+
+def histogram_of(values):
+    histogram = models.empty_rating_histogram()
+    for value in values:
+        histogram[min(max(value, 0), MAX_RATING)] += 1
+    return histogram
+
+
+def set_histogram(movie, histogram):
+    """
+    Store ``histogram`` on ``movie`` along with the count and mean derived from it.
+    """
+    count = sum(histogram)
+    movie.rating_histogram = histogram
+    movie.rating_count = count
+    movie.rating_mean = (
+        sum(value * n for value, n in enumerate(histogram)) / count if count else None
+    )
+
+
+def bump_version(movie):
+    movie.version = F("version") + 1
+    movie.updated_at = timezone.now()
+
+
+def adjust(histogram, added=(), removed=()):
+    """
+    Copy of ``histogram`` with the ``added`` values counted and ``removed`` ones
+    uncounted.
+    """
+    histogram = list(histogram)
+    for value in added:
+        histogram[value] += 1
+    for value in removed:
+        histogram[value] = max(histogram[value] - 1, 0)
+    return histogram
+
+
+def summary(movie):
+    return summary_of(movie.rating_count, movie.rating_mean, movie.rating_histogram)
+
+
+def summary_of(count, mean, histogram):
+    """
+    Rating summary from the values of the ``SUMMARY_FIELDS`` columns.
+    """
+    return {"count": count, "mean": mean, "histogram": histogram}
+
+
+def apply(movie_id, added=(), removed=()):
+    """
+    Incrementally update the rating summary of a movie.
+    """
+    apply_many({movie_id: (added, removed)})
+
+
+@transaction.atomic
+def apply_many(changes):
+    """
+    Incrementally update rating summaries from ``{movie_id: (added, removed)}``.
+    """
+    movies = list(
+        models.Movie.objects.select_for_update()
+        .only("id", *SUMMARY_FIELDS)
+        .filter(id__in=changes.keys())
+    )
+    for movie in movies:
+        set_histogram(movie, adjust(movie.rating_histogram, *changes[movie.id]))
+        bump_version(movie)
+
+    models.Movie.objects.bulk_update(movies, SUMMARY_FIELDS + VERSION_FIELDS)
+
+
+def rebuild(movie_ids):
+    """
+    Recompute the rating summaries of the given movies from their ratings.
+    """
+    histograms = {movie_id: models.empty_rating_histogram() for movie_id in movie_ids}
+    rows = (
+        models.Rating.objects.filter(movie_id__in=histograms.keys())
+        .values("movie_id", "value")
+        .annotate(n=Count("id"))
+        .values_list("movie_id", "value", "n")
+    )
+    for movie_id, value, n in rows:
+        histograms[movie_id][min(max(value, 0), MAX_RATING)] += n
+
+    movies = []
+    for movie_id, histogram in histograms.items():
+        movie = models.Movie(id=movie_id)
+        set_histogram(movie, histogram)
+        bump_version(movie)
+        movies.append(movie)
+    models.Movie.objects.bulk_update(movies, SUMMARY_FIELDS + VERSION_FIELDS)
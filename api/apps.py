@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # Connects the receivers dropping the cached flags of saved users.
+        from api import authentication  # noqa: F401
@@ -0,0 +1,125 @@
+"""
+Native async versions of the hot read endpoints, for ASGI deployments.
+
+They reuse the DRF viewsets for authentication, permissions, pagination and
+rendering, but run as coroutines: the per-page lookups that do not depend on
+each other (cached movie payloads, favorites, user ratings) are awaited
+concurrently in worker threads, each with its own database connection.
+"""
+
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.response import Response
+
+from api import conditional
+from api import serializers
+from api import views
+
+
+def _in_thread(func):
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def async_action(viewset_class, action):
+    """
+    Turn ``handler(view, request, **kwargs)`` into an async Django view served
+    like ``action`` of ``viewset_class``.
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def view(request, **kwargs):
+            viewset = viewset_class(
+                action_map={"get": action, "head": action},
+                format_kwarg=None,
+                args=(),
+                kwargs=kwargs,
+            )
+            viewset.headers = viewset.default_response_headers
+            request = viewset.request = viewset.initialize_request(request, **kwargs)
+
+            try:
+                if request.method not in ("GET", "HEAD"):
+                    raise MethodNotAllowed(request.method)
+                await sync_to_async(viewset.initial)(request, **kwargs)
+                response = await handler(viewset, request, **kwargs)
+            except Exception as exc:
+                response = viewset.handle_exception(exc)
+
+            response = viewset.finalize_response(request, response, **kwargs)
+            if isinstance(response, Response):
+                response.render()
+            return response
+
+        return view
+
+    return decorator
+
+
+async def _nothing():
+    return None
+
+
+async def _serialize_movies(view, movie_ids, versions=None):
+    fields = view.movie_fields()
+    user = view.request.user
+    payloads, favorites, rates = await asyncio.gather(
+        _in_thread(view.movie_payloads)(movie_ids, fields, versions),
+        (
+            _in_thread(serializers.favorite_ids)(user, movie_ids)
+            if fields is None or "favorite" in fields
+            else _nothing()
+        ),
+        (
+            _in_thread(serializers.user_rates)(user, movie_ids)
+            if fields is None or "user_rate" in fields
+            else _nothing()
+        ),
+    )
+    return serializers.add_user_state(payloads, favorites, rates)
+
+
+@async_action(views.MovieViewSet, "list")
+async def movie_list(view, request):
+    page = await sync_to_async(view.list_page)()
+    results = await _serialize_movies(view, page["results"])
+    return Response({**page, "results": results})
+
+
+@async_action(views.MovieViewSet, "retrieve")
+async def movie_detail(view, request, pk):
+    movie_id = view.get_movie_id()
+    row = await sync_to_async(view.movie_version)(movie_id)
+    if row is None:
+        raise Http404
+    validators = await sync_to_async(view.detail_validators)(movie_id, *row)
+
+    response = conditional.not_modified(request, *validators)
+    if response is None:
+        payloads = await _serialize_movies(view, [movie_id], {movie_id: row[0]})
+        if not payloads:
+            raise Http404
+        response = Response(payloads[0])
+    response = conditional.with_validators(response, *validators)
+    return conditional.private(response)
+
+
+@async_action(views.MovieViewSet, "favorites")
+async def movie_favorites(view, request):
+    movie_ids = await sync_to_async(view.favorites_page)()
+    results = await _serialize_movies(view, movie_ids)
+    return view.get_paginated_response(results)
+
+
+@async_action(views.GenresViewSet, "list")
+async def genre_list(view, request):
+    validators = await sync_to_async(view.list_validators)()
+    response = conditional.not_modified(request, *validators)
+    if response is None:
+        genres = await sync_to_async(list)(view.get_queryset())
+        response = Response(view.get_serializer(genres, many=True).data)
+    return conditional.with_validators(response, *validators)
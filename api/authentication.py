@@ -0,0 +1,103 @@
+"""
+JWT authentication that does not load the user row on every request.
+
+What the permission checks need, whether the account still exists and is
+active and whether it is staff or superuser, is read from the database and
+cached for ``AUTH_USER_CHECK_TTL`` seconds. Saving or deleting a user drops
+its cached flags, so deactivating or demoting it takes effect on its next
+request in this process, and within that delay in the others.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+FLAGS = ["is_active", "is_staff", "is_superuser"]
+
+
+def _flags_key(user_id):
+    return f"auth:flags:{user_id}"
+
+
+def user_flags(user_id):
+    """
+    ``{flag: bool}`` of ``FLAGS`` for a user, all false if it does not exist,
+    cached for ``AUTH_USER_CHECK_TTL``.
+    """
+    key = _flags_key(user_id)
+    flags = cache.get(key)
+    if flags is None:
+        row = (
+            get_user_model()
+            .objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values_list(*FLAGS)
+            .first()
+        )
+        flags = dict(zip(FLAGS, row or [False] * len(FLAGS)))
+        cache.set(key, flags, settings.AUTH_USER_CHECK_TTL)
+    return flags
+
+
+def forget_user(user_id):
+    cache.delete(_flags_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def _forget_saved_user(sender, instance, **kwargs):
+    forget_user(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+class ClaimsUser(TokenUser):
+    """
+    User built from the token and the cached flags. Anything else, such as
+    ``email`` or the related managers, is read from the user row, loaded on
+    first use.
+    """
+
+    def __init__(self, token, flags):
+        super().__init__(token)
+        self.flags = flags
+
+    @cached_property
+    def user(self):
+        return get_user_model().objects.get(**{api_settings.USER_ID_FIELD: self.id})
+
+    @property
+    def is_staff(self):
+        return self.flags["is_staff"]
+
+    @property
+    def is_superuser(self):
+        return self.flags["is_superuser"]
+
+    @cached_property
+    def username(self):
+        return self.user.username
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name in ("token", "flags"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        flags = user_flags(user_id)
+        if not flags["is_active"]:
+            raise AuthenticationFailed(
+                "User not found or inactive", code="user_inactive"
+            )
+
+        return ClaimsUser(validated_token, flags)
@@ -0,0 +1,280 @@
+"""
+In-memory prefix index of movie titles and actor names for typeahead.
+
+Every title is indexed under each of its word starts ("the godfather" and
+"godfather"), every actor under their name, as normalized keys in a sorted
+list: the suggestions for a prefix are the contiguous run found by bisection,
+ranked by popularity. A movie's popularity is its number of ratings plus its
+number of favorites, an actor's the sum of the popularity of their movies.
+
+Like ``api.catalog``, the index is built lazily and kept up to date by the
+write paths of this process. After ``AUTOCOMPLETE_INDEX_MAX_AGE`` seconds, to
+pick up writes made by other processes, a background thread builds a new index
+while the old one keeps serving, and swaps it in once it has caught up with the
+writes made in the meantime.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from api import models
+
+logger = logging.getLogger(__name__)
+
+MOVIE = "movie"
+ACTOR = "actor"
+
+_END = "\U0010ffff"
+# Up to this many new keys are inserted one by one, more are merged by sorting.
+INSORT_MAX = 64
+
+
+def normalize(text):
+    """
+    Case and accent insensitive form of ``text``, words separated by a space.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join(
+        "".join(char for char in decomposed if not unicodedata.combining(char)).split()
+    )
+
+
+def word_starts(text):
+    words = normalize(text).split(" ")
+    return {" ".join(words[start:]) for start in range(len(words)) if words[start]}
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self.built_at = time.monotonic()
+        self.keys = {MOVIE: [], ACTOR: []}
+        self.names = {MOVIE: {}, ACTOR: {}}
+        self.popularity = {MOVIE: {}, ACTOR: {}}
+        self.movie_actors = {}
+        self._suggestions = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        entries = []
+        for actor_id, name in models.Actor.objects.values_list("id", "name"):
+            entries += index._add(ACTOR, actor_id, name)
+        index._insert_keys(ACTOR, entries)
+        index.add_movies(models.Movie.objects.all())
+        return index
+
+    def _add(self, kind, item_id, name):
+        """
+        Register an item and return its ``(key, item_id)`` entries, for
+        ``_insert_keys``.
+        """
+        self.names[kind][item_id] = name
+        self.popularity[kind].setdefault(item_id, 0)
+        keys = word_starts(name) if kind == MOVIE else {normalize(name)}
+        return [(key, item_id) for key in keys]
+
+    def _insert_keys(self, kind, entries):
+        keys = self.keys[kind]
+        if len(entries) <= INSORT_MAX:
+            for entry in entries:
+                bisect.insort(keys, entry)
+        else:
+            # Timsort merges the sorted run already there with the new one.
+            keys.extend(entries)
+            keys.sort()
+
+    def _remove(self, kind, item_id):
+        name = self.names[kind].pop(item_id)
+        del self.popularity[kind][item_id]
+        keys = self.keys[kind]
+        for key in word_starts(name) if kind == MOVIE else {normalize(name)}:
+            position = bisect.bisect_left(keys, (key, item_id))
+            if position < len(keys) and keys[position] == (key, item_id):
+                del keys[position]
+
+    def add_movies(self, movies):
+        favorites = dict(
+            models.Movie.user_favorites.through.objects.filter(movie__in=movies)
+            .values("movie_id")
+            .annotate(n=Count("id"))
+            .values_list("movie_id", "n")
+        )
+        actors = {}
+        rows = models.Movie.actors.through.objects.filter(movie__in=movies)
+        for movie_id, actor_id, name in rows.values_list(
+            "movie_id", "actor_id", "actor__name"
+        ):
+            actors.setdefault(movie_id, []).append((actor_id, name))
+
+        entries = {MOVIE: [], ACTOR: []}
+        for movie_id, title, rating_count in movies.values_list(
+            "id", "title", "rating_count"
+        ):
+            entries[MOVIE] += self._add(MOVIE, movie_id, title)
+            self.movie_actors[movie_id] = []
+            for actor_id, name in actors.get(movie_id, []):
+                if actor_id not in self.names[ACTOR]:
+                    entries[ACTOR] += self._add(ACTOR, actor_id, name)
+                self.movie_actors[movie_id].append(actor_id)
+            self.adjust_popularity(movie_id, rating_count + favorites.get(movie_id, 0))
+        for kind, kind_entries in entries.items():
+            self._insert_keys(kind, kind_entries)
+        self._suggestions.clear()
+
+    def remove_movies(self, movie_ids):
+        for movie_id in movie_ids:
+            if movie_id in self.names[MOVIE]:
+                self.adjust_popularity(movie_id, -self.popularity[MOVIE][movie_id])
+                self._remove(MOVIE, movie_id)
+                del self.movie_actors[movie_id]
+        self._suggestions.clear()
+
+    def adjust_popularity(self, movie_id, delta):
+        if movie_id not in self.names[MOVIE] or not delta:
+            return
+
+        self.popularity[MOVIE][movie_id] += delta
+        for actor_id in self.movie_actors[movie_id]:
+            self.popularity[ACTOR][actor_id] += delta
+        self._suggestions.clear()
+
+    def suggest(self, kind, prefix, limit):
+        """
+        The ``limit`` most popular ``{"id", "name"}`` of ``kind`` matching
+        ``prefix``, cached until the next change.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        cache_key = (kind, prefix, limit)
+        if cache_key not in self._suggestions:
+            keys = self.keys[kind]
+            start = bisect.bisect_left(keys, (prefix,))
+            end = bisect.bisect_left(keys, (prefix + _END,), start)
+            popularity = self.popularity[kind]
+            names = self.names[kind]
+            matches = {item_id for _, item_id in keys[start:end]}
+            top = heapq.nsmallest(
+                limit,
+                matches,
+                key=lambda item_id: (-popularity[item_id], names[item_id], item_id),
+            )
+            self._suggestions[cache_key] = [
+                {"id": item_id, "name": names[item_id]} for item_id in top
+            ]
+        return self._suggestions[cache_key]
+
+
+_index = None
+_lock = threading.Lock()
+# The thread building the next index, and the ids written since it started.
+_builder = None
+_changed = set()
+
+
+def _rebuild():
+    global _index, _builder
+
+    try:
+        index = AutocompleteIndex.build()
+        while True:
+            with _lock:
+                if _builder is not threading.current_thread():
+                    return
+                if not _changed:
+                    _index, _builder = index, None
+                    return
+                changed = set(_changed)
+                _changed.clear()
+            # Re-read from the database, popularity included.
+            index.remove_movies(changed)
+            index.add_movies(models.Movie.objects.filter(id__in=changed))
+    except Exception:
+        logger.exception("Could not rebuild the autocomplete index")
+        with _lock:
+            if _builder is threading.current_thread():
+                # Retry once the index is stale again.
+                _index.built_at = time.monotonic()
+                _builder = None
+    finally:
+        connection.close()
+
+
+def _current():
+    """
+    The index, built on first use. A stale index keeps serving while its
+    replacement is built in the background.
+    """
+    global _index, _builder
+
+    if _index is None:
+        _index = AutocompleteIndex.build()
+    elif _builder is None:
+        if time.monotonic() - _index.built_at > settings.AUTOCOMPLETE_INDEX_MAX_AGE:
+            _changed.clear()
+            _builder = threading.Thread(
+                target=_rebuild, name="autocomplete-index-builder", daemon=True
+            )
+            _builder.start()
+    return _index
+
+
+def suggest(prefix, limit):
+    """
+    Title and actor suggestions for ``prefix``, most popular first.
+    """
+    with _lock:
+        index = _current()
+        return {
+            "titles": index.suggest(MOVIE, prefix, limit),
+            "actors": index.suggest(ACTOR, prefix, limit),
+        }
+
+
+def update_movies(movie_ids):
+    """
+    Re-index the given movies after they were created or changed.
+    """
+    with _lock:
+        if _builder is not None:
+            _changed.update(movie_ids)
+        if _index is not None:
+            _index.remove_movies(movie_ids)
+            _index.add_movies(models.Movie.objects.filter(id__in=movie_ids))
+
+
+def remove_movies(movie_ids):
+    with _lock:
+        if _builder is not None:
+            _changed.update(movie_ids)
+        if _index is not None:
+            _index.remove_movies(movie_ids)
+
+
+def adjust_popularity(deltas):
+    """
+    Apply ``{movie_id: delta}`` changes of rating or favorite counts.
+    """
+    with _lock:
+        if _builder is not None:
+            _changed.update(deltas)
+        if _index is not None:
+            for movie_id, delta in deltas.items():
+                _index.adjust_popularity(movie_id, delta)
+
+
+def reset():
+    global _index, _builder
+
+    with _lock:
+        _index = _builder = None
+        _changed.clear()
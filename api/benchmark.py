@@ -0,0 +1,362 @@
+"""
+Endpoint benchmarks on a seeded synthetic catalog.
+
+``seed_catalog`` bulk loads a reproducible catalog of movies, actors, genres,
+users, ratings and favorites. ``run`` replays the requests of ``SCENARIOS``
+through the test client, recording the latency and the number of SQL queries
+of each, and ``check`` compares the results with the query budget and p95
+latency ceiling of every scenario, and optionally with a saved baseline.
+Used by the ``benchmark_endpoints`` command and ``BenchmarkTestCase``.
+"""
+
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import aggregates
+from api import favorites
+from api import importer
+from api import ingest
+from api import models
+
+BATCH_SIZE = 500
+USERNAME_PREFIX = "benchmark-user-"
+
+SIZES = {
+    "movies": 1000,
+    "actors": 2000,
+    "genres": 20,
+    "users": 200,
+    "ratings": 20000,
+    "favorites": 5000,
+}
+
+WORDS = (
+    "night day city river storm silent broken golden last lost secret dark "
+    "wild iron crimson frozen hidden empire shadow kingdom journey promise "
+    "summer winter ghost heart fire stone garden ocean"
+).split()
+
+
+class Catalog:
+    """
+    Ids and names of a seeded catalog, for scenarios to pick from.
+    """
+
+    def __init__(self, movie_ids, genres, users, admin):
+        self.movie_ids = movie_ids
+        self.genres = genres
+        self.users = users
+        self.admin = admin
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def movie_record(rng, number, genres, actors):
+    """
+    A bulk_load record of a random movie.
+    """
+    year = rng.randint(1930, 2020)
+    return {
+        "title": f"{' '.join(rng.sample(WORDS, 3)).title()} {number}",
+        "year": str(year),
+        "genres": rng.sample(genres, min(len(genres), rng.randint(1, 3))),
+        "ratings": [],
+        "poster": f"movie-{number}.jpg",
+        "content_rating": rng.choice(["G", "PG", "PG-13", "R"]),
+        "duration": f"PT{rng.randint(80, 180)}M",
+        "release_date": f"{year}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}",
+        "average_rating": round(rng.uniform(1, 10), 1),
+        "original_title": "",
+        "storyline": " ".join(rng.choices(WORDS, k=12)).capitalize() + ".",
+        "actors": rng.sample(actors, min(len(actors), rng.randint(2, 6))),
+        "imdb_rating": str(round(rng.uniform(1, 10), 1)),
+        "posterurl": f"https://example.com/movie-{number}.jpg",
+    }
+
+
+def _pairs(rng, count, user_ids, movie_ids):
+    """
+    ``count`` distinct random ``(user_id, movie_id)`` pairs, fewer if there
+    are not as many.
+    """
+    count = min(count, len(user_ids) * len(movie_ids))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.choice(user_ids), rng.choice(movie_ids)))
+    return sorted(pairs)
+
+
+def seed_catalog(sizes=None, seed=0):
+    """
+    Create a reproducible catalog (for a given ``seed``) of ``SIZES``, updated
+    with ``sizes``, and return its ``Catalog``. Movies go through the
+    validation and bulk insert of ``import_movies``, the rest is inserted in
+    bulk.
+    """
+    sizes = {**SIZES, **(sizes or {})}
+    rng = random.Random(seed)
+    genres = [f"Genre {number}" for number in range(sizes["genres"])]
+    actors = [f"Actor {number}" for number in range(sizes["actors"])]
+
+    records = [
+        movie_record(rng, number, genres, actors) for number in range(sizes["movies"])
+    ]
+    valid, rejected = importer.validate(records)
+    if rejected:
+        raise ValueError(f"Invalid synthetic records: {rejected[:3]}")
+    movie_ids = sorted(movie.id for movie in ingest.load_movies(valid))
+
+    password = make_password(None)
+    User.objects.bulk_create(
+        [
+            User(username=f"{USERNAME_PREFIX}{number}", password=password)
+            for number in range(sizes["users"])
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = sorted(
+        User.objects.filter(username__startswith=USERNAME_PREFIX).values_list(
+            "id", flat=True
+        )
+    )
+    admin = User.objects.create_superuser(f"{USERNAME_PREFIX}admin", password=None)
+
+    pairs = _pairs(rng, sizes["ratings"], user_ids, movie_ids)
+    models.Rating.objects.bulk_create(
+        [
+            models.Rating(user_id=user_id, movie_id=movie_id, value=rng.randint(0, 10))
+            for user_id, movie_id in pairs
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    pairs = _pairs(rng, sizes["favorites"], user_ids, movie_ids)
+    favorites.Favorite.objects.bulk_create(
+        [
+            favorites.Favorite(user_id=user_id, movie_id=movie_id)
+            for user_id, movie_id in pairs
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    for chunk in _chunks(movie_ids):
+        aggregates.rebuild(chunk)
+        favorites.recount(chunk)
+    return Catalog(movie_ids, genres, user_ids, admin)
+
+
+class Scenario:
+    """
+    Requests of one endpoint: ``request(client, catalog, iteration)`` makes
+    the ``iteration``-th one. ``queries`` is the budget of SQL queries per
+    request and ``p95_ms`` the ceiling of the 95th percentile latency, both
+    checked with an empty cache before every request.
+    """
+
+    def __init__(self, name, request, queries, p95_ms, admin=False):
+        self.name = name
+        self.request = request
+        self.queries = queries
+        self.p95_ms = p95_ms
+        self.admin = admin
+
+
+def _list(client, catalog, iteration):
+    pages = max(len(catalog.movie_ids) // settings.REST_FRAMEWORK["PAGE_SIZE"], 1)
+    return client.get(reverse("movies-list"), {"page": iteration % min(pages, 5) + 1})
+
+
+def _search(client, catalog, iteration):
+    return client.get(reverse("movies-list"), {"q": WORDS[iteration % len(WORDS)]})
+
+
+def _genre_filter(client, catalog, iteration):
+    genre = catalog.genres[iteration % len(catalog.genres)]
+    return client.get(reverse("movies-list"), {"genre": genre})
+
+
+def _movie_id(catalog, iteration):
+    return catalog.movie_ids[iteration * 7919 % len(catalog.movie_ids)]
+
+
+def _detail(client, catalog, iteration):
+    movie_id = _movie_id(catalog, iteration)
+    return client.get(reverse("movies-detail", args=[movie_id]))
+
+
+def _favorites(client, catalog, iteration):
+    return client.get(reverse("movies-favorites"))
+
+
+def _rate(client, catalog, iteration):
+    movie_id = _movie_id(catalog, iteration)
+    url = reverse("movies-rate", args=[movie_id])
+    return client.put(url, {"rate": iteration % 11}, format="json")
+
+
+def _bulk_load(client, catalog, iteration):
+    rng = random.Random(iteration)
+    records = [
+        movie_record(rng, f"bulk-{iteration}-{number}", catalog.genres, ["Actor 0"])
+        for number in range(10)
+    ]
+    return client.post(reverse("movies-bulk-load"), records, format="json")
+
+
+# Budgets are the most queries a request may make; latency ceilings leave room
+# for slow machines.
+SCENARIOS = [
+    Scenario("list", _list, queries=9, p95_ms=50),
+    Scenario("search", _search, queries=9, p95_ms=50),
+    Scenario("genre_filter", _genre_filter, queries=9, p95_ms=50),
+    Scenario("detail", _detail, queries=8, p95_ms=30),
+    Scenario("favorites", _favorites, queries=7, p95_ms=30),
+    Scenario("rate", _rate, queries=13, p95_ms=50),
+    # 14, and 3 more per relation (genres, actors) naming new rows.
+    Scenario("bulk_load", _bulk_load, queries=20, p95_ms=100, admin=True),
+]
+
+
+class Result:
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+
+    def percentile(self, percent):
+        """
+        Latency in ms below which ``percent`` % of the requests completed.
+        """
+        if len(self.latencies) < 2:
+            return self.latencies[0] * 1000 if self.latencies else 0.0
+        cuts = statistics.quantiles(self.latencies, n=100, method="inclusive")
+        return cuts[percent - 1] * 1000
+
+    @property
+    def throughput(self):
+        """
+        Requests per second of one client.
+        """
+        return len(self.latencies) / sum(self.latencies) if self.latencies else 0.0
+
+    @property
+    def max_queries(self):
+        return max(self.queries, default=0)
+
+    def summary(self):
+        return {
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "throughput": self.throughput,
+            "queries": self.max_queries,
+        }
+
+
+def run(catalog, scenarios=None, iterations=50, warmup=5, cold=True):
+    """
+    Make ``warmup`` then ``iterations`` requests of every scenario and return
+    their ``Result``. With ``cold``, the cache is cleared before every request,
+    so every request does all its work.
+    """
+    clients = {}
+    for admin in (False, True):
+        user = catalog.admin if admin else User.objects.get(id=catalog.users[0])
+        clients[admin] = APIClient()
+        token = RefreshToken.for_user(user).access_token
+        clients[admin].credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    results = []
+    for scenario in scenarios or SCENARIOS:
+        client = clients[scenario.admin]
+        result = Result(scenario)
+        for iteration in range(warmup + iterations):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = scenario.request(client, catalog, iteration)
+                elapsed = time.perf_counter() - started
+            if iteration < warmup:
+                continue
+            result.latencies.append(elapsed)
+            result.queries.append(len(queries))
+            result.errors += response.status_code >= 400
+        results.append(result)
+    return results
+
+
+def report(results):
+    """
+    Lines of a table of the results.
+    """
+    lines = [
+        f"{'scenario':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>9}"
+        f"{'queries':>9}{'errors':>8}"
+    ]
+    for result in results:
+        summary = result.summary()
+        lines.append(
+            f"{result.scenario.name:<14}{summary['p50_ms']:>7.1f} ms"
+            f"{summary['p95_ms']:>7.1f} ms{summary['p99_ms']:>7.1f} ms"
+            f"{summary['throughput']:>9.0f}{summary['queries']:>9}{result.errors:>8}"
+        )
+    return lines
+
+
+def check(results, baseline=None, tolerance=1.5, latency=True):
+    """
+    Messages about the results over a query budget, a latency ceiling or
+    ``tolerance`` times the p95 of ``baseline`` (``{name: summary}``), or with
+    failed requests. Without ``latency``, only the failures and query budgets
+    are checked, as timings vary with the machine.
+    """
+    failures = []
+    for result in results:
+        scenario, summary = result.scenario, result.summary()
+        if result.errors:
+            failures.append(f"{scenario.name}: {result.errors} requests failed.")
+        if summary["queries"] > scenario.queries:
+            failures.append(
+                f"{scenario.name}: {summary['queries']} queries per request, over "
+                f"the budget of {scenario.queries}."
+            )
+        if not latency:
+            continue
+        if summary["p95_ms"] > scenario.p95_ms:
+            failures.append(
+                f"{scenario.name}: p95 of {summary['p95_ms']:.1f} ms, over the "
+                f"ceiling of {scenario.p95_ms} ms."
+            )
+        expected = (baseline or {}).get(scenario.name)
+        if expected and summary["p95_ms"] > expected["p95_ms"] * tolerance:
+            failures.append(
+                f"{scenario.name}: p95 of {summary['p95_ms']:.1f} ms, over "
+                f"{tolerance} times the baseline of {expected['p95_ms']:.1f} ms."
+            )
+    return failures
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, "w") as file:
+        json.dump({result.scenario.name: result.summary() for result in results}, file)
@@ -0,0 +1,87 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "movies:catalog-version"
+
+
+def movie_key(movie_id):
+    return f"movies:movie:{movie_id}"
+
+
+def catalog_version():
+    """
+    Version shared by every cached list page, replaced on catalog changes.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def list_key(request):
+    params = sorted(request.query_params.lists())
+    digest = hashlib.sha1(f"{request.get_host()}{request.path}{params}".encode())
+    return f"movies:list:{catalog_version()}:{digest.hexdigest()}"
+
+
+def get_list_page(request, load):
+    """
+    Cached list page for ``request``, computed with ``load()`` on a miss.
+    """
+    key = list_key(request)
+    page = cache.get(key)
+    if page is None:
+        page = load()
+        cache.set(key, page)
+    return page
+
+
+def get_movie_payloads(movie_ids, load, store=True, versions=None):
+    """
+    Cached payloads of ``movie_ids`` in order. ``load(missing_ids)`` returns
+    an id -> payload dict for the misses, cached if ``store``; ids it does not
+    return are skipped.
+
+    Payloads are cached along with the ``versions`` (``{movie_id: version}``)
+    they were loaded at, if given. When given, a payload cached at another
+    version, such as one from before a write of another process, is a miss.
+    """
+    versions = versions or {}
+    keys = {movie_id: movie_key(movie_id) for movie_id in movie_ids}
+    cached = cache.get_many(keys.values())
+
+    payloads = {}
+    for movie_id, key in keys.items():
+        if key in cached:
+            version, payload = cached[key]
+            if movie_id not in versions or versions[movie_id] == version:
+                payloads[key] = payload
+
+    missing = [movie_id for movie_id, key in keys.items() if key not in payloads]
+    if missing:
+        loaded = load(missing)
+        if store:
+            cache.set_many(
+                {
+                    keys[movie_id]: (versions.get(movie_id), payload)
+                    for movie_id, payload in loaded.items()
+                }
+            )
+        payloads.update(
+            (keys[movie_id], payload) for movie_id, payload in loaded.items()
+        )
+
+    return [
+        payloads[keys[movie_id]] for movie_id in movie_ids if keys[movie_id] in payloads
+    ]
+
+
+def invalidate_movies(movie_ids):
+    cache.delete_many([movie_key(movie_id) for movie_id in movie_ids])
+
+
+def invalidate_catalog():
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
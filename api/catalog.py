@@ -0,0 +1,366 @@
+"""
+In-memory inverted index of the movie catalog.
+
+Every indexed value (a genre, an actor, a year, a content rating, an IMDb
+rating bucket) maps to the sorted ids of its movies in an ``array('q')``, so
+the index takes eight bytes per posting however sparse the ids are, and a
+filter is a few set unions and intersections in C. The index is built on first
+use and updated in place by the write paths of this process. After
+``CATALOG_INDEX_MAX_AGE`` seconds, to pick up writes made by other processes,
+a background thread builds a new index while the old one keeps serving, and
+swaps it in once it has caught up with the writes made in the meantime.
+"""
+
+import array
+import bisect
+import collections
+import itertools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from api import models
+
+logger = logging.getLogger(__name__)
+
+
+def id_filter(ids):
+    """
+    ``Q`` restricting a movie queryset to ``ids``.
+    """
+    ids = sorted(ids)
+    if connection.vendor == "sqlite":
+        # A single JSON parameter sidesteps the SQLite host parameter limit.
+        ids_json = "[" + ",".join(map(str, ids)) + "]"
+        return Q(id__in=RawSQL("SELECT value FROM json_each(%s)", [ids_json]))
+    return Q(id__in=ids)
+
+
+def rating_bucket(rating):
+    return round(rating * 10)
+
+
+def _merge(posting, ids):
+    """
+    Add the sorted ``ids`` to the sorted ``posting``.
+    """
+    if not posting or ids[0] > posting[-1]:
+        posting.extend(ids)
+        return
+    for movie_id in ids:
+        position = bisect.bisect_left(posting, movie_id)
+        if position == len(posting) or posting[position] != movie_id:
+            posting.insert(position, movie_id)
+
+
+def _discard(posting, ids):
+    for movie_id in ids:
+        position = bisect.bisect_left(posting, movie_id)
+        if position < len(posting) and posting[position] == movie_id:
+            del posting[position]
+
+
+class CatalogIndex:
+    def __init__(self):
+        self.built_at = time.monotonic()
+        self.all = array.array("q")
+        self.movies = {}
+        self.genres = {}
+        self.actors = {}
+        self.years = {}
+        self.content_ratings = {}
+        self.ratings = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        index.add_movies(models.Movie.objects.all())
+        return index
+
+    @staticmethod
+    def _load(movies):
+        """
+        Indexed values of ``movies`` (a queryset) keyed by movie id.
+        """
+        entries = {
+            movie_id: {
+                "genres": [],
+                "actors": [],
+                "year": year,
+                "content_rating": content_rating,
+                "rating": rating_bucket(imdb_rating),
+            }
+            for movie_id, year, content_rating, imdb_rating in movies.values_list(
+                "id", "year", "content_rating", "imdb_rating"
+            )
+        }
+        for through, field, key in (
+            (models.Movie.genres.through, "genre__name", "genres"),
+            (models.Movie.actors.through, "actor__name", "actors"),
+        ):
+            rows = through.objects.filter(movie__in=movies).values_list(
+                "movie_id", field
+            )
+            for movie_id, name in rows:
+                entries[movie_id][key].append(name)
+        return entries
+
+    @staticmethod
+    def _postings(entries):
+        """
+        Sorted ids of ``entries`` per indexed value.
+        """
+        postings = {
+            "genres": {},
+            "actors": {},
+            "years": {},
+            "content_ratings": {},
+            "ratings": {},
+        }
+        for movie_id in sorted(entries):
+            entry = entries[movie_id]
+            for name in entry["genres"]:
+                postings["genres"].setdefault(name, []).append(movie_id)
+            for name in entry["actors"]:
+                postings["actors"].setdefault(name, []).append(movie_id)
+            if entry["year"] is not None:
+                postings["years"].setdefault(entry["year"], []).append(movie_id)
+            postings["content_ratings"].setdefault(entry["content_rating"], []).append(
+                movie_id
+            )
+            postings["ratings"].setdefault(entry["rating"], []).append(movie_id)
+        return postings
+
+    def add_movies(self, movies):
+        self.add_entries(self._load(movies))
+
+    def add_entries(self, entries):
+        """
+        Index the ``_load`` entries of movies.
+        """
+        for field, values in self._postings(entries).items():
+            postings = getattr(self, field)
+            for value, ids in values.items():
+                _merge(postings.setdefault(value, array.array("q")), ids)
+        if entries:
+            _merge(self.all, sorted(entries))
+        self.movies.update(entries)
+
+    def remove_movies(self, movie_ids):
+        entries = {
+            movie_id: self.movies.pop(movie_id)
+            for movie_id in movie_ids
+            if movie_id in self.movies
+        }
+        for field, values in self._postings(entries).items():
+            postings = getattr(self, field)
+            for value, ids in values.items():
+                _discard(postings[value], ids)
+                if not postings[value]:
+                    del postings[value]
+        _discard(self.all, sorted(entries))
+
+    @staticmethod
+    def _combine(postings, values, match):
+        if match == "all":
+            # Probe the shortest posting first: the set never grows.
+            matched = sorted((postings.get(value, ()) for value in values), key=len)
+            result = set(matched[0])
+            for posting in matched[1:]:
+                result.intersection_update(posting)
+            return result
+        return set().union(*(postings.get(value, ()) for value in values))
+
+    @staticmethod
+    def _range(postings, low, high):
+        keys = sorted(postings)
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        end = len(keys) if high is None else bisect.bisect_right(keys, high)
+        return set().union(*(postings[key] for key in keys[start:end]))
+
+    def filter(
+        self,
+        genres=(),
+        genre_match="any",
+        actors=(),
+        actor_match="any",
+        year_min=None,
+        year_max=None,
+        rating_min=None,
+        rating_max=None,
+    ):
+        """
+        Set of the ids of the movies matching every given condition.
+        """
+        matches = []
+        if genres:
+            matches.append(self._combine(self.genres, genres, genre_match))
+        if actors:
+            matches.append(self._combine(self.actors, actors, actor_match))
+        if year_min is not None or year_max is not None:
+            matches.append(self._range(self.years, year_min, year_max))
+        if rating_min is not None or rating_max is not None:
+            matches.append(
+                self._range(
+                    self.ratings,
+                    None if rating_min is None else rating_bucket(rating_min),
+                    None if rating_max is None else rating_bucket(rating_max),
+                )
+            )
+        if not matches:
+            return set(self.all)
+
+        matches.sort(key=len)
+        result = matches[0]
+        for match in matches[1:]:
+            result &= match
+        return result
+
+    def facets(self, movie_ids):
+        """
+        Number of movies of ``movie_ids`` (indexed ids) per genre, year, decade
+        and content rating.
+        """
+        entries = [self.movies[movie_id] for movie_id in movie_ids]
+        genres = collections.Counter(
+            itertools.chain.from_iterable(entry["genres"] for entry in entries)
+        )
+        years = collections.Counter(
+            entry["year"] for entry in entries if entry["year"] is not None
+        )
+        content_ratings = collections.Counter(
+            entry["content_rating"] for entry in entries
+        )
+        decades = collections.Counter()
+        for year, count in years.items():
+            decades[year // 10 * 10] += count
+
+        def by_count(values):
+            return sorted(
+                ({"value": value, "count": count} for value, count in values.items()),
+                key=lambda facet: (-facet["count"], facet["value"]),
+            )
+
+        def by_value(values):
+            return [
+                {"value": value, "count": values[value]} for value in sorted(values)
+            ]
+
+        return {
+            "count": len(entries),
+            "genres": by_count(genres),
+            "decades": by_value(decades),
+            "years": by_value(years),
+            "content_ratings": by_count(content_ratings),
+        }
+
+
+_index = None
+_lock = threading.Lock()
+# The thread building the next index, and the ids written since it started.
+_builder = None
+_changed = set()
+
+
+def _rebuild():
+    global _index, _builder
+
+    try:
+        index = CatalogIndex.build()
+        while True:
+            with _lock:
+                if _builder is not threading.current_thread():
+                    return
+                if not _changed:
+                    _index, _builder = index, None
+                    return
+                changed = set(_changed)
+                _changed.clear()
+            index.remove_movies(changed)
+            index.add_movies(models.Movie.objects.filter(id_filter(changed)))
+    except Exception:
+        logger.exception("Could not rebuild the catalog index")
+        with _lock:
+            if _builder is threading.current_thread():
+                # Retry once the index is stale again.
+                _index.built_at = time.monotonic()
+                _builder = None
+    finally:
+        connection.close()
+
+
+def _current():
+    """
+    The index, built on first use. A stale index keeps serving while its
+    replacement is built in the background.
+    """
+    global _index, _builder
+
+    if _index is None:
+        _index = CatalogIndex.build()
+    elif _builder is None:
+        if time.monotonic() - _index.built_at > settings.CATALOG_INDEX_MAX_AGE:
+            _changed.clear()
+            _builder = threading.Thread(
+                target=_rebuild, name="catalog-index-builder", daemon=True
+            )
+            _builder.start()
+    return _index
+
+
+def filter_movies(**conditions):
+    """
+    Set of the movie ids matching ``conditions`` (see ``CatalogIndex.filter``).
+    """
+    with _lock:
+        return _current().filter(**conditions)
+
+
+def facets(conditions, movie_ids=None):
+    """
+    Facet counts of the movies matching ``conditions`` and, if given, the set
+    ``movie_ids``.
+    """
+    with _lock:
+        index = _current()
+        matched = index.filter(**conditions)
+        if movie_ids is not None:
+            matched.intersection_update(movie_ids)
+        return index.facets(matched)
+
+
+def update_movies(movie_ids):
+    """
+    Re-index the given movies after they were created or changed.
+    """
+    if _index is None:
+        return
+    # Read before taking the lock, which only covers the swap of the postings.
+    entries = CatalogIndex._load(models.Movie.objects.filter(id_filter(movie_ids)))
+    with _lock:
+        if _builder is not None:
+            _changed.update(movie_ids)
+        if _index is not None:
+            _index.remove_movies(movie_ids)
+            _index.add_entries(entries)
+
+
+def remove_movies(movie_ids):
+    with _lock:
+        if _builder is not None:
+            _changed.update(movie_ids)
+        if _index is not None:
+            _index.remove_movies(movie_ids)
+
+
+def reset():
+    global _index, _builder
+
+    with _lock:
+        _index = _builder = None
+        _changed.clear()
@@ -0,0 +1,48 @@
+"""
+Conditional GET support. Validators are derived from version counters and
+timestamps kept by the write paths, never from the rendered body, so a
+matching ``If-None-Match`` or ``If-Modified-Since`` is answered with a 304
+before anything is serialized.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+
+def etag(request, *parts):
+    """
+    Strong ETag of the representation identified by ``parts``.
+    """
+    key = ":".join(map(str, (request.accepted_renderer.format, *parts)))
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def with_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def private(response):
+    """
+    Keep a per-user response, and its validators, out of shared caches.
+    """
+    patch_vary_headers(response, ["Authorization"])
+    patch_cache_control(response, private=True)
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """
+    A 304 response if the request's validators still match, else ``None``.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if response is not None:
+        response = with_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,128 @@
+import csv
+import json
+
+from django.db.models import Prefetch, prefetch_related_objects
+from djangorestframework_camel_case.util import camelize
+
+from api import aggregates
+from api import fields
+from api import models
+
+CHUNK_SIZE = 1000
+
+# Fields of a CreateUpdateMovieSerializer record, in bulk_load order.
+FIELDS = [
+    "title",
+    "year",
+    "genres",
+    "ratings",
+    "poster",
+    "content_rating",
+    "duration",
+    "release_date",
+    "average_rating",
+    "original_title",
+    "storyline",
+    "actors",
+    "imdb_rating",
+    "posterurl",
+]
+
+LIST_SEPARATOR = "|"
+
+
+def iter_movies(chunk_size=CHUNK_SIZE):
+    """
+    Every movie with its relations prefetched, read in id-ordered chunks.
+    """
+    last_id = 0
+    while True:
+        movies = list(
+            models.Movie.objects.filter(id__gt=last_id).order_by("id")[:chunk_size]
+        )
+        if not movies:
+            return
+
+        prefetch_related_objects(
+            movies,
+            "actors",
+            "genres",
+            Prefetch(
+                "ratings",
+                queryset=models.Rating.objects.only("movie_id", "value").order_by("id"),
+            ),
+        )
+        yield from movies
+        last_id = movies[-1].id
+
+
+def record(movie):
+    """
+    A movie in the shape accepted by ``bulk_load``, plus its rating summary.
+    """
+    return camelize(
+        {
+            "title": movie.title,
+            "year": fields.format_year(movie.year),
+            "genres": [genre.name for genre in movie.genres.all()],
+            "ratings": [rating.value for rating in movie.ratings.all()],
+            "poster": movie.poster,
+            "content_rating": movie.content_rating,
+            "duration": fields.format_duration(movie.duration),
+            "release_date": fields.format_date(movie.release_date),
+            "average_rating": movie.average_rating,
+            "original_title": movie.original_title,
+            "storyline": movie.storyline,
+            "actors": [actor.name for actor in movie.actors.all()],
+            "imdb_rating": movie.imdb_rating,
+            "posterurl": movie.posterurl,
+            "rating_summary": aggregates.summary(movie),
+        }
+    )
+
+
+def stream_ndjson(movies):
+    for movie in movies:
+        yield json.dumps(record(movie), ensure_ascii=False) + "\n"
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(movies):
+    """
+    One row per movie. List cells are joined with ``LIST_SEPARATOR``.
+    """
+    header = camelize({field: None for field in FIELDS}).keys()
+    header = [*header, "ratingCount", "ratingMean", "ratingHistogram"]
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(header)
+    for movie in movies:
+        row = record(movie)
+        summary = row.pop("ratingSummary")
+        row.update(
+            {
+                "ratingCount": summary["count"],
+                "ratingMean": summary["mean"],
+                "ratingHistogram": summary["histogram"],
+            }
+        )
+        yield writer.writerow(
+            [
+                (
+                    LIST_SEPARATOR.join(map(str, row[column]))
+                    if isinstance(row[column], list)
+                    else row[column]
+                )
+                for column in header
+            ]
+        )
+
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", stream_ndjson),
+    "csv": ("text/csv", stream_csv),
+}
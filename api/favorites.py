@@ -0,0 +1,216 @@
+"""
+Per-user favorites kept in the cache as a sorted array of movie ids.
+
+The array answers "is this movie a favorite" for a whole page with a single
+query and serves the unfiltered favorites listing by slicing. It is cached
+along with the user's ``ResourceVersion``, which every write bumps in the
+database: a cached array is only used while its version is current, so a
+write made by another process invalidates it too.
+"""
+
+import array
+import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api import autocomplete
+from api import leaderboards
+from api import models
+
+Favorite = models.Movie.user_favorites.through
+
+ADDED = "added"
+REMOVED = "removed"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+
+BATCH_SIZE = 500
+# Change time of favorites never written through ``update``.
+NEVER = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+class Favorites:
+    def __init__(self, version, changed_at, ids):
+        self.version = version
+        self.changed_at = changed_at
+        self.ids = ids
+        self._members = None
+
+    def __contains__(self, movie_id):
+        if self._members is None:
+            self._members = frozenset(self.ids)
+        return movie_id in self._members
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _key(user_id):
+    return f"favorites:user:{user_id}"
+
+
+def _version_name(user_id):
+    return f"favorites:{user_id}"
+
+
+def _version(user_id):
+    """
+    ``(version, changed_at)`` of the favorites of a user in the database.
+    """
+    row = (
+        models.ResourceVersion.objects.filter(name=_version_name(user_id))
+        .values_list("version", "updated_at")
+        .first()
+    )
+    return row or (0, NEVER)
+
+
+def _ids(user_id):
+    ids = Favorite.objects.filter(user_id=user_id).values_list("movie_id", flat=True)
+    return array.array("q", sorted(ids))
+
+
+def _store(user_id, version, changed_at, ids):
+    cache.set(_key(user_id), (version, changed_at, ids))
+    return Favorites(version, changed_at, ids)
+
+
+def get(user_id):
+    # The version is read first: ids read after a concurrent write are only
+    # cached under the version before it, and reloaded on the next read.
+    version, changed_at = _version(user_id)
+    cached = cache.get(_key(user_id))
+    if cached is not None and cached[0] == version:
+        return Favorites(*cached)
+    return _store(user_id, version, changed_at, _ids(user_id))
+
+
+def of(user):
+    """
+    ``get`` for the user of a request, read once: the request user object
+    lives as long as the request.
+    """
+    memo = vars(user)
+    if "_favorites" not in memo:
+        memo["_favorites"] = get(user.id)
+    return memo["_favorites"]
+
+
+def recount(movie_ids):
+    """
+    Set the ``favorites_count`` of ``movie_ids`` from the favorites, with one
+    statement: exact even when concurrent writes raced on the same rows.
+    """
+    counts = (
+        Favorite.objects.filter(movie_id=OuterRef("id"))
+        .values("movie_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    models.Movie.objects.filter(id__in=movie_ids).update(
+        favorites_count=Coalesce(Subquery(counts), 0)
+    )
+
+
+def _write(user_id, decide):
+    """
+    Add and remove the favorites of a user that ``decide(favorite ids)``
+    returns as ``(added, removed)``, with one statement each, then cache the
+    new array under the new version once committed.
+    """
+    with transaction.atomic():
+        # Bumping first locks the version row: concurrent writes of the same
+        # user wait for this one, then decide on the favorites it leaves.
+        models.ResourceVersion.bump(_version_name(user_id))
+        version, changed_at = _version(user_id)
+        before = set(_ids(user_id))
+        added, removed = decide(before)
+        added, removed = set(added) - before, set(removed) & before
+
+        Favorite.objects.bulk_create(
+            [Favorite(user_id=user_id, movie_id=movie_id) for movie_id in added],
+            ignore_conflicts=True,
+        )
+        if removed:
+            Favorite.objects.filter(user_id=user_id, movie_id__in=removed).delete()
+        if added or removed:
+            recount(added | removed)
+
+        ids = array.array("q", sorted((before | added) - removed))
+        transaction.on_commit(lambda: _store(user_id, version, changed_at, ids))
+
+        deltas = {movie_id: 1 for movie_id in added}
+        deltas.update({movie_id: -1 for movie_id in removed})
+        transaction.on_commit(lambda: autocomplete.adjust_popularity(deltas))
+        if added or removed:
+            transaction.on_commit(lambda: leaderboards.update_movies(added | removed))
+
+
+def update(user_id, added=(), removed=()):
+    if added or removed:
+        _write(user_id, lambda before: (added, removed))
+
+
+def add(user_id, movie_id):
+    update(user_id, added=[movie_id])
+
+
+def remove(user_id, movie_id):
+    update(user_id, removed=[movie_id])
+
+
+def apply(user_id, operations):
+    """
+    Apply ``(movie_id, favorite)`` operations of a user in order and return
+    the status of each operation, decided on the favorites in the database.
+    """
+    movie_ids = {movie_id for movie_id, _ in operations}
+    found = set(
+        models.Movie.objects.filter(id__in=movie_ids).values_list("id", flat=True)
+    )
+    statuses = []
+
+    def decide(before):
+        state = {movie_id: movie_id in before for movie_id in found}
+        for movie_id, favorite in operations:
+            if movie_id not in found:
+                statuses.append(NOT_FOUND)
+            elif state[movie_id] == favorite:
+                statuses.append(UNCHANGED)
+            else:
+                statuses.append(ADDED if favorite else REMOVED)
+                state[movie_id] = favorite
+        return (
+            [movie_id for movie_id in found if state[movie_id]],
+            [movie_id for movie_id in found if not state[movie_id]],
+        )
+
+    if found:
+        _write(user_id, decide)
+    else:
+        statuses = [NOT_FOUND] * len(operations)
+    return statuses
+
+
+def forget_movie(movie_id):
+    """
+    Invalidate the cached favorites of every user who liked ``movie_id``.
+    """
+    user_ids = list(
+        Favorite.objects.filter(movie_id=movie_id).values_list("user_id", flat=True)
+    )
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        names = [
+            _version_name(user_id) for user_id in user_ids[start : start + BATCH_SIZE]
+        ]
+        models.ResourceVersion.objects.bulk_create(
+            [models.ResourceVersion(name=name, version=0) for name in names],
+            ignore_conflicts=True,
+        )
+        models.ResourceVersion.objects.filter(name__in=names).update(
+            version=F("version") + 1, updated_at=timezone.now()
+        )
@@ -0,0 +1,124 @@
+import re
+
+from rest_framework import serializers
+
+DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$"
+)
+YEAR_PATTERN = re.compile(r"\d{4}")
+
+
+def parse_year(value):
+    """
+    First four digit number of a legacy year such as ``1999-2003``, or ``None``.
+    """
+    match = YEAR_PATTERN.search(value)
+    return int(match.group()) if match else None
+
+
+def parse_duration(value):
+    """
+    Seconds of an ISO-8601 duration such as ``PT100M``, or ``None``.
+    """
+    value = value.strip().upper()
+    match = DURATION_PATTERN.match(value)
+    if not match or value in ("P", "PT"):
+        return None
+
+    parts = {key: int(part) for key, part in match.groupdict(default="0").items()}
+    return (
+        parts["days"] * 86400
+        + parts["hours"] * 3600
+        + parts["minutes"] * 60
+        + parts["seconds"]
+    )
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return ""
+
+    minutes, seconds = divmod(seconds, 60)
+    return f"PT{minutes}M{seconds}S" if seconds else f"PT{minutes}M"
+
+
+def format_year(year):
+    return "" if year is None else str(year)
+
+
+def format_date(date):
+    return "" if date is None else date.isoformat()
+
+
+class YearField(serializers.IntegerField):
+    """
+    Integer year, represented as a string like the original ``CharField``.
+    Strings are read like the legacy text column was migrated: by their first
+    four digit number, and as no year if they have none.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("min_value", 0)
+        kwargs.setdefault("max_value", 9999)
+        super().__init__(**kwargs)
+
+    def run_validation(self, data=serializers.empty):
+        if isinstance(data, str) and data.strip():
+            data = parse_year(data)
+            if data is None:
+                return None
+        return super().run_validation(data)
+
+    def to_representation(self, value):
+        return format_year(value)
+
+
+class DurationField(serializers.Field):
+    """
+    Duration stored in seconds, read and written as ISO-8601 (``PT100M``).
+    """
+
+    default_error_messages = {"invalid": "Enter an ISO-8601 duration like PT100M."}
+
+    def to_internal_value(self, data):
+        if data in ("", None):
+            return None
+
+        seconds = parse_duration(str(data))
+        if seconds is None:
+            self.fail("invalid")
+        return seconds
+
+    def to_representation(self, value):
+        return format_duration(value)
+
+
+class OptionalDateField(serializers.DateField):
+    """
+    ``DateField`` where an empty string stands for no date.
+    """
+
+    def to_internal_value(self, value):
+        if value in ("", None):
+            return None
+        return super().to_internal_value(value)
+
+    def to_representation(self, value):
+        return format_date(value)
+
+
+class ContentRatingField(serializers.CharField):
+    """
+    Content rating, spelled as in ``choices`` when it is one of them (case
+    insensitively) and otherwise kept as given, like the former text column.
+    """
+
+    def __init__(self, choices, **kwargs):
+        self.ratings = {value.upper(): value for value, _ in choices}
+        kwargs.setdefault("max_length", 255)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        return self.ratings.get(value.upper(), value)
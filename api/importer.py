@@ -0,0 +1,210 @@
+"""
+Offline import of catalog files, driven by the ``import_movies`` command.
+
+Records are read one at a time from JSON array or NDJSON files, validated in
+batches by ``CreateUpdateMovieSerializer`` (in worker processes) and written
+by ``ingest.load_movies``, one transaction per batch. Each record is read
+along with the byte offset just past it, which the command checkpoints once
+the batch is committed: an interrupted import resumes from there, and since
+existing titles are skipped, replaying a committed batch changes nothing.
+"""
+
+import codecs
+import json
+import os
+from concurrent.futures import Future
+
+from djangorestframework_camel_case.util import underscoreize
+from rest_framework.exceptions import ValidationError
+
+from api import serializers
+
+CHUNK_SIZE = 1 << 16
+MAX_RECORD_SIZE = 1 << 24
+
+FORMATS = ["json", "ndjson"]
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def file_format(path):
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "json"
+
+
+def iter_ndjson(file, offset=0):
+    """
+    ``(line, end offset)`` of the non blank lines of a binary NDJSON file,
+    from ``offset``. Lines are decoded by ``validate``.
+    """
+    file.seek(offset)
+    for line in file:
+        offset += len(line)
+        if line.strip():
+            yield line, offset
+
+
+def iter_json_array(file, offset=0):
+    """
+    ``(record, end offset)`` of the elements of a binary file holding a JSON
+    array, from ``offset``: 0 or an end offset yielded before.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    file.seek(offset)
+    buffer, position = "", 0
+    eof, started = False, offset > 0
+
+    def fill():
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = file.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + text.decode(chunk, final=eof)
+        position = 0
+        if len(buffer) > MAX_RECORD_SIZE:
+            raise ImportFileError(f"Record at byte {offset} is too large.")
+        return True
+
+    while True:
+        # Separators and whitespace are ASCII: one byte per character.
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+                offset += 1
+            if position < len(buffer) or not fill():
+                break
+        if position == len(buffer):
+            raise ImportFileError("Unexpected end of file, the array is not closed.")
+
+        if not started:
+            if buffer[position] != "[":
+                raise ImportFileError("The file does not hold a JSON array.")
+            started = True
+            position += 1
+            offset += 1
+            continue
+        if buffer[position] == "]":
+            return
+
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # Errors close to the end of the buffer may be a truncated record.
+                truncated = error.msg.startswith("Unterminated string") or (
+                    error.pos > len(buffer) - 16
+                )
+                if truncated and fill():
+                    continue
+                raise ImportFileError(f"Invalid JSON at byte {offset}: {error.msg}.")
+            # A value ending with the buffer (a number) may go on in the file.
+            if end < len(buffer) or not fill():
+                break
+
+        offset += len(buffer[position:end].encode())
+        position = end
+        yield record, offset
+
+
+def iter_records(path, offset=0, format=None):
+    with open(path, "rb") as file:
+        if (format or file_format(path)) == "ndjson":
+            yield from iter_ndjson(file, offset)
+        else:
+            yield from iter_json_array(file, offset)
+
+
+def validate(items):
+    """
+    Validate a batch of records (NDJSON lines or decoded values), returning
+    the validated data of the valid ones and ``(index, errors)`` of the others.
+    """
+    # One serializer for the batch: binding its fields is most of the cost.
+    serializer = serializers.CreateUpdateMovieSerializer()
+    valid, rejected = [], []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, bytes):
+                try:
+                    item = json.loads(item)
+                except ValueError as error:
+                    raise ValidationError(
+                        {"non_field_errors": [f"Invalid JSON: {error}"]}
+                    )
+            valid.append(dict(serializer.run_validation(underscoreize(item))))
+        except ValidationError as error:
+            rejected.append((index, json.loads(json.dumps(error.detail))))
+    return valid, rejected
+
+
+def completed(function, *args):
+    """
+    ``function(*args)`` run now, as the future of an executor without workers.
+    """
+    future = Future()
+    future.set_result(function(*args))
+    return future
+
+
+class Checkpoint:
+    """
+    Progress of the import of a file, saved as JSON next to it (or at
+    ``path``) after every committed batch: the offset after its last record,
+    the size of the rejects file then, and the counters.
+    """
+
+    COUNTERS = ["read", "imported", "skipped", "rejected"]
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.offset = 0
+        self.rejects_offset = None
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+
+    def _identity(self):
+        stat = os.stat(self.source)
+        return {"source": os.path.abspath(self.source), "size": stat.st_size}
+
+    def load(self):
+        """
+        Resume the saved progress, if any. Returns whether there was some.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path) as file:
+            state = json.load(file)
+        if {key: state.get(key) for key in ("source", "size")} != self._identity():
+            raise ImportFileError(
+                f"{self.path} records the import of another file, or of this file "
+                "before it changed."
+            )
+        self.offset = state["offset"]
+        # Missing from checkpoints saved before it was recorded.
+        self.rejects_offset = state.get("rejects_offset")
+        self.counts = {counter: state[counter] for counter in self.COUNTERS}
+        return True
+
+    def save(self, offset, rejects_offset=None):
+        self.offset = offset
+        self.rejects_offset = rejects_offset
+        state = {
+            **self._identity(),
+            "offset": offset,
+            "rejects_offset": rejects_offset,
+            **self.counts,
+        }
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
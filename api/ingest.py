@@ -0,0 +1,155 @@
+from django.db import IntegrityError
+from django.db import transaction
+
+from api import aggregates
+from api import models
+from api import search
+
+BATCH_SIZE = 500
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _ids_by_field(model, field, values, batch_size):
+    """
+    Map ``field`` values to ids with unique index lookups.
+    """
+    ids = {}
+    for chunk in _chunks(values, batch_size):
+        rows = model.objects.filter(**{f"{field}__in": chunk}).values_list(field, "id")
+        ids.update(rows)
+    return ids
+
+
+def resolve_names(model, names, batch_size=BATCH_SIZE):
+    """
+    Return a name -> id map for ``names``, creating the missing rows.
+
+    Inserts ignore conflicts on the unique name, so names created meanwhile by
+    a concurrent writer are picked up instead of duplicated.
+    """
+    names = list(dict.fromkeys(names))
+    ids = _ids_by_field(model, "name", names, batch_size)
+
+    # Created in order of first appearance, as one get_or_create per name would.
+    missing = [name for name in names if name not in ids]
+    if missing:
+        model.objects.bulk_create(
+            [model(name=name) for name in missing],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        ids.update(_ids_by_field(model, "name", missing, batch_size))
+        models.ResourceVersion.bump(model._meta.model_name)
+    return ids
+
+
+def link_names(relation, names_by_movie, batch_size=BATCH_SIZE):
+    """
+    Link movies to the actors or genres (``relation``) named in
+    ``{movie_id: names}``, keeping the order of the names.
+    """
+    field = models.Movie._meta.get_field(relation)
+    through = field.remote_field.through
+    target = f"{field.m2m_reverse_field_name()}_id"
+
+    name_ids = resolve_names(
+        field.related_model,
+        [name for names in names_by_movie.values() for name in names],
+        batch_size,
+    )
+    through.objects.bulk_create(
+        [
+            through(movie_id=movie_id, **{target: name_ids[name]})
+            for movie_id, names in names_by_movie.items()
+            for name in dict.fromkeys(names)
+        ],
+        batch_size=batch_size,
+    )
+
+
+def movie_fields(record):
+    """
+    Model fields of a validated ``CreateUpdateMovieSerializer`` record.
+    """
+    fields = {
+        key: value
+        for key, value in record.items()
+        if key not in ("actors", "genres", "ratings")
+    }
+    imdb_rating = record["imdb_rating"]
+    fields["imdb_rating"] = float(imdb_rating) if imdb_rating else 0.0
+    return fields
+
+
+@transaction.atomic
+def load_movies(records, batch_size=BATCH_SIZE):
+    """
+    Set-based equivalent of ``CreateUpdateMovieSerializer.create`` for many
+    validated records: titles that already exist (in the database or earlier
+    in ``records``) are skipped. Returns the created movies.
+
+    A title created concurrently by another writer trips the unique index: the
+    insert is rolled back to a savepoint and retried without it.
+    """
+    existing = _ids_by_field(
+        models.Movie, "title", {record["title"] for record in records}, batch_size
+    )
+
+    while True:
+        new_records = {}
+        for record in records:
+            if record["title"] not in existing and record["title"] not in new_records:
+                new_records[record["title"]] = record
+        if not new_records:
+            return []
+
+        movies = []
+        for record in new_records.values():
+            movie = models.Movie(**movie_fields(record))
+            aggregates.set_histogram(movie, aggregates.histogram_of(record["ratings"]))
+            movies.append(movie)
+        try:
+            with transaction.atomic():
+                models.Movie.objects.bulk_create(movies, batch_size=batch_size)
+            break
+        except IntegrityError:
+            created = _ids_by_field(
+                models.Movie, "title", new_records.keys(), batch_size
+            )
+            if not created:
+                # Not a concurrent title.
+                raise
+            existing.update(created)
+
+    # Not every backend returns primary keys from bulk inserts.
+    movie_ids = _ids_by_field(models.Movie, "title", new_records.keys(), batch_size)
+    for movie in movies:
+        movie.id = movie_ids[movie.title]
+
+    for relation in ("actors", "genres"):
+        link_names(
+            relation,
+            {
+                movie_ids[title]: record[relation]
+                for title, record in new_records.items()
+            },
+            batch_size,
+        )
+
+    models.Rating.objects.bulk_create(
+        [
+            models.Rating(movie_id=movie_ids[title], value=value)
+            for title, record in new_records.items()
+            for value in record["ratings"]
+        ],
+        batch_size=batch_size,
+    )
+
+    search.index_movies([movie.id for movie in movies])
+
+    return movies
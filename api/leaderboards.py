@@ -0,0 +1,227 @@
+"""
+In-memory top movies by rating and favorites, overall and per genre.
+
+For each of ``METRICS`` the index keeps the value of every movie and, per
+genre (``None`` standing for every movie), a leaderboard: the
+``LEADERBOARD_SIZE`` best ``(-value, movie id)`` keys in a sorted list, movies
+without a value left out. A leaderboard is computed on its first read, then
+updated in place by the write paths of this process, once committed: a movie
+entering it or moving up is inserted by bisection. A leaderboard shorter than
+its size holds every movie with a value; when a member of a full one leaves it
+or drops below its last entry, the next in line is unknown and it is computed
+again on its next read.
+
+Like ``api.catalog``, the index is built lazily and, after
+``LEADERBOARD_MAX_AGE`` seconds, rebuilt by a background thread to pick up
+writes made by other processes, the old index serving until the new one has
+caught up with the writes made in the meantime.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from api import models
+
+logger = logging.getLogger(__name__)
+
+METRICS = ["imdb_rating", "average_rating", "rating_mean", "favorites_count"]
+
+
+class Leaderboards:
+    def __init__(self, size):
+        self.built_at = time.monotonic()
+        self.size = size
+        self.values = {metric: {} for metric in METRICS}
+        self.movie_genres = {}
+        self.members = {None: set()}
+        self.genre_ids = {}
+        self.boards = {}
+
+    @classmethod
+    def build(cls):
+        index = cls(settings.LEADERBOARD_SIZE)
+        index.add_movies(models.Movie.objects.all())
+        return index
+
+    def add_movies(self, movies):
+        """
+        Rank new or changed ``movies`` (a queryset).
+        """
+        genres = {}
+        rows = models.Movie.genres.through.objects.filter(movie__in=movies)
+        for movie_id, genre_id, name in rows.values_list(
+            "movie_id", "genre_id", "genre__name"
+        ):
+            genres.setdefault(movie_id, []).append(genre_id)
+            self.genre_ids[name] = genre_id
+
+        for movie_id, *values in movies.values_list("id", *METRICS):
+            self._move(movie_id, [None] + genres.get(movie_id, []), values)
+
+    def remove_movies(self, movie_ids):
+        for movie_id in movie_ids:
+            if movie_id in self.movie_genres:
+                self._move(movie_id, [], [None] * len(METRICS))
+                del self.movie_genres[movie_id]
+
+    def _move(self, movie_id, movie_genres, values):
+        """
+        Move a movie in the leaderboards of its old and new genres, from its
+        old to its new ``values`` of ``METRICS``.
+        """
+        old_genres = self.movie_genres.get(movie_id, [])
+        for genre_id in old_genres:
+            self.members[genre_id].discard(movie_id)
+        for genre_id in movie_genres:
+            self.members.setdefault(genre_id, set()).add(movie_id)
+        self.movie_genres[movie_id] = movie_genres
+
+        for metric, value in zip(METRICS, values):
+            old = self.values[metric].pop(movie_id, None)
+            if value is not None:
+                self.values[metric][movie_id] = value
+            old_key = None if old is None else (-old, movie_id)
+            key = None if value is None else (-value, movie_id)
+            for genre_id in dict.fromkeys(old_genres + movie_genres):
+                board = self.boards.get((metric, genre_id))
+                if board is None:
+                    continue
+                before = old_key if genre_id in old_genres else None
+                after = key if genre_id in movie_genres else None
+                if before != after and not self._replace(board, before, after):
+                    del self.boards[metric, genre_id]
+
+    def _replace(self, board, old_key, key):
+        """
+        Replace ``old_key`` with ``key`` (either ``None``) in a board. Returns
+        whether the board is still exact: when a member of a full board drops
+        below its last entry, the next in line is unknown.
+        """
+        last = board[-1] if board else None
+        full = len(board) == self.size
+        if old_key is not None:
+            position = bisect.bisect_left(board, old_key)
+            if position < len(board) and board[position] == old_key:
+                del board[position]
+                if full and (key is None or key > last):
+                    return False
+        if key is not None and (len(board) < self.size or key < board[-1]):
+            bisect.insort(board, key)
+            del board[self.size :]
+        return True
+
+    def top(self, metric, genre=None, limit=None):
+        """
+        Ids of the best ``limit`` movies by ``metric``, ties going to the
+        oldest movies, of the genre named ``genre`` if given.
+        """
+        genre_id = None
+        if genre is not None:
+            genre_id = self.genre_ids.get(genre)
+            if genre_id is None:
+                return []
+
+        board = self.boards.get((metric, genre_id))
+        if board is None:
+            values = self.values[metric]
+            board = self.boards[metric, genre_id] = heapq.nsmallest(
+                self.size,
+                (
+                    (-values[movie_id], movie_id)
+                    for movie_id in self.members.get(genre_id, ())
+                    if movie_id in values
+                ),
+            )
+        return [movie_id for _, movie_id in board[:limit]]
+
+
+_index = None
+_lock = threading.Lock()
+# The thread building the next index, and the ids written since it started.
+_builder = None
+_changed = set()
+
+
+def _rebuild():
+    global _index, _builder
+
+    try:
+        index = Leaderboards.build()
+        while True:
+            with _lock:
+                if _builder is not threading.current_thread():
+                    return
+                if not _changed:
+                    _index, _builder = index, None
+                    return
+                changed = set(_changed)
+                _changed.clear()
+            # The new index has no leaderboard computed yet: nothing to keep.
+            index.remove_movies(changed)
+            index.add_movies(models.Movie.objects.filter(id__in=changed))
+    except Exception:
+        logger.exception("Could not rebuild the leaderboards")
+        with _lock:
+            if _builder is threading.current_thread():
+                # Retry once the index is stale again.
+                _index.built_at = time.monotonic()
+                _builder = None
+    finally:
+        connection.close()
+
+
+def _current():
+    """
+    The index, built on first use. A stale index keeps serving while its
+    replacement is built in the background.
+    """
+    global _index, _builder
+
+    if _index is None:
+        _index = Leaderboards.build()
+    elif _builder is None:
+        if time.monotonic() - _index.built_at > settings.LEADERBOARD_MAX_AGE:
+            _changed.clear()
+            _builder = threading.Thread(
+                target=_rebuild, name="leaderboards-builder", daemon=True
+            )
+            _builder.start()
+    return _index
+
+
+def top(metric, genre=None, limit=None):
+    with _lock:
+        return _current().top(metric, genre, limit)
+
+
+def update_movies(movie_ids):
+    """
+    Re-rank the given movies after they were created or changed.
+    """
+    with _lock:
+        if _builder is not None:
+            _changed.update(movie_ids)
+        if _index is not None and movie_ids:
+            _index.add_movies(models.Movie.objects.filter(id__in=movie_ids))
+
+
+def remove_movies(movie_ids):
+    with _lock:
+        if _builder is not None:
+            _changed.update(movie_ids)
+        if _index is not None:
+            _index.remove_movies(movie_ids)
+
+
+def reset():
+    global _index, _builder
+
+    with _lock:
+        _index = _builder = None
+        _changed.clear()
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from api import autocomplete
+from api import benchmark
+from api import catalog
+from api import leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API endpoints on a seeded synthetic catalog, created in a "
+        "transaction that is rolled back, with a private cache. Reports latency "
+        "percentiles, throughput and SQL queries per request, and fails when a "
+        "scenario goes over its query budget or latency ceiling, or over "
+        "--tolerance times the p95 of a --baseline."
+    )
+
+    def add_arguments(self, parser):
+        for size, default in benchmark.SIZES.items():
+            parser.add_argument(f"--{size}", type=int, default=default)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[scenario.name for scenario in benchmark.SCENARIOS],
+            help="Run only this scenario, can be repeated.",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="Keep the cache between requests instead of clearing it.",
+        )
+        parser.add_argument("--baseline", help="JSON results of an earlier run.")
+        parser.add_argument("--tolerance", type=float, default=1.5)
+        parser.add_argument("--save-baseline", help="Write the results as JSON.")
+
+    def handle(self, *args, **options):
+        scenarios = [
+            scenario
+            for scenario in benchmark.SCENARIOS
+            if not options["scenario"] or scenario.name in options["scenario"]
+        ]
+        baseline = options["baseline"] and benchmark.load_baseline(options["baseline"])
+
+        # A private cache keeps the rolled back movies out of the shared one,
+        # and the flusher thread of write-behind ratings would write outside
+        # the transaction.
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "benchmark",
+                }
+            },
+            RATING_WRITE_BEHIND=False,
+        ), transaction.atomic():
+            self.reset_indexes()
+            try:
+                self.stdout.write("Seeding the catalog...")
+                seeded = benchmark.seed_catalog(
+                    {size: options[size] for size in benchmark.SIZES}, options["seed"]
+                )
+                results = benchmark.run(
+                    seeded,
+                    scenarios,
+                    options["iterations"],
+                    options["warmup"],
+                    cold=not options["warm"],
+                )
+            finally:
+                self.reset_indexes()
+                transaction.set_rollback(True)
+
+        for line in benchmark.report(results):
+            self.stdout.write(line)
+        if options["save_baseline"]:
+            benchmark.save_baseline(options["save_baseline"], results)
+
+        failures = benchmark.check(results, baseline, options["tolerance"])
+        if failures:
+            raise CommandError("\n".join(failures))
+
+    def reset_indexes(self):
+        # The in-memory indexes must not keep the rolled back movies.
+        catalog.reset()
+        autocomplete.reset()
+        leaderboards.reset()
@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+
+from api import models
+from api import renderers
+from api import serializers
+
+
+def sample_movie(number):
+    return {
+        "title": f"Benchmark movie {number}",
+        "year": str(1950 + number % 70),
+        "genres": [f"Genre {number % 7}", f"Genre {number % 11}"],
+        "ratings": [number % 11, (number * 7) % 11],
+        "poster": f"movie-{number}.jpg",
+        "content_rating": "PG-13",
+        "duration": "PT1H52M",
+        "release_date": "2001-04-25",
+        "average_rating": 7.5,
+        "original_title": f"Original benchmark movie {number}",
+        "storyline": "A movie made up for benchmarking. " * 4,
+        "actors": [f"Actor {number % 50 + offset}" for offset in range(4)],
+        "imdb_rating": "8.1",
+        "posterurl": f"https://example.com/movie-{number}.jpg",
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per movie cost of building and rendering movie payloads with "
+        "the ModelSerializer and library renderer (before) and with the values() "
+        "rows and api renderer (after). Runs on sample movies created in a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--movies", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def best_time(self, function, repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def handle(self, *args, **options):
+        count, repeat = options["movies"], options["repeat"]
+
+        with transaction.atomic():
+            records = serializers.CreateUpdateMovieSerializer(
+                data=[sample_movie(number) for number in range(count)], many=True
+            )
+            records.is_valid(raise_exception=True)
+            movie_ids = [movie.id for movie in records.save()]
+            movies = models.Movie.objects.filter(id__in=movie_ids).order_by("id")
+
+            def serialize():
+                # A new queryset each time, the results of one are cached.
+                instances = list(movies.all())
+                prefetch_related_objects(instances, "actors", "genres")
+                return serializers.MovieSerializer(instances, many=True).data
+
+            def rows():
+                return serializers.movie_rows(movies)
+
+            payload = {"count": count, "next": None, "previous": None}
+            before_page = {**payload, "results": serialize()}
+            after_page = {**payload, "results": rows()}
+            library, fast = CamelCaseJSONRenderer(), renderers.CamelCaseJSONRenderer()
+            if library.render(before_page) != fast.render(after_page):
+                self.stderr.write("The fast path output differs from the slow one.")
+
+            stages = [
+                ("build", serialize, rows),
+                (
+                    "render",
+                    lambda: library.render(before_page),
+                    lambda: fast.render(after_page),
+                ),
+                (
+                    "total",
+                    lambda: library.render({**payload, "results": serialize()}),
+                    lambda: fast.render({**payload, "results": rows()}),
+                ),
+            ]
+
+            self.stdout.write(f"{'stage':<8}{'before':>14}{'after':>14}{'speedup':>10}")
+            for name, before, after in stages:
+                before_time = self.best_time(before, repeat) / count * 1e6
+                after_time = self.best_time(after, repeat) / count * 1e6
+                self.stdout.write(
+                    f"{name:<8}{before_time:>11.1f} us{after_time:>11.1f} us"
+                    f"{before_time / after_time:>9.1f}x"
+                )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import similarity
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar movies of every movie."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = similarity.rebuild()
+        self.stdout.write(
+            f"Computed the similar movies of {count} movies in "
+            f"{time.monotonic() - started:.1f}s."
+        )
@@ -0,0 +1,158 @@
+import collections
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from api import caching
+from api import importer
+from api import ingest
+from api import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        "Import movies from a JSON array or NDJSON file in bulk_load format, "
+        "streaming it in batches. Invalid records are written to a rejects file "
+        "and progress is checkpointed after every batch, so an interrupted "
+        "import resumes where it stopped when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=importer.FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Validating processes, 0 to validate in this process.",
+        )
+        parser.add_argument("--checkpoint", help="Defaults to PATH.checkpoint.")
+        parser.add_argument("--rejects", help="Defaults to PATH.rejects.ndjson.")
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignore the saved progress."
+        )
+        parser.add_argument("--progress-interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+
+        checkpoint = importer.Checkpoint(
+            options["checkpoint"] or f"{path}.checkpoint", path
+        )
+        try:
+            resumed = not options["restart"] and checkpoint.load()
+        except importer.ImportFileError as error:
+            raise CommandError(f"{error} Run with --restart to start over.")
+        if resumed:
+            self.stdout.write(
+                f"Resuming at byte {checkpoint.offset}, after "
+                f"{checkpoint.counts['read']} records."
+            )
+
+        rejects_path = options["rejects"] or f"{path}.rejects.ndjson"
+        with open(rejects_path, "a" if resumed else "w") as rejects:
+            if resumed and checkpoint.rejects_offset is not None:
+                # Batches after the checkpoint are validated again: drop the
+                # rejects they already wrote.
+                size = os.fstat(rejects.fileno()).st_size
+                rejects.truncate(min(checkpoint.rejects_offset, size))
+            try:
+                self.run(checkpoint, rejects, options)
+            except importer.ImportFileError as error:
+                raise CommandError(f"{error} Progress is saved in {checkpoint.path}.")
+            except KeyboardInterrupt:
+                raise CommandError(
+                    f"Interrupted. Progress is saved in {checkpoint.path}, run the "
+                    "same command to resume."
+                )
+            finally:
+                # Other processes only see the new movies once their pages expire.
+                caching.invalidate_catalog()
+
+        checkpoint.delete()
+        self.report(checkpoint, done=True)
+        if checkpoint.counts["imported"]:
+            # One rebuild costs less than updating the lists batch by batch.
+            self.stdout.write("Computing similar movies...")
+            similarity.rebuild()
+        if checkpoint.counts["rejected"]:
+            self.stdout.write(f"Rejected records are listed in {rejects_path}.")
+
+    def run(self, checkpoint, rejects, options):
+        records = importer.iter_records(
+            options["path"], checkpoint.offset, options["format"]
+        )
+        batches = iter(
+            lambda: list(itertools.islice(records, options["batch_size"])), []
+        )
+
+        self.started = time.monotonic()
+        self.reported = self.started
+        self.start_count = checkpoint.counts["read"]
+
+        workers = options["workers"]
+        executor = None
+        if workers > 0:
+            executor = ProcessPoolExecutor(workers, initializer=django.setup)
+        # At most two batches per worker are read ahead, bounding memory.
+        in_flight = collections.deque()
+        try:
+            for batch in batches:
+                items = [item for item, _ in batch]
+                if executor is None:
+                    future = importer.completed(importer.validate, items)
+                else:
+                    future = executor.submit(importer.validate, items)
+                in_flight.append((batch, future))
+                if len(in_flight) > max(2 * workers, 1):
+                    self.commit(*in_flight.popleft(), checkpoint, rejects, options)
+            while in_flight:
+                self.commit(*in_flight.popleft(), checkpoint, rejects, options)
+        finally:
+            if executor is not None:
+                # shutdown(cancel_futures=True) needs Python 3.9.
+                for _, future in in_flight:
+                    future.cancel()
+                executor.shutdown()
+
+    def commit(self, batch, future, checkpoint, rejects, options):
+        valid, rejected = future.result()
+        created = ingest.load_movies(valid) if valid else []
+
+        first = checkpoint.counts["read"]
+        for index, errors in rejected:
+            item = batch[index][0]
+            if isinstance(item, bytes):
+                item = item.decode("utf-8", "replace").rstrip("\n")
+            entry = {"record": first + index, "errors": errors, "data": item}
+            rejects.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        rejects.flush()
+        rejects_offset = os.fstat(rejects.fileno()).st_size
+
+        checkpoint.counts["read"] += len(batch)
+        checkpoint.counts["imported"] += len(created)
+        checkpoint.counts["skipped"] += len(valid) - len(created)
+        checkpoint.counts["rejected"] += len(rejected)
+        checkpoint.save(batch[-1][1], rejects_offset)
+
+        if time.monotonic() - self.reported >= options["progress_interval"]:
+            self.report(checkpoint)
+            self.reported = time.monotonic()
+
+    def report(self, checkpoint, done=False):
+        elapsed = time.monotonic() - self.started
+        read = checkpoint.counts["read"] - self.start_count
+        rate = read / elapsed if elapsed else 0
+        counts = ", ".join(f"{n} {counter}" for counter, n in checkpoint.counts.items())
+        message = f"{counts} ({rate:.0f} records/s)"
+        if done:
+            message = f"Done in {elapsed:.1f}s: {message}"
+        self.stdout.write(message)
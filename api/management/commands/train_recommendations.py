@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Train the item-item recommendation model from the stored ratings and "
+        "favorites. Serving processes pick up the new model on their next request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Defaults to RECOMMENDATION_MODEL_PATH.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users, movies = recommendations.train(options["output"])
+        self.stdout.write(
+            f"Trained on the likes of {users} users, {movies} movies have "
+            f"neighbors ({time.monotonic() - started:.1f}s)."
+        )
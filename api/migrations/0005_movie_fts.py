@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(
+        """
+        CREATE VIRTUAL TABLE api_movie_fts USING fts5(
+            title, original_title, storyline, actors,
+            prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    # Title matches weigh the most, then original title, actors and storyline.
+    schema_editor.execute(
+        "INSERT INTO api_movie_fts (api_movie_fts, rank) "
+        "VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0)')"
+    )
+    schema_editor.execute(
+        """
+        INSERT INTO api_movie_fts (rowid, title, original_title, storyline, actors)
+        SELECT movie.id, movie.title, movie.original_title, movie.storyline, COALESCE((
+            SELECT GROUP_CONCAT(actor.name, ' ')
+            FROM api_movie_actors movie_actor
+            JOIN api_actor actor ON actor.id = movie_actor.actor_id
+            WHERE movie_actor.movie_id = movie.id
+        ), '')
+        FROM api_movie movie
+        """
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute("DROP TABLE api_movie_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_rating_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:30
+
+import api.models
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    Movie = apps.get_model("api", "Movie")
+    Rating = apps.get_model("api", "Rating")
+
+    histograms = {}
+    rows = (
+        Rating.objects.values("movie_id", "value")
+        .annotate(n=Count("id"))
+        .values_list("movie_id", "value", "n")
+    )
+    for movie_id, value, n in rows:
+        histogram = histograms.setdefault(movie_id, [0] * 11)
+        histogram[min(max(value, 0), 10)] += n
+
+    movies = []
+    for movie_id, histogram in histograms.items():
+        count = sum(histogram)
+        movies.append(
+            Movie(
+                id=movie_id,
+                rating_count=count,
+                rating_mean=sum(v * n for v, n in enumerate(histogram)) / count,
+                rating_histogram=histogram,
+            )
+        )
+    Movie.objects.bulk_update(
+        movies, ["rating_count", "rating_mean", "rating_histogram"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_movie_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_histogram',
+            field=models.JSONField(default=api.models.empty_rating_histogram),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_mean',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
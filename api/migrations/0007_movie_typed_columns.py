@@ -0,0 +1,196 @@
+import datetime
+import re
+
+from django.db import migrations, models
+
+DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$"
+)
+
+CONTENT_RATINGS = [("", "Not rated")] + [
+    (rating, rating)
+    for rating in (
+        "G PG PG-13 R NC-17 NR UNRATED APPROVED PASSED GP M X "
+        "TV-Y TV-Y7 TV-G TV-PG TV-14 TV-MA U 12A R18 L"
+    ).split()
+    + [str(age) for age in range(1, 22)]
+]
+
+
+def parse_year(value):
+    match = re.search(r"\d{4}", value)
+    return int(match.group()) if match else None
+
+
+def parse_duration(value):
+    value = value.strip().upper()
+    match = DURATION_PATTERN.match(value)
+    if not match or value in ("P", "PT"):
+        return None
+
+    parts = {key: int(part) for key, part in match.groupdict(default="0").items()}
+    return (
+        parts["days"] * 86400
+        + parts["hours"] * 3600
+        + parts["minutes"] * 60
+        + parts["seconds"]
+    )
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def parse_content_rating(value):
+    # Unknown ratings are kept as given.
+    value = value.strip()
+    return {rating.upper(): rating for rating, _ in CONTENT_RATINGS}.get(
+        value.upper(), value
+    )
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return ""
+
+    minutes, seconds = divmod(seconds, 60)
+    return f"PT{minutes}M{seconds}S" if seconds else f"PT{minutes}M"
+
+
+def backfill_typed_columns(apps, schema_editor):
+    Movie = apps.get_model("api", "Movie")
+
+    movies = []
+    rows = Movie.objects.values_list(
+        "id", "year", "duration", "release_date", "content_rating"
+    )
+    for movie_id, year, duration, release_date, content_rating in rows.iterator():
+        movies.append(
+            Movie(
+                id=movie_id,
+                typed_year=parse_year(year),
+                typed_duration=parse_duration(duration),
+                typed_release_date=parse_date(release_date),
+                typed_content_rating=parse_content_rating(content_rating),
+            )
+        )
+    Movie.objects.bulk_update(
+        movies,
+        [
+            "typed_year",
+            "typed_duration",
+            "typed_release_date",
+            "typed_content_rating",
+        ],
+        batch_size=500,
+    )
+
+
+def restore_text_columns(apps, schema_editor):
+    Movie = apps.get_model("api", "Movie")
+
+    movies = []
+    rows = Movie.objects.values_list(
+        "id",
+        "typed_year",
+        "typed_duration",
+        "typed_release_date",
+        "typed_content_rating",
+    )
+    for movie_id, year, duration, release_date, content_rating in rows.iterator():
+        movies.append(
+            Movie(
+                id=movie_id,
+                year="" if year is None else str(year),
+                duration=format_duration(duration),
+                release_date="" if release_date is None else release_date.isoformat(),
+                content_rating=content_rating,
+            )
+        )
+    Movie.objects.bulk_update(
+        movies, ["year", "duration", "release_date", "content_rating"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_movie_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='typed_year',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='typed_duration',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='typed_release_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='typed_content_rating',
+            field=models.CharField(blank=True, default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_typed_columns, restore_text_columns),
+        # A default lets the text columns be added back to existing rows when
+        # the migration is reversed.
+        *[
+            migrations.AlterField(
+                model_name='movie',
+                name=name,
+                field=models.CharField(default='', max_length=255),
+            )
+            for name in ['year', 'duration', 'release_date', 'content_rating']
+        ],
+        migrations.RemoveField(model_name='movie', name='year'),
+        migrations.RemoveField(model_name='movie', name='duration'),
+        migrations.RemoveField(model_name='movie', name='release_date'),
+        migrations.RemoveField(model_name='movie', name='content_rating'),
+        migrations.RenameField(
+            model_name='movie', old_name='typed_year', new_name='year'
+        ),
+        migrations.RenameField(
+            model_name='movie', old_name='typed_duration', new_name='duration'
+        ),
+        migrations.RenameField(
+            model_name='movie', old_name='typed_release_date', new_name='release_date'
+        ),
+        migrations.RenameField(
+            model_name='movie',
+            old_name='typed_content_rating',
+            new_name='content_rating',
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='year',
+            field=models.PositiveSmallIntegerField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='duration',
+            field=models.PositiveIntegerField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='release_date',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='content_rating',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+    ]
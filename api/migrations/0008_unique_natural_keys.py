@@ -0,0 +1,126 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:41
+
+import json
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def duplicate_groups(model, field):
+    """
+    ``(kept id, duplicate ids)`` for every repeated ``field`` value, keeping
+    the oldest row.
+    """
+    repeated = (
+        model.objects.values(field)
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+        .values_list(field, "keep")
+    )
+    for value, keep in repeated:
+        duplicates = (
+            model.objects.filter(**{field: value})
+            .exclude(id=keep)
+            .values_list("id", flat=True)
+        )
+        yield keep, list(duplicates)
+
+
+def repoint(through, column, other, keep, duplicates):
+    """
+    Move the ``through`` rows of ``duplicates`` to ``keep``, dropping the ones
+    that would link the same ``other`` row twice.
+    """
+    linked = set(through.objects.filter(**{column: keep}).values_list(other, flat=True))
+    moved, dropped = [], []
+    rows = (
+        through.objects.filter(**{f"{column}__in": duplicates})
+        .order_by("id")
+        .values_list("id", other)
+    )
+    for row_id, other_id in rows:
+        if other_id in linked:
+            dropped.append(row_id)
+        else:
+            linked.add(other_id)
+            moved.append(row_id)
+    through.objects.filter(id__in=dropped).delete()
+    through.objects.filter(id__in=moved).update(**{column: keep})
+
+
+def rebuild_rating_summary(Movie, Rating, movie_id):
+    histogram = [0] * 11
+    for value in Rating.objects.filter(movie_id=movie_id).values_list(
+        "value", flat=True
+    ):
+        histogram[min(max(value, 0), 10)] += 1
+
+    count = sum(histogram)
+    Movie.objects.filter(id=movie_id).update(
+        rating_count=count,
+        rating_mean=(
+            sum(v * n for v, n in enumerate(histogram)) / count if count else None
+        ),
+        rating_histogram=histogram,
+    )
+
+
+def merge_duplicates(apps, schema_editor):
+    Actor = apps.get_model("api", "Actor")
+    Genre = apps.get_model("api", "Genre")
+    Movie = apps.get_model("api", "Movie")
+    Rating = apps.get_model("api", "Rating")
+
+    for model, relation, column in (
+        (Actor, "actors", "actor_id"),
+        (Genre, "genres", "genre_id"),
+    ):
+        through = Movie._meta.get_field(relation).remote_field.through
+        for keep, duplicates in duplicate_groups(model, "name"):
+            repoint(through, column, "movie_id", keep, duplicates)
+            model.objects.filter(id__in=duplicates).delete()
+
+    # Duplicate movies come from racing creates of the same record: the oldest
+    # keeps its own actors and genres, and takes over ratings and favorites.
+    favorites = Movie._meta.get_field("user_favorites").remote_field.through
+    removed = []
+    for keep, duplicates in duplicate_groups(Movie, "title"):
+        repoint(favorites, "movie_id", "user_id", keep, duplicates)
+        Rating.objects.filter(movie_id__in=duplicates).update(movie_id=keep)
+        rebuild_rating_summary(Movie, Rating, keep)
+        Movie.objects.filter(id__in=duplicates).delete()
+        removed += duplicates
+
+    if removed and schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM api_movie_fts WHERE rowid IN "
+                "(SELECT value FROM json_each(%s))",
+                [json.dumps(removed)],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_movie_typed_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='actor',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='genre',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='title',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
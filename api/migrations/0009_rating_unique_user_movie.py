@@ -0,0 +1,61 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:48
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_ratings(apps, schema_editor):
+    """
+    Keep the latest rating of each user for a movie and rebuild the rating
+    summaries of the movies that had duplicates.
+    """
+    Movie = apps.get_model("api", "Movie")
+    Rating = apps.get_model("api", "Rating")
+
+    repeated = (
+        Rating.objects.filter(user__isnull=False)
+        .values("user_id", "movie_id")
+        .annotate(count=Count("id"), keep=Max("id"))
+        .filter(count__gt=1)
+        .values_list("user_id", "movie_id", "keep")
+    )
+    movie_ids = set()
+    for user_id, movie_id, keep in repeated:
+        Rating.objects.filter(user_id=user_id, movie_id=movie_id).exclude(
+            id=keep
+        ).delete()
+        movie_ids.add(movie_id)
+
+    for movie_id in movie_ids:
+        histogram = [0] * 11
+        values = Rating.objects.filter(movie_id=movie_id).values_list(
+            "value", flat=True
+        )
+        for value in values:
+            histogram[min(max(value, 0), 10)] += 1
+
+        count = sum(histogram)
+        Movie.objects.filter(id=movie_id).update(
+            rating_count=count,
+            rating_mean=(
+                sum(v * n for v, n in enumerate(histogram)) / count if count else None
+            ),
+            rating_histogram=histogram,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_unique_natural_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'movie'), name='unique_user_rating'
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_movie_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarMovie',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar', to='api.movie')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.movie')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similarmovie',
+            index=models.Index(fields=['movie', '-score'], name='api_similar_movie_i_794d05_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_favorites_counts(apps, schema_editor):
+    Movie = apps.get_model("api", "Movie")
+
+    rows = (
+        Movie.user_favorites.through.objects.values("movie_id")
+        .annotate(n=Count("id"))
+        .values_list("movie_id", "n")
+    )
+    Movie.objects.bulk_update(
+        [Movie(id=movie_id, favorites_count=n) for movie_id, n in rows],
+        ["favorites_count"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_similar_movie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='average_rating',
+            field=models.FloatField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='imdb_rating',
+            field=models.FloatField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='rating_mean',
+            field=models.FloatField(db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-year', 'id'], name='movie_year_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-duration', 'id'], name='movie_duration_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-release_date', 'id'], name='movie_release_date_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-imdb_rating', 'id'], name='movie_imdb_rating_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-average_rating', 'id'], name='movie_average_rating_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-rating_mean', 'id'], name='movie_rating_mean_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-favorites_count', 'id'], name='movie_favorites_count_desc'),
+        ),
+        migrations.RunPython(backfill_favorites_counts, migrations.RunPython.noop),
+    ]
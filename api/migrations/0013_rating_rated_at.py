@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_movie_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='rated_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -1,33 +1,116 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils import timezone
 
 
 class Genre(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
 
 
 class Actor(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
+
+
+CONTENT_RATINGS = [("", "Not rated")] + [
+    (rating, rating)
+    for rating in (
+        "G PG PG-13 R NC-17 NR UNRATED APPROVED PASSED GP M X "
+        "TV-Y TV-Y7 TV-G TV-PG TV-14 TV-MA U 12A R18 L"
+    ).split()
+    + [str(age) for age in range(1, 22)]
+]
+
+
+def empty_rating_histogram():
+    return [0] * 11
 
 
 class Movie(models.Model):
-    title = models.CharField(max_length=255)
-    year = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, unique=True)
+    year = models.PositiveSmallIntegerField(null=True, db_index=True)
     genres = models.ManyToManyField(Genre)
     poster = models.CharField(max_length=255)
-    content_rating = models.CharField(max_length=255)
-    duration = models.CharField(max_length=255)
-    release_date = models.CharField(max_length=255)
-    average_rating = models.FloatField()
+    # One of CONTENT_RATINGS, or a legacy rating kept as given.
+    content_rating = models.CharField(max_length=255, blank=True, db_index=True)
+    duration = models.PositiveIntegerField(null=True, db_index=True)
+    release_date = models.DateField(null=True, db_index=True)
+    average_rating = models.FloatField(db_index=True)
     original_title = models.CharField(max_length=255)
     storyline = models.CharField(max_length=255)
     actors = models.ManyToManyField(Actor)
-    imdb_rating = models.FloatField(max_length=255)
+    imdb_rating = models.FloatField(max_length=255, db_index=True)
     posterurl = models.CharField(max_length=255)
     user_favorites = models.ManyToManyField(User)
+    # Number of user_favorites, kept by api.favorites for ordering.
+    favorites_count = models.PositiveIntegerField(default=0, db_index=True)
+    rating_count = models.IntegerField(default=0)
+    rating_mean = models.FloatField(null=True, db_index=True)
+    rating_histogram = models.JSONField(default=empty_rating_histogram)
+    # Bumped by every write that changes the movie document.
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Descending orderings break ties by ascending id, which the single
+        # column indexes only serve in ascending order.
+        indexes = [
+            models.Index(fields=[f"-{field}", "id"], name=f"movie_{field}_desc")
+            for field in [
+                "year",
+                "duration",
+                "release_date",
+                "imdb_rating",
+                "average_rating",
+                "rating_mean",
+                "favorites_count",
+            ]
+        ]
 
 
 class Rating(models.Model):
     movie = models.ForeignKey(Movie, related_name="ratings", on_delete=models.CASCADE)
     value = models.IntegerField()
     user = models.ForeignKey(User, related_name="ratings", on_delete=models.SET_NULL, null=True)
+    # When the value was given, which orders the replays of api.rate_log.
+    rated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "movie"], name="unique_user_rating")
+        ]
+
+
+class SimilarMovie(models.Model):
+    """
+    One of the precomputed nearest neighbors of a movie, see ``api.similarity``.
+    """
+
+    movie = models.ForeignKey(Movie, related_name="similar", on_delete=models.CASCADE)
+    neighbor = models.ForeignKey(Movie, related_name="+", on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["movie", "-score"])]
+
+
+class ResourceVersion(models.Model):
+    """
+    Version of a collection without a row of its own to carry one.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def bump(cls, name):
+        updated = cls.objects.filter(name=name).update(
+            version=F("version") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(name=name)
+
+    @classmethod
+    def get(cls, name):
+        return cls.objects.get_or_create(name=name)[0]
@@ -1,10 +1,154 @@
+import base64
+import binascii
+import bisect
+import json
+
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Paginates by the values of the queryset ordering (which must end with a
+    unique field) instead of an offset, so every page costs the same.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = [str(field) for field in queryset.query.order_by]
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # Pin down where NULLs go, the ordering must match ``after``.
+        queryset = queryset.order_by(
+            *(
+                F(field[1:]).desc(nulls_last=True)
+                if field.startswith("-")
+                else F(field).asc(nulls_first=True)
+                for field in self.ordering
+            )
+        )
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.page:
+            last = self.page[-1]
+            self.last_position = [
+                getattr(last, field.lstrip("-")) for field in self.ordering
+            ]
+        return self.page
+
+    def paginate_ids(self, ids, request):
+        """
+        Page of a sorted sequence of ids, found by bisection.
+        """
+        self.request = request
+        self.ordering = ["id"]
+
+        start = 0
+        position = self.decode_cursor(request)
+        if position is not None:
+            if not isinstance(position[0], int):
+                raise NotFound(self.invalid_cursor_message)
+            start = bisect.bisect_right(ids, position[0])
+
+        self.page = list(ids[start : start + self.page_size])
+        self.has_next = start + self.page_size < len(ids)
+        if self.page:
+            self.last_position = [self.page[-1]]
+        return self.page
+
+    def after(self, position):
+        """
+        Lexicographic ``(ordering) > position`` condition.
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            condition |= equal & self.beyond(name, value, field.startswith("-"))
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def beyond(name, value, descending):
+        """
+        Rows whose ``name`` sorts strictly after ``value``, NULLs being the
+        smallest values.
+        """
+        if value is None:
+            return Q(pk__in=[]) if descending else Q(**{f"{name}__isnull": False})
+        if descending:
+            return Q(**{f"{name}__lt": value}) | Q(**{f"{name}__isnull": True})
+        return Q(**{f"{name}__gt": value})
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        except (TypeError, ValueError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        encoded = json.dumps(position, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(encoded).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
 
 
 class Pagination(pagination.PageNumberPagination):
+    """
+    Page number pagination, switching to keyset pagination when the request
+    carries a ``cursor`` parameter (empty for the first page).
+    """
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_ids(self, ids, request):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_ids(ids, request)
+        return super().paginate_queryset(ids, request)
+
     def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+
         return Response(
             {
                 "next": self.get_next_link(),
@@ -0,0 +1,263 @@
+"""
+Write-behind mode of the rate endpoint, enabled with ``RATING_WRITE_BEHIND``.
+
+Accepted ratings are appended (and fsynced) to a per-process log file in
+``RATING_LOG_DIR`` and acknowledged at once. A background thread flushes them
+every ``RATING_FLUSH_INTERVAL`` seconds: the log is rotated, repeated writes
+of a (user, movie) pair are coalesced, and the rest is written in one
+transaction with ``rates.write``. A log is only deleted once written, and logs
+left behind by dead processes are claimed (renamed as logs of this process)
+and replayed by the next flush, so accepted ratings survive a crash. Entries
+carry the time they were accepted: a replay never overwrites a rating given
+later.
+
+Until they are flushed, pending ratings are folded into ``user_rate`` and the
+rating summaries served by the process that accepted them.
+"""
+
+import atexit
+import datetime
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from api import aggregates
+from api import caching
+from api import models
+from api import rates
+
+logger = logging.getLogger(__name__)
+
+# (user_id, movie_id) -> (stored value, pending value), None meaning no rating.
+_pending = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_log = None
+_rotations = itertools.count()
+_flusher = None
+
+
+def _directory():
+    return Path(settings.RATING_LOG_DIR)
+
+
+def _stored_value(user_id, movie_id):
+    return (
+        models.Rating.objects.filter(user_id=user_id, movie_id=movie_id)
+        .values_list("value", flat=True)
+        .first()
+    )
+
+
+def append(user_id, movie_id, rate):
+    """
+    Durably accept a rating (``None`` deleting it) to be written later.
+    """
+    key = (user_id, movie_id)
+    stored = None if key in _pending else _stored_value(user_id, movie_id)
+
+    global _log
+    with _lock:
+        if _log is None:
+            _directory().mkdir(parents=True, exist_ok=True)
+            _log = open(_directory() / f"ratings-{os.getpid()}.log", "a")
+        _log.write(json.dumps([user_id, movie_id, rate, time.time()]) + "\n")
+        _log.flush()
+        os.fsync(_log.fileno())
+
+        _pending[key] = (_pending.get(key, (stored,))[0], rate)
+
+    _start_flusher()
+
+
+def pending_rates(user_id, movie_ids):
+    """
+    ``{movie_id: rate}`` of the pending ratings of a user, ``None`` deleting.
+    """
+    if not _pending:
+        return {}
+
+    movie_ids = set(movie_ids)
+    with _lock:
+        return {
+            movie_id: rate
+            for (pending_user_id, movie_id), (_, rate) in _pending.items()
+            if pending_user_id == user_id and movie_id in movie_ids
+        }
+
+
+def with_pending_summaries(payloads):
+    """
+    ``MovieSerializer`` payloads with the pending ratings counted in their
+    rating summaries.
+    """
+    if not _pending:
+        return payloads
+
+    changes = {}
+    movie_ids = {payload["id"] for payload in payloads}
+    with _lock:
+        for (_, movie_id), (stored, rate) in _pending.items():
+            if movie_id in movie_ids and rate != stored:
+                added, removed = changes.setdefault(movie_id, ([], []))
+                if rate is not None:
+                    added.append(rate)
+                if stored is not None:
+                    removed.append(stored)
+
+    if not changes:
+        return payloads
+
+    results = []
+    for payload in payloads:
+        if payload["id"] in changes:
+            histogram = payload["rating_summary"]["histogram"]
+            movie = models.Movie()
+            aggregates.set_histogram(
+                movie, aggregates.adjust(histogram, *changes[payload["id"]])
+            )
+            payload = {**payload, "rating_summary": aggregates.summary(movie)}
+        results.append(payload)
+    return results
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _rotated_path():
+    return _directory() / f"ratings-{os.getpid()}.{next(_rotations)}.flushing"
+
+
+def _replayable_logs():
+    """
+    Logs to write, oldest first: rotated logs of this process and every log
+    of dead processes, which are first renamed as rotated logs of this one so
+    that only one process replays them.
+    """
+    logs = []
+    for path in _directory().glob("ratings-*"):
+        pid = int(path.name.split(".")[0].split("-")[1])
+        if pid == os.getpid() and path.suffix == ".flushing":
+            logs.append(path)
+        elif not _alive(pid):
+            claimed = _rotated_path()
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Claimed by another process.
+                continue
+            logs.append(claimed)
+    return sorted(logs, key=lambda path: path.stat().st_mtime)
+
+
+def _read(logs):
+    """
+    ``{(user_id, movie_id): rate}`` of the latest entries of the logs, and
+    ``{(user_id, movie_id): datetime}`` of when they were accepted.
+    """
+    values, times = {}, {}
+    for path in logs:
+        with open(path) as log:
+            for line in log:
+                if not line.endswith("\n"):
+                    continue
+                # Entries written before they carried a time are the oldest.
+                user_id, movie_id, rate, *stamp = json.loads(line)
+                key, accepted_at = (user_id, movie_id), stamp[0] if stamp else 0.0
+                if key not in times or accepted_at >= times[key]:
+                    values[key], times[key] = rate, accepted_at
+    return values, {
+        key: datetime.datetime.fromtimestamp(accepted_at, datetime.timezone.utc)
+        for key, accepted_at in times.items()
+    }
+
+
+def flush():
+    """
+    Write the accepted ratings, returning the ids of the changed movies.
+    """
+    global _log
+    with _flush_lock:
+        with _lock:
+            flushing = dict(_pending)
+            if _log is not None:
+                _log.close()
+                _log = None
+                path = _directory() / f"ratings-{os.getpid()}.log"
+                path.rename(_rotated_path())
+
+        if not _directory().exists():
+            return set()
+        logs = _replayable_logs()
+        values, times = _read(logs)
+
+        # Pending ratings stay visible until written, failures included: the
+        # logs are then replayed by the next flush.
+        movie_ids = rates.write(values, times) if values else set()
+
+        with _lock:
+            for key, (stored, rate) in flushing.items():
+                if _pending.get(key) == (stored, rate):
+                    del _pending[key]
+                elif key in _pending:
+                    _pending[key] = (values.get(key), _pending[key][1])
+        for path in logs:
+            path.unlink(missing_ok=True)
+        caching.invalidate_movies(movie_ids)
+        return movie_ids
+
+
+def pending_marker(movie_id):
+    """
+    The pending ratings of a movie, to tell apart the states of its document.
+    """
+    if not _pending:
+        return ()
+
+    with _lock:
+        return tuple(
+            sorted(
+                (user_id, rate)
+                for (user_id, pending_movie_id), (_, rate) in _pending.items()
+                if pending_movie_id == movie_id
+            )
+        )
+
+
+def _run():
+    while True:
+        time.sleep(settings.RATING_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Could not flush the rating log")
+        finally:
+            close_old_connections()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run, name="rating-log-flusher", daemon=True
+            )
+            _flusher.start()
+            atexit.register(flush)
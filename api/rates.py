@@ -0,0 +1,173 @@
+"""
+Set-based rating writes, shared by the rate endpoints and the write-behind
+flusher of ``api.rate_log``.
+"""
+
+from django.db import IntegrityError
+from django.db import transaction
+from django.utils import timezone
+
+from api import aggregates
+from api import autocomplete
+from api import leaderboards
+from api import models
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+
+CHANGED = {CREATED, UPDATED, DELETED}
+
+# Attempts of a write whose new ratings keep being created by other writers.
+ATTEMPTS = 3
+
+
+def _existing_movie_ids(movie_ids):
+    return set(
+        models.Movie.objects.filter(id__in=movie_ids).values_list("id", flat=True)
+    )
+
+
+def _committed(keys):
+    """
+    ``{(user_id, movie_id): (rating id, value, rated_at)}`` of the stored
+    ratings of ``keys``.
+    """
+    rows = models.Rating.objects.filter(
+        user_id__in={user_id for user_id, _ in keys},
+        movie_id__in={movie_id for _, movie_id in keys},
+    ).values_list("id", "user_id", "movie_id", "value", "rated_at")
+    return {
+        (user_id, movie_id): (rating_id, value, rated_at)
+        for rating_id, user_id, movie_id, value, rated_at in rows
+        if (user_id, movie_id) in keys
+    }
+
+
+def _save(committed, values, rated_at=None):
+    """
+    Turn the ``committed`` ratings into ``values`` (``None`` deleting) with one
+    statement per kind of write, and return the ids of the changed movies.
+    Ratings are stamped with their time in ``rated_at``, or now.
+    """
+    now = timezone.now()
+    rated_at = rated_at or {}
+    created, updated, deleted = [], [], []
+    changes, counts = {}, {}
+    for (user_id, movie_id), value in values.items():
+        rating_id, old, _ = committed.get((user_id, movie_id), (None, None, None))
+        if value == old:
+            continue
+        when = rated_at.get((user_id, movie_id), now)
+        if rating_id is None:
+            created.append(
+                models.Rating(
+                    user_id=user_id, movie_id=movie_id, value=value, rated_at=when
+                )
+            )
+            counts[movie_id] = counts.get(movie_id, 0) + 1
+        elif value is None:
+            deleted.append(rating_id)
+            counts[movie_id] = counts.get(movie_id, 0) - 1
+        else:
+            updated.append(models.Rating(id=rating_id, value=value, rated_at=when))
+
+        added, removed = changes.setdefault(movie_id, ([], []))
+        if value is not None:
+            added.append(value)
+        if old is not None:
+            removed.append(old)
+
+    models.Rating.objects.bulk_create(created)
+    models.Rating.objects.bulk_update(updated, ["value", "rated_at"])
+    if deleted:
+        models.Rating.objects.filter(id__in=deleted).delete()
+    if changes:
+        aggregates.apply_many(changes)
+        transaction.on_commit(lambda: leaderboards.update_movies(changes.keys()))
+    if counts:
+        transaction.on_commit(lambda: autocomplete.adjust_popularity(counts))
+    return set(changes)
+
+
+def _retrying(write):
+    """
+    Run ``write()`` in a savepoint, again when a rating it creates was created
+    meanwhile by another writer (tripping the unique user and movie): the next
+    attempt reads it and updates it instead.
+    """
+    for attempt in range(ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return write()
+        except IntegrityError:
+            if attempt == ATTEMPTS - 1:
+                raise
+
+
+@transaction.atomic
+def apply(user_id, operations):
+    """
+    Apply ``(movie_id, rate)`` operations of a user in order, a ``None`` rate
+    deleting the rating, and return the status of each operation.
+
+    Whatever the number of operations, this reads the movies and the user's
+    ratings once, then writes created, updated and deleted ratings and the
+    rating summaries with one statement each.
+    """
+    return _retrying(lambda: _apply(user_id, operations))
+
+
+def _apply(user_id, operations):
+    found = _existing_movie_ids({movie_id for movie_id, _ in operations})
+    committed = _committed({(user_id, movie_id) for movie_id in found})
+
+    values = {
+        movie_id: committed.get((user_id, movie_id), (None, None, None))[1]
+        for movie_id in found
+    }
+    statuses = []
+    for movie_id, rate in operations:
+        current = values.get(movie_id)
+        if movie_id not in found:
+            statuses.append(NOT_FOUND)
+        elif rate == current:
+            statuses.append(UNCHANGED)
+        elif rate is None:
+            statuses.append(DELETED)
+        else:
+            statuses.append(CREATED if current is None else UPDATED)
+        if movie_id in found:
+            values[movie_id] = rate
+
+    _save(committed, {(user_id, movie_id): rate for movie_id, rate in values.items()})
+    return statuses
+
+
+@transaction.atomic
+def write(values, rated_at=None):
+    """
+    Set the ``{(user_id, movie_id): rate}`` ratings, ``None`` deleting, and
+    return the ids of the movies whose ratings changed. Ratings of movies that
+    no longer exist are dropped, and so are those older in ``rated_at``
+    (``{(user_id, movie_id): datetime}``) than the stored rating.
+    """
+    return _retrying(lambda: _write(values, rated_at))
+
+
+def _write(values, rated_at):
+    found = _existing_movie_ids({movie_id for _, movie_id in values})
+    values = {key: rate for key, rate in values.items() if key[1] in found}
+    committed = _committed(values.keys())
+    if rated_at:
+        values = {
+            key: rate
+            for key, rate in values.items()
+            if key not in rated_at
+            or key not in committed
+            or committed[key][2] is None
+            or rated_at[key] > committed[key][2]
+        }
+    return _save(committed, values, rated_at)
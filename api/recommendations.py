@@ -0,0 +1,300 @@
+"""
+Personalized recommendations by item-item collaborative filtering.
+
+A user likes a movie they favorited or rated ``LIKED_RATING`` or more. Two
+movies are similar by the cosine of their columns in the binary user x movie
+matrix: the number of users liking both over the square root of the product
+of their numbers of fans. ``train`` computes the ``NEIGHBORS`` most similar
+movies of every movie offline, one row of the co-occurrence matrix at a time,
+and writes them to ``RECOMMENDATION_MODEL_PATH``.
+
+The model file is a header followed by flat arrays, in native byte order:
+
+* the sorted ids of the movies with neighbors,
+* the offsets of their neighbors (one more than movies),
+* the neighbor ids,
+* the ids of the most liked movies, to fill lists of users without history,
+* the float32 scores of the neighbors.
+
+Each process maps the file once (``get_model``) and reads the arrays in place,
+so a recommendation is a bisect and a slice per liked movie. Retraining
+replaces the file, which processes pick up on their next request.
+"""
+
+import array
+import bisect
+import collections
+import heapq
+import itertools
+import logging
+import math
+import mmap
+import operator
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+from api import favorites
+from api import models
+
+logger = logging.getLogger(__name__)
+
+LIKED_RATING = 7
+NEIGHBORS = 50
+POPULAR = 200
+# Only the latest likes of the heaviest users count: the work grows with the
+# square of a user's likes.
+MAX_USER_LIKES = 500
+CHUNK_SIZE = 10000
+
+MAGIC = b"MOVIEREC"
+BYTE_ORDER_MARK = 0x0102030405060708
+HEADER = struct.Struct("=8sqqqq")
+
+
+class ModelFileError(Exception):
+    pass
+
+
+class Model:
+    """
+    The arrays of a model file, mapped in memory.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.stat = os.fstat(file.fileno())
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+
+        view = memoryview(self._map)
+        if len(view) < HEADER.size:
+            raise ModelFileError(f"{path} is not a recommendation model.")
+        magic, mark, movies, pairs, popular = HEADER.unpack_from(view)
+        if magic != MAGIC or mark != BYTE_ORDER_MARK:
+            raise ModelFileError(
+                f"{path} is not a recommendation model of this platform."
+            )
+
+        arrays, position = [], HEADER.size
+        for typecode, length in [
+            ("q", movies),
+            ("q", movies + 1),
+            ("q", pairs),
+            ("q", popular),
+            ("f", pairs),
+        ]:
+            end = position + length * struct.calcsize(typecode)
+            arrays.append(view[position:end].cast(typecode))
+            position = end
+        if position != len(view):
+            raise ModelFileError(f"{path} is truncated.")
+        self.movies, self.offsets, self.neighbor_ids, self.popular, self.scores = arrays
+
+    def neighbors(self, movie_id):
+        """
+        ``(neighbor ids, scores)`` of a movie, best first.
+        """
+        index = bisect.bisect_left(self.movies, movie_id)
+        if index == len(self.movies) or self.movies[index] != movie_id:
+            return (), ()
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.neighbor_ids[start:end], self.scores[start:end]
+
+    def is_current(self, stat):
+        return (self.stat.st_ino, self.stat.st_mtime_ns) == (
+            stat.st_ino,
+            stat.st_mtime_ns,
+        )
+
+
+def _likes():
+    """
+    ``{user_id: array of liked movie ids}``, latest last.
+    """
+    ratings = (
+        models.Rating.objects.filter(user__isnull=False, value__gte=LIKED_RATING)
+        .order_by("id")
+        .values_list("user_id", "movie_id")
+    )
+    user_favorites = favorites.Favorite.objects.order_by("id").values_list(
+        "user_id", "movie_id"
+    )
+
+    likes = {}
+    for user_id, movie_id in itertools.chain(
+        ratings.iterator(chunk_size=CHUNK_SIZE),
+        user_favorites.iterator(chunk_size=CHUNK_SIZE),
+    ):
+        if user_id not in likes:
+            likes[user_id] = array.array("q")
+        likes[user_id].append(movie_id)
+
+    for user_id, movie_ids in likes.items():
+        latest = list(dict.fromkeys(reversed(movie_ids)))[:MAX_USER_LIKES]
+        likes[user_id] = array.array("q", reversed(latest))
+    return likes
+
+
+def _write(path, movies, offsets, neighbor_ids, popular, scores):
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(
+            HEADER.pack(
+                MAGIC, BYTE_ORDER_MARK, len(movies), len(neighbor_ids), len(popular)
+            )
+        )
+        for values in [movies, offsets, neighbor_ids, popular, scores]:
+            values.tofile(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def train(path=None):
+    """
+    Compute the model from the stored ratings and favorites and write it to
+    ``path`` (``RECOMMENDATION_MODEL_PATH`` by default). Returns the numbers
+    of users and of movies with neighbors.
+    """
+    likes = _likes()
+    fans = {}
+    for user_id, movie_ids in likes.items():
+        for movie_id in movie_ids:
+            if movie_id not in fans:
+                fans[movie_id] = array.array("q")
+            fans[movie_id].append(user_id)
+    fan_counts = {movie_id: len(user_ids) for movie_id, user_ids in fans.items()}
+
+    movies, offsets = array.array("q"), array.array("q", [0])
+    neighbor_ids, scores = array.array("q"), array.array("f")
+    for movie_id in sorted(fans):
+        # A row of the co-occurrence matrix, counted in C.
+        counts = collections.Counter(
+            itertools.chain.from_iterable(map(likes.__getitem__, fans[movie_id]))
+        )
+        del counts[movie_id]
+        if not counts:
+            continue
+        norms = map(
+            math.sqrt,
+            map(fan_counts[movie_id].__mul__, map(fan_counts.__getitem__, counts)),
+        )
+        cosines = map(operator.truediv, counts.values(), norms)
+        best = heapq.nlargest(NEIGHBORS, zip(cosines, map(operator.neg, counts)))
+
+        movies.append(movie_id)
+        neighbor_ids.extend(-negated_id for _, negated_id in best)
+        scores.extend(score for score, _ in best)
+        offsets.append(len(neighbor_ids))
+
+    popular = heapq.nlargest(
+        POPULAR, fan_counts, key=lambda movie_id: (fan_counts[movie_id], -movie_id)
+    )
+    _write(
+        path or settings.RECOMMENDATION_MODEL_PATH,
+        movies,
+        offsets,
+        neighbor_ids,
+        array.array("q", popular),
+        scores,
+    )
+    return len(likes), len(movies)
+
+
+_model = None
+# The path, inode and modification time of a file that failed to load.
+_broken = None
+_lock = threading.Lock()
+
+
+def get_model():
+    """
+    The model of this process, or ``None`` until one is trained. A file that
+    cannot be loaded is logged and not tried again until it is replaced, while
+    the previous model keeps serving.
+    """
+    global _model, _broken
+
+    path = str(settings.RECOMMENDATION_MODEL_PATH)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        if _model is not None and _model.path != path:
+            _model = None
+        if _model is None or not _model.is_current(stat):
+            version = (path, stat.st_ino, stat.st_mtime_ns)
+            if version != _broken:
+                try:
+                    _model = Model(path)
+                except (ModelFileError, OSError, ValueError):
+                    # mmap raises ValueError on an empty file.
+                    logger.exception("Could not load the recommendation model")
+                    _broken = version
+        return _model
+
+
+def reset():
+    global _model, _broken
+
+    with _lock:
+        _model = _broken = None
+
+
+def _history(user_id):
+    """
+    Movie ids a user likes, latest last, and the set of those they rated or
+    favorited.
+    """
+    rated = list(
+        models.Rating.objects.filter(user_id=user_id)
+        .order_by("id")
+        .values_list("movie_id", "value")
+    )
+    user_favorites = favorites.get(user_id).ids
+    liked = [movie_id for movie_id, value in rated if value >= LIKED_RATING]
+    liked = list(dict.fromkeys(itertools.chain(liked, user_favorites)))
+    seen = {movie_id for movie_id, _ in rated}.union(user_favorites)
+    return liked[-MAX_USER_LIKES:], seen
+
+
+def recommend(user_id, limit):
+    """
+    Ids of up to ``limit`` movies a user has neither rated nor favorited, by
+    decreasing sum of their similarities to the movies the user likes, then
+    by popularity.
+    """
+    model = get_model()
+    if model is None:
+        return []
+
+    liked, seen = _history(user_id)
+    scores = collections.Counter()
+    for movie_id in liked:
+        for neighbor_id, score in zip(*model.neighbors(movie_id)):
+            if neighbor_id not in seen:
+                scores[neighbor_id] += score
+
+    # Twice as many candidates, as movies deleted since training are dropped.
+    wanted = 2 * limit
+    ranked = [
+        -negated_id
+        for _, negated_id in heapq.nlargest(
+            wanted, zip(scores.values(), map(operator.neg, scores))
+        )
+    ]
+    for movie_id in model.popular:
+        if len(ranked) >= wanted:
+            break
+        if movie_id not in seen and movie_id not in scores:
+            ranked.append(movie_id)
+
+    existing = set(
+        models.Movie.objects.filter(id__in=ranked).values_list("id", flat=True)
+    )
+    return [movie_id for movie_id in ranked if movie_id in existing][:limit]
@@ -0,0 +1,76 @@
+"""
+Renderer of the API: the output of ``CamelCaseJSONRenderer``, produced faster.
+
+Keys are camelized through a memo rather than a regular expression
+substitution per key, and the result is encoded with orjson. Data orjson
+would write differently than the DRF encoder (other types than the JSON
+ones, floats written with an exponent, big integers, non string keys) and
+non default formats (indented, ASCII only) go through ``CamelCaseJSONRenderer``.
+"""
+
+import functools
+
+import orjson
+from djangorestframework_camel_case import render
+from djangorestframework_camel_case.settings import api_settings
+from djangorestframework_camel_case.util import camelize_re, underscore_to_camel
+
+_SCALARS = {str, int, bool, type(None)}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=4096)
+def camel_key(key):
+    if "_" not in key:
+        return key
+    return camelize_re.sub(underscore_to_camel, key)
+
+
+def _camelize(data):
+    kind = type(data)
+    if kind in _SCALARS:
+        return data
+    if kind is float:
+        # The range both encoders write without an exponent.
+        if data == 0 or 1e-4 <= abs(data) < 1e16:
+            return data
+        raise _Unsupported
+    if isinstance(data, dict):
+        camelized = {}
+        for key, value in data.items():
+            if type(key) is not str:
+                raise _Unsupported
+            camelized[camel_key(key)] = _camelize(value)
+        return camelized
+    if isinstance(data, (list, tuple)):
+        return [_camelize(item) for item in data]
+    raise _Unsupported
+
+
+class CamelCaseJSONRenderer(render.CamelCaseJSONRenderer):
+    def is_default_format(self, accepted_media_type, renderer_context):
+        return (
+            self.compact
+            and self.strict
+            and not self.ensure_ascii
+            and not api_settings.JSON_UNDERSCOREIZE.get("ignore_fields")
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is not None and self.is_default_format(
+            accepted_media_type, renderer_context
+        ):
+            try:
+                content = orjson.dumps(_camelize(data))
+            except (_Unsupported, orjson.JSONEncodeError):
+                pass
+            else:
+                # Escaped like the DRF renderer, for a strict JavaScript subset.
+                return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                    b"\xe2\x80\xa9", b"\\u2029"
+                )
+        return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,80 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "api_movie_fts"
+
+INDEX_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, original_title, storyline, actors)
+    SELECT movie.id, movie.title, movie.original_title, movie.storyline, COALESCE((
+        SELECT GROUP_CONCAT(actor.name, ' ')
+        FROM api_movie_actors movie_actor
+        JOIN api_actor actor ON actor.id = movie_actor.actor_id
+        WHERE movie_actor.movie_id = movie.id
+    ), '')
+    FROM api_movie movie
+    WHERE movie.id IN (SELECT value FROM json_each(%s))
+"""
+
+DELETE_SQL = f"""
+    DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT value FROM json_each(%s))
+"""
+
+
+def is_available():
+    return connection.vendor == "sqlite"
+
+
+def _ids_param(movie_ids):
+    return "[" + ",".join(str(int(movie_id)) for movie_id in movie_ids) + "]"
+
+
+def index_movies(movie_ids):
+    """
+    (Re)index the given movies in the full-text search table.
+    """
+    if not is_available() or not movie_ids:
+        return
+
+    ids = _ids_param(movie_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(DELETE_SQL, [ids])
+        cursor.execute(INDEX_SQL, [ids])
+
+
+def remove_movies(movie_ids):
+    if not is_available() or not movie_ids:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(DELETE_SQL, [_ids_param(movie_ids)])
+
+
+def match_expression(q):
+    """
+    Turn free user input into an FTS5 query where every word is a prefix term.
+    """
+    return " ".join(f'"{term}"*' for term in re.findall(r"\w+", q))
+
+
+def filter_queryset(queryset, q):
+    """
+    Restrict a movie queryset to the matches of ``q``, annotated with their
+    ``search_rank`` (lower is more relevant).
+    """
+    if not is_available():
+        return queryset.filter(title__icontains=q).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    expression = match_expression(q)
+    if not expression:
+        return queryset.none()
+
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = api_movie.id", f"{FTS_TABLE} MATCH %s"],
+        params=[expression],
+    ).annotate(search_rank=RawSQL(f"{FTS_TABLE}.rank", ()))
@@ -1,32 +1,130 @@
+import functools
+
+from django.conf import settings
 from django.contrib.auth import get_user_model  # If used custom user model
+from django.db import IntegrityError, transaction
+from djangorestframework_camel_case.util import camel_to_underscore
 from rest_framework import serializers
+from api import aggregates
+from api import favorites
+from api import fields
+from api import ingest
+from api import leaderboards
 from api import models
-
-
-class GetMovieSerializer(serializers.ModelSerializer):
+from api import rate_log
+from api import search
+from api import similarity
+
+
+def favorite_ids(user, movie_ids):
+    user_favorites = favorites.of(user)
+    return {movie_id for movie_id in movie_ids if movie_id in user_favorites}
+
+
+def user_rates(user, movie_ids):
+    rates = models.Rating.objects.filter(user_id=user.id, movie_id__in=movie_ids)
+    rates = dict(rates.values_list("movie_id", "value"))
+    rates.update(rate_log.pending_rates(user.id, movie_ids))
+    return {movie_id: rate for movie_id, rate in rates.items() if rate is not None}
+
+
+def add_user_state(payloads, favorited=None, rates=None):
+    """
+    Add the per-user fields whose state was looked up (is not ``None``).
+    """
+    results = []
+    for payload in payloads:
+        payload = dict(payload)
+        if favorited is not None:
+            payload["favorite"] = payload["id"] in favorited
+        if rates is not None:
+            payload["user_rate"] = rates.get(payload["id"])
+        results.append(payload)
+    return results
+
+
+def with_user_state(payloads, user, fields=None):
+    """
+    Add the per-user fields of ``GetMovieSerializer`` to ``MovieSerializer`` payloads,
+    only looking up those in ``fields`` (all of them if ``None``).
+    """
+    movie_ids = [payload["id"] for payload in payloads]
+    favorited = rates = None
+    if fields is None or "favorite" in fields:
+        favorited = favorite_ids(user, movie_ids)
+    if fields is None or "user_rate" in fields:
+        rates = user_rates(user, movie_ids)
+    return add_user_state(payloads, favorited, rates)
+
+
+def select_fields(payloads, fields):
+    if fields is None:
+        return payloads
+    return [
+        {field: value for field, value in payload.items() if field in fields}
+        for payload in payloads
+    ]
+
+
+class MovieSerializer(serializers.ModelSerializer):
+    """
+    The part of a movie payload that is the same for every user, restricted to
+    the ``fields`` given to the constructor, if any.
+    """
+
+    # Model columns read by the computed fields; the others read their own.
+    COLUMNS = {
+        "actors": [],
+        "genres": [],
+        "rating_summary": aggregates.SUMMARY_FIELDS,
+    }
+    RELATIONS = ["actors", "genres"]
+    # Missing typed values read as the empty string of the former text columns.
+    BLANK_WHEN_MISSING = ["year", "duration", "release_date"]
+
+    year = fields.YearField(read_only=True)
+    duration = fields.DurationField(read_only=True)
+    release_date = fields.OptionalDateField(read_only=True)
     actors = serializers.SerializerMethodField()
     genres = serializers.SerializerMethodField()
-    ratings = serializers.SerializerMethodField()
-    favorite = serializers.SerializerMethodField()
-    user_rate = serializers.SerializerMethodField()
+    rating_summary = serializers.SerializerMethodField()
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def columns(cls, fields):
+        """
+        Model columns needed to serialize ``fields`` (all of them if ``None``).
+        """
+        columns = ["id"]
+        for field in cls.Meta.fields:
+            if fields is None or field in fields:
+                columns.extend(
+                    column
+                    for column in cls.COLUMNS.get(field, [field])
+                    if column not in columns
+                )
+        return columns
 
     def get_actors(self, obj):
-        return obj.actors.values_list("name", flat=True)
+        return [actor.name for actor in obj.actors.all()]
 
     def get_genres(self, obj):
-        return obj.genres.values_list("name", flat=True)
-
-    def get_ratings(self, obj):
-        return obj.ratings.values_list("value", flat=True)
+        return [genre.name for genre in obj.genres.all()]
 
-    def get_favorite(self, obj):
-        return self.context["request"].user.movie_set.filter(id=obj.id).exists()
+    def get_rating_summary(self, obj):
+        return aggregates.summary(obj)
 
-    def get_user_rate(self, obj):
-        rates = self.context["request"].user.ratings.filter(movie=obj)
-        if not rates.exists():
-            return None
-        return rates.get().value
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field in self.BLANK_WHEN_MISSING:
+            if field in data and data[field] is None:
+                data[field] = ""
+        return data
 
     class Meta:
         model = models.Movie
@@ -35,7 +133,7 @@ class GetMovieSerializer(serializers.ModelSerializer):
             "title",
             "year",
             "genres",
-            "ratings",
+            "rating_summary",
             "poster",
             "content_rating",
             "duration",
@@ -46,20 +144,135 @@ class GetMovieSerializer(serializers.ModelSerializer):
             "actors",
             "imdb_rating",
             "posterurl",
-            "favorite",
-            "user_rate",
         ]
 
 
+def _related_names(relation, movie_ids):
+    """
+    ``{movie_id: [name]}`` of a many-to-many ``relation`` of the movies, in
+    the order of the prefetch used by ``MovieSerializer``.
+    """
+    target = models.Movie._meta.get_field(relation).related_model._meta.model_name
+    rows = (
+        getattr(models.Movie, relation)
+        .through.objects.filter(movie_id__in=movie_ids)
+        .order_by("movie_id", f"{target}_id")
+        .values_list("movie_id", f"{target}__name")
+    )
+    names = {}
+    for movie_id, name in rows:
+        names.setdefault(movie_id, []).append(name)
+    return names
+
+
+@functools.lru_cache(maxsize=128)
+def _row_plan(fields):
+    """
+    The columns, relations and ``(name, getter(row, related))`` pairs that
+    build the payloads of a fieldset, computed once per fieldset.
+    """
+    serializer_fields = MovieSerializer(fields=fields).fields
+    columns = MovieSerializer.columns(serializer_fields)
+    position = {column: index for index, column in enumerate(columns)}
+    relations = [
+        name for name in MovieSerializer.RELATIONS if name in serializer_fields
+    ]
+
+    def related_getter(relation):
+        return lambda row, related: related[relation].get(row[0], [])
+
+    def summary_getter(count, mean, histogram):
+        return lambda row, related: aggregates.summary_of(
+            row[count], row[mean], row[histogram]
+        )
+
+    def column_getter(index, to_representation, empty):
+        return lambda row, related: (
+            empty if row[index] is None else to_representation(row[index])
+        )
+
+    getters = []
+    for name, field in serializer_fields.items():
+        if name in relations:
+            getter = related_getter(name)
+        elif name == "rating_summary":
+            getter = summary_getter(
+                *(position[column] for column in aggregates.SUMMARY_FIELDS)
+            )
+        else:
+            empty = "" if name in MovieSerializer.BLANK_WHEN_MISSING else None
+            getter = column_getter(position[name], field.to_representation, empty)
+        getters.append((name, getter))
+    return columns, relations, getters
+
+
+def movie_rows(movies, fields=None):
+    """
+    The ``MovieSerializer(movies, many=True, fields=fields).data`` payloads of
+    the ``movies`` queryset, built from ``values_list`` tuples rather than
+    model instances going through the serializer fields.
+    """
+    columns, relations, getters = _row_plan(
+        None if fields is None else frozenset(fields)
+    )
+    rows = list(movies.values_list(*columns))
+
+    movie_ids = [row[0] for row in rows]
+    related = {relation: _related_names(relation, movie_ids) for relation in relations}
+    return [{name: getter(row, related) for name, getter in getters} for row in rows]
+
+
+class GetMovieSerializer(MovieSerializer):
+    favorite = serializers.SerializerMethodField()
+    user_rate = serializers.SerializerMethodField()
+
+    def get_favorite(self, obj):
+        return obj.id in self._favorite_ids()
+
+    def get_user_rate(self, obj):
+        return self._user_rates().get(obj.id)
+
+    def _page_ids(self):
+        instance = self.root.instance
+        if isinstance(instance, models.Movie):
+            return [instance.id]
+        return [movie.id for movie in instance]
+
+    def _favorite_ids(self):
+        # Loaded once for the whole page and shared through the root context.
+        if "favorite_ids" not in self.context:
+            user = self.context["request"].user
+            self.context["favorite_ids"] = favorite_ids(user, self._page_ids())
+        return self.context["favorite_ids"]
+
+    def _user_rates(self):
+        if "user_rates" not in self.context:
+            user = self.context["request"].user
+            self.context["user_rates"] = user_rates(user, self._page_ids())
+        return self.context["user_rates"]
+
+    class Meta(MovieSerializer.Meta):
+        fields = MovieSerializer.Meta.fields + ["favorite", "user_rate"]
+
+
+class BulkCreateMovieSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        return ingest.load_movies(validated_data)
+
+
 class CreateUpdateMovieSerializer(serializers.Serializer):
     title = serializers.CharField(required=True)
-    year = serializers.CharField(required=True)
+    year = fields.YearField(required=True)
     genres = serializers.ListField(child=serializers.CharField())
-    ratings = serializers.ListField(child=serializers.IntegerField())
+    ratings = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=aggregates.MAX_RATING)
+    )
     poster = serializers.CharField(allow_blank=True)
-    content_rating = serializers.CharField(allow_blank=True)
-    duration = serializers.CharField(allow_blank=True)
-    release_date = serializers.CharField(allow_blank=True)
+    content_rating = fields.ContentRatingField(
+        choices=models.CONTENT_RATINGS, allow_blank=True
+    )
+    duration = fields.DurationField()
+    release_date = fields.OptionalDateField()
     average_rating = serializers.FloatField(required=True)
     original_title = serializers.CharField(allow_blank=True)
     storyline = serializers.CharField(allow_blank=True)
@@ -67,6 +280,19 @@ class CreateUpdateMovieSerializer(serializers.Serializer):
     imdb_rating = serializers.CharField(allow_blank=True)
     posterurl = serializers.CharField(allow_blank=True)
 
+    class Meta:
+        list_serializer_class = BulkCreateMovieSerializer
+
+    def validate_title(self, title):
+        # Creating an existing title returns that movie, renaming onto one fails.
+        if self.instance is not None:
+            others = models.Movie.objects.exclude(id=self.instance.id)
+            if others.filter(title=title).exists():
+                raise serializers.ValidationError(
+                    "A movie with this title already exists."
+                )
+        return title
+
     def create(self, validated_data):
         actors_names = validated_data.pop("actors")
         genres_names = validated_data.pop("genres")
@@ -82,19 +308,23 @@ class CreateUpdateMovieSerializer(serializers.Serializer):
         else:
             validated_data["imdb_rating"] = 0.0
 
-        movie = models.Movie.objects.create(**validated_data)
-
-        for actor_name in actors_names:
-            actor_entity = models.Actor.objects.get_or_create(name=actor_name)[0]
-            movie.actors.add(actor_entity)
+        movie = models.Movie(**validated_data)
+        aggregates.set_histogram(movie, aggregates.histogram_of(ratings))
+        try:
+            with transaction.atomic():
+                movie.save()
+        except IntegrityError:
+            # Created concurrently with the same title.
+            return movies.get()
 
-        for genre_name in genres_names:
-            genre_entity = models.Genre.objects.get_or_create(name=genre_name)[0]
-            movie.genres.add(genre_entity)
+        ingest.link_names("actors", {movie.id: actors_names})
+        ingest.link_names("genres", {movie.id: genres_names})
 
         for rating in ratings:
             models.Rating.objects.create(value=rating, movie=movie)
 
+        search.index_movies([movie.id])
+
         return movie
 
     def update(self, movie, validated_data):
@@ -107,14 +337,10 @@ class CreateUpdateMovieSerializer(serializers.Serializer):
             setattr(movie, key, validated_data[key])
 
         movie.actors.clear()
-        for actor_name in actors_names:
-            actor_entity = models.Actor.objects.get_or_create(name=actor_name)[0]
-            movie.actors.add(actor_entity)
+        ingest.link_names("actors", {movie.id: actors_names})
 
         movie.genres.clear()
-        for genre_name in genres_names:
-            genre_entity = models.Genre.objects.get_or_create(name=genre_name)[0]
-            movie.genres.add(genre_entity)
+        ingest.link_names("genres", {movie.id: genres_names})
 
         movie.ratings.all().delete()
         for rating in ratings:
@@ -125,7 +351,11 @@ class CreateUpdateMovieSerializer(serializers.Serializer):
         else:
             movie.imdb_rating = 0.0
 
+        aggregates.set_histogram(movie, aggregates.histogram_of(ratings))
+        aggregates.bump_version(movie)
         movie.save()
+        movie.refresh_from_db(fields=aggregates.VERSION_FIELDS)
+        search.index_movies([movie.id])
 
         return movie
 
@@ -176,5 +406,165 @@ class GetGenreSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
+class GetActorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Actor
+        fields = ["id", "name"]
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    # Single letters match too much of the catalog to be worth ranking.
+    q = serializers.CharField(min_length=2)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class FieldsetSerializer(serializers.Serializer):
+    """
+    Sparse fieldset of a movie payload: the ``fields`` to keep, or the fields
+    to ``exclude``, comma separated in snake or camel case. ``id`` is always kept.
+    """
+
+    PARAMS = {"fields", "exclude"}
+
+    fields = serializers.ListField(child=serializers.CharField(), required=False)
+    exclude = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def _field_names(self, value):
+        names = [
+            camel_to_underscore(name)
+            for names in value
+            for name in names.split(",")
+            if name
+        ]
+        unknown = [name for name in names if name not in GetMovieSerializer.Meta.fields]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}.")
+        return names
+
+    def validate_fields(self, value):
+        return self._field_names(value)
+
+    def validate_exclude(self, value):
+        return self._field_names(value)
+
+    def to_fieldset(self):
+        """
+        The set of fields to serialize, or ``None`` for all of them.
+        """
+        data = self.validated_data
+        if "fields" not in data and "exclude" not in data:
+            return None
+
+        fields = set(data.get("fields", GetMovieSerializer.Meta.fields))
+        return frozenset(fields - set(data.get("exclude", [])) | {"id"})
+
+
+class SimilarSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1, max_value=similarity.NEIGHBORS, default=10
+    )
+
+
+class RecommendedSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    by = serializers.ChoiceField(leaderboards.METRICS)
+    genre = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.LEADERBOARD_SIZE, default=10
+    )
+
+
+class MovieFilterSerializer(serializers.Serializer):
+    MATCH_CHOICES = ["any", "all"]
+    RANGE_FIELDS = ["year_min", "year_max", "rating_min", "rating_max"]
+    ORDERINGS = [
+        "year",
+        "-year",
+        "duration",
+        "-duration",
+        "release_date",
+        "-release_date",
+        "imdb_rating",
+        "-imdb_rating",
+        "average_rating",
+        "-average_rating",
+        "rating_mean",
+        "-rating_mean",
+        "favorites_count",
+        "-favorites_count",
+    ]
+    # Changed by ratings and favorites, which do not invalidate list pages.
+    COUNTER_ORDERINGS = {"rating_mean", "favorites_count"}
+
+    genre = serializers.ListField(child=serializers.CharField(), required=False)
+    genre_match = serializers.ChoiceField(MATCH_CHOICES, default="any")
+    actor = serializers.ListField(child=serializers.CharField(), required=False)
+    actor_match = serializers.ChoiceField(MATCH_CHOICES, default="any")
+    year_min = serializers.IntegerField(required=False)
+    year_max = serializers.IntegerField(required=False)
+    rating_min = serializers.FloatField(min_value=0, max_value=10, required=False)
+    rating_max = serializers.FloatField(min_value=0, max_value=10, required=False)
+    duration_max = serializers.IntegerField(min_value=0, required=False)
+    released_after = serializers.DateField(required=False)
+    ordering = serializers.ChoiceField(ORDERINGS, required=False)
+
+    def validate_genre(self, value):
+        return [name for names in value for name in names.split(",") if name]
+
+    def validate_actor(self, value):
+        return [name for names in value for name in names.split(",") if name]
+
+    def to_index_conditions(self):
+        """
+        Keyword arguments of ``catalog.filter_movies``, or ``None`` without filters.
+        """
+        data = self.validated_data
+        ranges = {field: data.get(field) for field in self.RANGE_FIELDS}
+        if (
+            not data.get("genre")
+            and not data.get("actor")
+            and all(value is None for value in ranges.values())
+        ):
+            return None
+
+        return {
+            "genres": data.get("genre", []),
+            "genre_match": data["genre_match"],
+            "actors": data.get("actor", []),
+            "actor_match": data["actor_match"],
+            **ranges,
+        }
+
+
 class UserRateSerializer(serializers.Serializer):
     rate = serializers.IntegerField(min_value=0, max_value=10)
+
+
+class BatchSerializer(serializers.ListSerializer):
+    max_operations = 1000
+
+    def validate(self, attrs):
+        if len(attrs) > self.max_operations:
+            raise serializers.ValidationError(
+                f"Ensure this batch has no more than {self.max_operations} operations."
+            )
+        return attrs
+
+
+class RateOperationSerializer(serializers.Serializer):
+    movie_id = serializers.IntegerField()
+    rate = serializers.IntegerField(min_value=0, max_value=10, allow_null=True)
+
+    class Meta:
+        list_serializer_class = BatchSerializer
+
+
+class FavoriteOperationSerializer(serializers.Serializer):
+    movie_id = serializers.IntegerField()
+    favorite = serializers.BooleanField()
+
+    class Meta:
+        list_serializer_class = BatchSerializer
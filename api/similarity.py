@@ -0,0 +1,371 @@
+"""
+Precomputed "more like this" neighbors of every movie.
+
+A movie is a sparse vector of its genres and actors (weighted by
+``WEIGHTS``), and movies are compared by cosine similarity. The scores of one
+movie against the whole catalog come from the inverted genre and actor
+postings: counting how often each movie appears in the postings of the
+movie's features (each repeated its weight squared times) gives every dot
+product at once. The ``NEIGHBORS`` best matches of every movie
+are stored as ``SimilarMovie`` rows, so serving them is a single index lookup.
+
+``rebuild`` recomputes every list, ``update_movies`` the lists a change of
+genres or actors can affect. The write paths only ``schedule`` the changed
+movies: once committed, they are queued and recomputed by a background thread
+every ``SIMILAR_MOVIES_FLUSH_INTERVAL`` seconds, off the request. A queue lost
+with its process is caught up by the next ``build_similar_movies``.
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import math
+import operator
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db import transaction
+from django.db.models import Count, Min
+
+from api import models
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORS = 20
+# Integers: a feature of weight w is counted w ** 2 times in dot products.
+WEIGHTS = {"genres": 1, "actors": 2}
+
+BATCH_SIZE = 500
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _relation(relation):
+    """
+    The through model of a relation and the name of its target id column.
+    """
+    field = models.Movie._meta.get_field(relation)
+    return field.remote_field.through, f"{field.m2m_reverse_field_name()}_id"
+
+
+def _norm(counts):
+    return math.sqrt(
+        sum(weight**2 * counts[relation] for relation, weight in WEIGHTS.items())
+    )
+
+
+def features_of(movie_ids):
+    """
+    ``{movie_id: {relation: set of ids}}`` of the genres and actors of movies.
+    """
+    features = {
+        movie_id: {relation: set() for relation in WEIGHTS} for movie_id in movie_ids
+    }
+    for relation in WEIGHTS:
+        through, target = _relation(relation)
+        for chunk in _chunks(features):
+            rows = through.objects.filter(movie_id__in=chunk).values_list(
+                "movie_id", target
+            )
+            for movie_id, value in rows:
+                features[movie_id][relation].add(value)
+    return features
+
+
+class Features:
+    """
+    Genre and actor ids of movies, with the inverted postings of those genres
+    and actors and the norms of the movies in them.
+    """
+
+    def __init__(self):
+        self.movies = {}
+        self.postings = {relation: {} for relation in WEIGHTS}
+        self.norms = {}
+
+    @classmethod
+    def load(cls):
+        """
+        The features of every movie.
+        """
+        features = cls()
+        for movie_id in models.Movie.objects.values_list("id", flat=True):
+            features.movies[movie_id] = {relation: [] for relation in WEIGHTS}
+        for relation, postings in features.postings.items():
+            through, target = _relation(relation)
+            for movie_id, value in through.objects.values_list("movie_id", target):
+                features.movies[movie_id][relation].append(value)
+                postings.setdefault(value, []).append(movie_id)
+
+        for movie_id, movie in features.movies.items():
+            features.norms[movie_id] = _norm(
+                {relation: len(values) for relation, values in movie.items()}
+            )
+        return features
+
+    def add(self, movie_ids):
+        """
+        Load the features of the existing movies of ``movie_ids``, enough to
+        score them against the catalog: only the postings of their genres and
+        actors are read, not the whole catalog.
+        """
+        new = set(movie_ids) - self.movies.keys()
+        for chunk in _chunks(new):
+            for movie_id in models.Movie.objects.filter(id__in=chunk).values_list(
+                "id", flat=True
+            ):
+                self.movies[movie_id] = {relation: [] for relation in WEIGHTS}
+
+        loaded = {relation: set() for relation in WEIGHTS}
+        for movie_id, movie in features_of(new & self.movies.keys()).items():
+            for relation, values in movie.items():
+                self.movies[movie_id][relation] = list(values)
+                loaded[relation].update(values - self.postings[relation].keys())
+        for relation, postings in self.postings.items():
+            through, target = _relation(relation)
+            for chunk in _chunks(loaded[relation]):
+                rows = through.objects.filter(**{f"{target}__in": chunk})
+                for movie_id, value in rows.values_list("movie_id", target):
+                    postings.setdefault(value, []).append(movie_id)
+
+        unscored = {
+            movie_id
+            for relation, values in loaded.items()
+            for value in values
+            for movie_id in self.postings[relation][value]
+        } - self.norms.keys()
+        counts = {movie_id: dict.fromkeys(WEIGHTS, 0) for movie_id in unscored}
+        for relation in WEIGHTS:
+            through, _ = _relation(relation)
+            for chunk in _chunks(unscored):
+                rows = (
+                    through.objects.filter(movie_id__in=chunk)
+                    .values("movie_id")
+                    .annotate(n=Count("id"))
+                    .values_list("movie_id", "n")
+                )
+                for movie_id, n in rows:
+                    counts[movie_id][relation] = n
+        for movie_id, movie_counts in counts.items():
+            self.norms[movie_id] = _norm(movie_counts)
+        for movie_id in new & self.movies.keys():
+            # Movies without genres nor actors are in no posting.
+            self.norms.setdefault(movie_id, 0.0)
+
+    def scores(self, movie_id):
+        """
+        ``{other movie id: cosine similarity}`` of the movies sharing a genre
+        or an actor with ``movie_id``.
+        """
+        # The counting and the divisions run in C, not once per candidate in Python.
+        movie = self.movies[movie_id]
+        dots = collections.Counter(
+            itertools.chain.from_iterable(
+                self.postings[relation][value]
+                for relation, weight in WEIGHTS.items()
+                for value in movie[relation]
+                for _ in range(weight**2)
+            )
+        )
+        del dots[movie_id]
+        norms = map(self.norms[movie_id].__mul__, map(self.norms.__getitem__, dots))
+        return dict(zip(dots, map(operator.truediv, dots.values(), norms)))
+
+    def neighbors(self, movie_id, scores=None):
+        """
+        The ``NEIGHBORS`` best ``(movie id, score)`` of a movie, ties going to
+        the oldest movies.
+        """
+        if scores is None:
+            scores = self.scores(movie_id)
+        best = heapq.nlargest(
+            NEIGHBORS, zip(scores.values(), map(operator.neg, scores))
+        )
+        return [(-negated_id, score) for score, negated_id in best]
+
+
+@transaction.atomic
+def _save(neighbors):
+    """
+    Replace the stored neighbors of the ``{movie_id: [(id, score)]}`` movies.
+    """
+    for chunk in _chunks(neighbors):
+        models.SimilarMovie.objects.filter(movie_id__in=chunk).delete()
+    models.SimilarMovie.objects.bulk_create(
+        [
+            models.SimilarMovie(movie_id=movie_id, neighbor_id=other_id, score=score)
+            for movie_id, others in neighbors.items()
+            for other_id, score in others
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute the neighbors of every movie, returning the number of movies.
+    """
+    features = Features.load()
+    models.SimilarMovie.objects.all().delete()
+    _save({movie_id: features.neighbors(movie_id) for movie_id in features.movies})
+    return len(features.movies)
+
+
+def referencing(movie_ids):
+    """
+    Ids of the movies listing one of ``movie_ids`` among their neighbors.
+    """
+    referencing = set()
+    for chunk in _chunks(movie_ids):
+        referencing.update(
+            models.SimilarMovie.objects.filter(neighbor_id__in=chunk).values_list(
+                "movie_id", flat=True
+            )
+        )
+    return referencing
+
+
+def _floors(movie_ids):
+    """
+    ``{movie_id: (number of neighbors, lowest score)}`` of the stored lists of
+    ``movie_ids``.
+    """
+    floors = {}
+    for chunk in _chunks(movie_ids):
+        rows = (
+            models.SimilarMovie.objects.filter(movie_id__in=chunk)
+            .values("movie_id")
+            .annotate(count=Count("id"), floor=Min("score"))
+            .values_list("movie_id", "count", "floor")
+        )
+        floors.update((movie_id, (count, floor)) for movie_id, count, floor in rows)
+    return floors
+
+
+@transaction.atomic
+def update_movies(movie_ids, stale=()):
+    """
+    Recompute the neighbors of movies whose genres or actors changed, and of
+    the movies they now rank among (or drop out of) the best matches of.
+    ``stale`` are other movies to recompute, such as those that listed a
+    deleted movie. Only the postings of the features of these movies are
+    loaded.
+    """
+    features = Features()
+    features.add(movie_ids)
+    changed = set(movie_ids) & features.movies.keys()
+    affected = referencing(changed) | set(stale)
+
+    neighbors, candidates = {}, {}
+    for movie_id in changed:
+        scores = features.scores(movie_id)
+        neighbors[movie_id] = features.neighbors(movie_id, scores)
+        for other_id, score in scores.items():
+            candidates[other_id] = max(score, candidates.get(other_id, score))
+
+    floors = _floors(candidates.keys() - changed)
+    for other_id, score in candidates.items():
+        count, floor = floors.get(other_id, (0, 0))
+        if count < NEIGHBORS or score >= floor:
+            affected.add(other_id)
+
+    affected -= neighbors.keys()
+    features.add(affected)
+    for movie_id in affected & features.movies.keys():
+        neighbors[movie_id] = features.neighbors(movie_id)
+    _save(neighbors)
+
+
+# Ids of the movies to recompute, and of the movies listing deleted ones.
+_changed = set()
+_stale = set()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_worker = None
+
+
+def schedule(movie_ids, stale=()):
+    """
+    Queue ``update_movies(movie_ids, stale)`` for the background thread, once
+    the current transaction commits.
+    """
+
+    def enqueue():
+        with _lock:
+            _changed.update(movie_ids)
+            _stale.update(stale)
+        _start_worker()
+
+    if movie_ids or stale:
+        transaction.on_commit(enqueue)
+
+
+def flush():
+    """
+    Recompute the queued movies, returning the ids of the changed ones.
+    """
+    with _flush_lock:
+        with _lock:
+            changed, stale = set(_changed), set(_stale)
+            _changed.clear()
+            _stale.clear()
+        if not changed and not stale:
+            return set()
+        try:
+            update_movies(changed, stale)
+        except Exception:
+            # Queued again for the next flush.
+            with _lock:
+                _changed.update(changed)
+                _stale.update(stale)
+            raise
+        return changed
+
+
+def _run():
+    while True:
+        time.sleep(settings.SIMILAR_MOVIES_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Could not update the similar movies")
+        finally:
+            close_old_connections()
+
+
+def _start_worker():
+    global _worker
+    if _worker is not None:
+        return
+
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(
+                target=_run, name="similar-movies-worker", daemon=True
+            )
+            _worker.start()
+
+
+def reset():
+    with _lock:
+        _changed.clear()
+        _stale.clear()
+
+
+def similar_ids(movie_id, limit=NEIGHBORS):
+    """
+    Ids of the most similar movies to ``movie_id``, best first.
+    """
+    return list(
+        models.SimilarMovie.objects.filter(movie_id=movie_id)
+        .order_by("-score", "neighbor_id")
+        .values_list("neighbor_id", flat=True)[:limit]
+    )
@@ -1,10 +1,47 @@
+import array
+import contextlib
+import csv
+import datetime
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, prefetch_related_objects
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework_simplejwt.tokens import RefreshToken
+from api import aggregates
+from api import authentication
+from api import autocomplete
+from api import benchmark
+from api import catalog
+from api import favorites
+from api import importer
+from api import ingest
+from api import leaderboards
 from api import models
-from model_bakery import baker
+from api import rate_log
+from api import rates
+from api import recommendations
+from api import renderers
+from api import search
+from api import serializers
+from api import similarity
+from api import views
+from model_bakery import baker, seq
 from django.contrib.auth.models import User
+from django.core.cache import cache
 
 NEW_MOVIE = {
     "title": "Testing Movie",
@@ -24,8 +61,28 @@ NEW_MOVIE = {
 }
 
 
+@contextlib.contextmanager
+def run_on_commit():
+    """
+    Run the ``transaction.on_commit`` callbacks registered in the block, which
+    the transaction wrapping each test would otherwise never commit.
+    """
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
 class MovieTestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+        catalog.reset()
+        leaderboards.reset()
+        autocomplete.reset()
+        similarity.reset()
+
         self.admin_user = User.objects.create_superuser(
             username="admin", email="admin@admin.com", password="admin"
         )
@@ -73,6 +130,655 @@ class MovieTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], movie.title)
 
+    def test_sparse_fieldsets(self):
+        """
+        Ensure fields / exclude narrow the payloads and the queries behind them.
+        """
+        url = reverse("movies-list")
+
+        movie = baker.make(models.Movie, posterurl="https://google.com")
+        movie.actors.add(baker.make(models.Actor))
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,title,posterurl"})
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": movie.id, "title": movie.title, "posterurl": movie.posterurl}],
+        )
+        sql = " ".join(query["sql"] for query in queries)
+        for skipped in ("storyline", "api_actor", "api_rating", "user_favorites"):
+            self.assertNotIn(skipped, sql)
+
+        response = self.client.get(
+            f"{url}/{movie.id}", {"fields": "ratingSummary,userRate"}
+        )
+        self.assertEqual(set(response.json()), {"id", "ratingSummary", "userRate"})
+
+        response = self.client.get(url, {"exclude": "actors,storyline,favorite"})
+        payload = response.json()["results"][0]
+        self.assertNotIn("actors", payload)
+        self.assertNotIn("favorite", payload)
+        self.assertIn("userRate", payload)
+
+        response = self.client.get(reverse("movies-favorites"), {"fields": "title"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url, {"fields": "title,budget"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fast_serialization(self):
+        """
+        Ensure the fast payload and rendering paths output the same bytes as
+        the serializer and renderer they stand in for.
+        """
+        actors = baker.make(models.Actor, _quantity=3)
+        plain = baker.make(models.Movie, year=None, duration=None)
+        detailed = baker.make(
+            models.Movie,
+            title="Amélie \u2028 <b>",
+            year=2001,
+            duration=7320,
+            release_date=datetime.date(2001, 4, 25),
+            imdb_rating=8.3,
+            average_rating=7.25,
+        )
+        detailed.actors.add(actors[2], actors[0], actors[1])
+        detailed.genres.add(baker.make(models.Genre))
+        aggregates.set_histogram(detailed, aggregates.histogram_of([3, 8, 8]))
+        detailed.save()
+
+        movies = models.Movie.objects.filter(id__in=[plain.id, detailed.id])
+        for fields in (None, {"id", "title", "actors", "rating_summary"}):
+            instances = list(movies)
+            prefetch_related_objects(instances, "actors", "genres")
+            self.assertEqual(
+                serializers.movie_rows(movies, fields),
+                serializers.MovieSerializer(instances, many=True, fields=fields).data,
+            )
+
+        data = serializers.movie_rows(movies)
+        for payload in (
+            {"count": 2, "next": None, "results": data},
+            {"created_at": datetime.datetime(2021, 1, 1, 12, 30, 15, 123456)},
+            {"big_number": 1 << 70, 1: "one", "ratios": [1e20, 1e-05]},
+            [],
+        ):
+            self.assertEqual(
+                renderers.CamelCaseJSONRenderer().render(payload),
+                CamelCaseJSONRenderer().render(payload),
+            )
+
+    def test_movie_list_query_count(self):
+        """
+        Ensure the number of queries of a movie list page does not depend on its size.
+        """
+        url = reverse("movies-list")
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        def make_movies(count):
+            for movie in baker.make(models.Movie, _quantity=count):
+                movie.actors.add(baker.make(models.Actor))
+                movie.genres.add(baker.make(models.Genre))
+                movie.user_favorites.add(self.active_user)
+                models.Rating.objects.create(
+                    movie=movie, user=self.active_user, value=5
+                )
+
+        make_movies(2)
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 2)
+
+        make_movies(8)
+        cache.clear()
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        self.assertEqual(len(small_page), len(full_page))
+        self.assertTrue(all(movie["favorite"] for movie in response.data["results"]))
+        self.assertTrue(
+            all(movie["user_rate"] == 5 for movie in response.data["results"])
+        )
+
+    def test_search_movies(self):
+        """
+        Ensure the search matches word prefixes and ranks title matches first.
+        """
+        url = reverse("movies-list")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.client.post(
+            reverse("movies-bulk-load"),
+            [
+                {**NEW_MOVIE, "title": "Other Movie", "storyline": "A heist."},
+                {**NEW_MOVIE, "title": "The Heist", "actors": ["Jane Doe"]},
+            ],
+        )
+
+        response = self.client.get(url, {"q": "heis"})
+        titles = [movie["title"] for movie in response.data["results"]]
+        self.assertEqual(titles, ["The Heist", "Other Movie"])
+
+        response = self.client.get(url, {"q": "jane"})
+        titles = [movie["title"] for movie in response.data["results"]]
+        self.assertEqual(titles, ["The Heist"])
+
+        movie = models.Movie.objects.get(title="The Heist")
+        self.client.delete(f"{url}/{movie.id}")
+        response = self.client.get(url, {"q": "heist"})
+        titles = [movie["title"] for movie in response.data["results"]]
+        self.assertEqual(titles, ["Other Movie"])
+
+    def test_similar_movies(self):
+        """
+        Ensure similar movies are kept up to date by the writes and match a
+        full rebuild.
+        """
+        url = reverse("movies-list")
+
+        def movie(title, genres, actors):
+            return {**NEW_MOVIE, "title": title, "genres": genres, "actors": actors}
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        @contextlib.contextmanager
+        def written():
+            # The neighbors are recomputed off the request, once committed.
+            with self.settings(SIMILAR_MOVIES_FLUSH_INTERVAL=3600):
+                with run_on_commit():
+                    yield
+                similarity.flush()
+
+        with written():
+            self.client.post(
+                reverse("movies-bulk-load"),
+                [
+                    movie("A", ["Action", "Comedy"], ["X", "Y"]),
+                    movie("B", ["Action", "Comedy"], ["X"]),
+                    movie("C", ["Drama"], ["Z"]),
+                ],
+            )
+            self.client.post(url, movie("D", ["Action"], ["W"]))
+        ids = dict(models.Movie.objects.values_list("title", "id"))
+
+        def similar(title, **params):
+            response = self.client.get(f"{url}/{ids[title]}/similar", params)
+            return [payload["title"] for payload in response.data]
+
+        self.assertEqual(similar("A"), ["B", "D"])
+        self.assertEqual(similar("C"), [])
+        self.assertEqual(similar("A", limit=1), ["B"])
+
+        with written():
+            self.client.put(f"{url}/{ids['C']}", movie("C", ["Drama"], ["X", "Y"]))
+        self.assertEqual(similar("A"), ["C", "B", "D"])
+        self.assertEqual(similar("D"), ["B", "A"])
+
+        # Updates leaving the genres and actors alone queue nothing.
+        with run_on_commit():
+            self.client.put(f"{url}/{ids['D']}", movie("D2", ["Action"], ["W"]))
+        self.assertEqual(similarity.flush(), set())
+        self.assertEqual(similar("A"), ["C", "B", "D2"])
+
+        with written():
+            self.client.delete(f"{url}/{ids['B']}")
+        self.assertEqual(similar("A"), ["C", "D2"])
+
+        fields = ["movie_id", "neighbor_id", "score"]
+        stored = set(models.SimilarMovie.objects.values_list(*fields))
+        call_command("build_similar_movies", stdout=io.StringIO())
+        self.assertEqual(set(models.SimilarMovie.objects.values_list(*fields)), stored)
+
+        response = self.client.get(f"{url}/0/similar")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recommended_movies(self):
+        """
+        Ensure users are recommended the unseen movies liked along with theirs,
+        and popular movies without history.
+        """
+        url = reverse("movies-recommended")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(recommendations.reset)
+        model_path = os.path.join(directory.name, "recommendations.bin")
+
+        movies = {
+            title: baker.make(models.Movie, title=title, year=2000) for title in "ABCDE"
+        }
+        users = [User.objects.create_user(username=f"fan{n}") for n in range(3)]
+        user = users[2]
+        likes = {users[0]: "AB", users[1]: "ABD", user: "A"}
+        for fan, titles in likes.items():
+            for title in titles:
+                models.Rating.objects.create(user=fan, movie=movies[title], value=8)
+        models.Rating.objects.create(user=users[0], movie=movies["C"], value=9)
+        models.Rating.objects.create(user=users[1], movie=movies["E"], value=2)
+        models.Rating.objects.create(user=user, movie=movies["E"], value=3)
+
+        def recommended(fan, **params):
+            refresh = RefreshToken.for_user(fan)
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [payload["title"] for payload in response.data]
+
+        with self.settings(RECOMMENDATION_MODEL_PATH=model_path):
+            self.assertEqual(recommended(user), [])
+            open(model_path, "wb").close()
+            with self.assertLogs("api.recommendations", "ERROR") as logs:
+                self.assertEqual(recommended(user), [])
+                self.assertEqual(recommended(user), [])
+            self.assertEqual(len(logs.records), 1)
+            call_command("train_recommendations", stdout=io.StringIO())
+
+            self.assertEqual(recommended(user), ["B", "C", "D"])
+            broken_path = os.path.join(directory.name, "broken.bin")
+            with open(broken_path, "wb") as file:
+                file.write(b"not a model")
+            os.replace(broken_path, model_path)
+            with self.assertLogs("api.recommendations", "ERROR"):
+                self.assertEqual(recommended(user), ["B", "C", "D"])
+            call_command("train_recommendations", stdout=io.StringIO())
+            self.assertEqual(recommended(user, limit=1), ["B"])
+            self.assertEqual(recommended(self.admin_user), ["A", "B", "C", "D"])
+
+            movies["C"].delete()
+            self.assertEqual(recommended(self.admin_user), ["A", "B", "D"])
+            self.assertEqual(recommended(user), ["B", "D"])
+            self.client.put(f"{reverse('movies-list')}/{movies['B'].id}/favorite")
+            self.assertEqual(recommended(user), ["D"])
+
+            self.assertEqual(recommendations.train(), (3, 3))
+            model = recommendations.get_model()
+            neighbor_ids, scores = model.neighbors(movies["A"].id)
+            self.assertEqual(list(neighbor_ids), [movies["B"].id, movies["D"].id])
+            self.assertAlmostEqual(scores[1], 0.57735, places=5)
+
+    def test_autocomplete(self):
+        """
+        Ensure titles and actors are suggested by prefix, most popular first.
+        """
+        url = reverse("movies-autocomplete")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.client.get(url, {"q": "the"})
+        self.client.post(
+            reverse("movies-bulk-load"),
+            [
+                {**NEW_MOVIE, "title": "The Heist", "ratings": [1], "actors": []},
+                {**NEW_MOVIE, "title": "Heat", "ratings": [1, 2], "actors": []},
+                {
+                    **NEW_MOVIE,
+                    "title": "Théâtre",
+                    "ratings": [],
+                    "actors": ["Heather Doe"],
+                },
+            ],
+        )
+
+        response = self.client.get(url, {"q": "HE"})
+        self.assertEqual(
+            [title["name"] for title in response.data["titles"]], ["Heat", "The Heist"]
+        )
+        self.assertEqual(
+            [actor["name"] for actor in response.data["actors"]], ["Heather Doe"]
+        )
+
+        response = self.client.get(url, {"q": "the", "limit": 1})
+        self.assertEqual(
+            [title["name"] for title in response.data["titles"]], ["The Heist"]
+        )
+
+        movie = models.Movie.objects.get(title="Théâtre")
+        with run_on_commit():
+            self.client.put(f"{reverse('movies-list')}/{movie.id}/favorite")
+            self.client.put(f"{reverse('movies-list')}/{movie.id}/rate", {"rate": 5})
+        response = self.client.get(url, {"q": "the"})
+        self.assertEqual(
+            [title["name"] for title in response.data["titles"]],
+            ["Théâtre", "The Heist"],
+        )
+
+    def test_filter_movies(self):
+        """
+        Ensure genre, actor, year and rating filters can be combined.
+        """
+        url = reverse("movies-list")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.client.get(url, {"genre": "Action"})
+        self.client.post(
+            reverse("movies-bulk-load"),
+            [
+                {**NEW_MOVIE, "title": "A", "genres": ["Action"], "year": "1990"},
+                {**NEW_MOVIE, "title": "B", "genres": ["Action", "Drama"]},
+                {**NEW_MOVIE, "title": "C", "genres": ["Drama"], "actors": ["X"]},
+                {**NEW_MOVIE, "title": "D", "genres": [], "imdbRating": "7.5"},
+            ],
+        )
+
+        def titles(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [movie["title"] for movie in response.data["results"]]
+
+        self.assertEqual(titles({"genre": "Action"}), ["A", "B"])
+        self.assertEqual(titles({"genre": "Action,Drama"}), ["A", "B", "C"])
+        self.assertEqual(
+            titles({"genre": ["Action", "Drama"], "genre_match": "all"}), ["B"]
+        )
+        self.assertEqual(titles({"actor": "X"}), ["C"])
+        self.assertEqual(
+            titles({"actor": ["Actor 1", "Actor 2"], "actor_match": "all"}),
+            ["A", "B", "D"],
+        )
+        self.assertEqual(titles({"year_max": 2000}), ["A"])
+        self.assertEqual(titles({"year_min": 2000, "genre": "Drama"}), ["B", "C"])
+        self.assertEqual(titles({"rating_min": 7, "rating_max": 8}), ["D"])
+        self.assertEqual(titles({"genre": "Unknown"}), [])
+
+        response = self.client.get(url, {"year_min": "soon"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_typed_columns(self):
+        """
+        Ensure typed columns keep their string formats and support range filters.
+        """
+        url = reverse("movies-list")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.client.post(
+            reverse("movies-bulk-load"),
+            [
+                {**NEW_MOVIE, "title": "A", "duration": "PT1H30M", "year": "1999"},
+                {**NEW_MOVIE, "title": "B", "duration": "PT2H", "releaseDate": ""},
+                {**NEW_MOVIE, "title": "C", "duration": "", "contentRating": "pg-13"},
+            ],
+        )
+
+        response = self.client.get(url)
+        movies = {movie["title"]: movie for movie in response.data["results"]}
+        self.assertEqual(movies["A"]["year"], "1999")
+        self.assertEqual(movies["A"]["duration"], "PT90M")
+        self.assertEqual(movies["A"]["release_date"], "2020-01-18")
+        self.assertEqual(movies["B"]["release_date"], "")
+        self.assertEqual(movies["C"]["duration"], "")
+        self.assertEqual(movies["C"]["content_rating"], "PG-13")
+
+        def titles(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [movie["title"] for movie in response.data["results"]]
+
+        self.assertEqual(titles({"duration_max": 100}), ["A"])
+        self.assertEqual(titles({"released_after": "2020-01-01"}), ["A", "C"])
+        self.assertEqual(titles({"ordering": "-duration"}), ["B", "A", "C"])
+        self.assertEqual(titles({"ordering": "year"}), ["A", "B", "C"])
+
+        baker.make(models.Movie, year=None, _quantity=6)
+        baker.make(models.Movie, year=2000, _quantity=6)
+        for ordering in ("year", "-year"):
+            ids = []
+            response = self.client.get(url, {"ordering": ordering, "cursor": ""})
+            while True:
+                ids += [movie["id"] for movie in response.data["results"]]
+                if not response.data["next"]:
+                    break
+                response = self.client.get(response.data["next"])
+            self.assertEqual(
+                sorted(ids), sorted(models.Movie.objects.values_list("id", flat=True))
+            )
+
+        response = self.client.post(
+            url, {**NEW_MOVIE, "title": "D", "duration": "100 minutes"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Legacy years and content ratings are still accepted.
+        legacy = {"year": "1890-1895", "contentRating": "Not Rated (Director's Cut)"}
+        response = self.client.post(url, {**NEW_MOVIE, "title": "E", **legacy})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {**NEW_MOVIE, "title": "F", "year": "n/a"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        movies = models.Movie.objects.filter(title__in=["E", "F"]).order_by("title")
+        self.assertEqual(
+            list(movies.values_list("year", "content_rating")),
+            [(1890, "Not Rated (Director's Cut)"), (None, "11")],
+        )
+
+    def test_leaderboards(self):
+        """
+        Ensure movies sort by ratings and favorites, and the leaderboards follow
+        the writes.
+        """
+        url = reverse("movies-list")
+        action = baker.make(models.Genre, name="Action")
+        drama = baker.make(models.Genre, name="Drama")
+        a = baker.make(models.Movie, title="A", imdb_rating=8.0, genres=[action])
+        b = baker.make(models.Movie, title="B", imdb_rating=9.0, genres=[action, drama])
+        c = baker.make(models.Movie, title="C", imdb_rating=7.0, genres=[drama])
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        def ordered(ordering):
+            response = self.client.get(url, {"ordering": ordering})
+            return [movie["title"] for movie in response.data["results"]]
+
+        def leaderboard(**params):
+            response = self.client.get(reverse("movies-leaderboard"), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [movie["title"] for movie in response.data]
+
+        self.assertEqual(ordered("-imdb_rating"), ["B", "A", "C"])
+        with self.settings(LEADERBOARD_SIZE=2):
+            self.assertEqual(leaderboard(by="imdb_rating"), ["B", "A"])
+            self.assertEqual(leaderboard(by="imdb_rating", genre="Drama"), ["B", "C"])
+            self.assertEqual(leaderboard(by="imdb_rating", genre="Horror"), [])
+            self.assertEqual(leaderboard(by="imdb_rating", limit=1), ["B"])
+            self.assertEqual(leaderboard(by="favorites_count"), ["A", "B"])
+            self.assertEqual(leaderboard(by="rating_mean"), [])
+
+            with run_on_commit():
+                self.client.put(f"{url}/{c.id}/favorite")
+            self.assertEqual(leaderboard(by="favorites_count"), ["C", "A"])
+            with run_on_commit():
+                self.client.put(f"{url}/{c.id}/rate", {"rate": 6})
+                self.client.put(f"{url}/{a.id}/rate", {"rate": 9})
+            self.assertEqual(leaderboard(by="rating_mean"), ["A", "C"])
+            # Full boards of unchanged metrics are kept.
+            self.assertIn(("imdb_rating", None), leaderboards._index.boards)
+
+            models.Movie.objects.filter(id=a.id).update(imdb_rating=9.5)
+            leaderboards.update_movies([a.id])
+            self.assertIn(("imdb_rating", None), leaderboards._index.boards)
+            self.assertEqual(leaderboard(by="imdb_rating"), ["A", "B"])
+            models.Movie.objects.filter(id=a.id).update(imdb_rating=6.0)
+            leaderboards.update_movies([a.id])
+            self.assertNotIn(("imdb_rating", None), leaderboards._index.boards)
+            self.assertEqual(leaderboard(by="imdb_rating"), ["B", "C"])
+            models.Movie.objects.filter(id=a.id).update(imdb_rating=8.0)
+            leaderboards.update_movies([a.id])
+
+            self.client.delete(f"{url}/{b.id}")
+            self.assertEqual(leaderboard(by="imdb_rating"), ["A", "C"])
+            self.assertEqual(leaderboard(by="imdb_rating", genre="Drama"), ["C"])
+
+        self.assertEqual(ordered("-favorites_count"), ["C", "A"])
+        with run_on_commit():
+            self.client.delete(f"{url}/{c.id}/favorite")
+        self.assertEqual(ordered("-favorites_count"), ["A", "C"])
+        self.assertEqual(ordered("rating_mean"), ["C", "A"])
+
+        response = self.client.get(reverse("movies-leaderboard"), {"by": "title"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_movie_facets(self):
+        """
+        Ensure facet counts follow the search and filters.
+        """
+        url = reverse("movies-facets")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.client.post(
+            reverse("movies-bulk-load"),
+            [
+                {**NEW_MOVIE, "title": "Heat", "genres": ["Action"], "year": "1995"},
+                {**NEW_MOVIE, "title": "Heist", "genres": ["Action", "Drama"]},
+                {**NEW_MOVIE, "title": "Up", "genres": ["Drama"], "contentRating": "L"},
+            ],
+        )
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(
+            response.data["genres"],
+            [{"value": "Action", "count": 2}, {"value": "Drama", "count": 2}],
+        )
+        self.assertEqual(
+            response.data["decades"],
+            [{"value": 1990, "count": 1}, {"value": 2020, "count": 2}],
+        )
+        self.assertEqual(
+            response.data["content_ratings"],
+            [{"value": "11", "count": 2}, {"value": "L", "count": 1}],
+        )
+
+        response = self.client.get(url, {"q": "hea", "genre": "Action"})
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["years"], [{"value": 1995, "count": 1}])
+
+    def test_cursor_pagination(self):
+        """
+        Ensure we can walk movie lists and search results with cursors.
+        """
+        url = reverse("movies-list")
+
+        movies = baker.make(models.Movie, title=seq("Movie "), _quantity=25)
+        search.index_movies([movie.id for movie in movies])
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        for params in ({"cursor": ""}, {"cursor": "", "q": "movie"}):
+            ids = []
+            response = self.client.get(url, params)
+            while True:
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotIn("total_pages", response.data)
+                ids += [movie["id"] for movie in response.data["results"]]
+                if not response.data["next"]:
+                    break
+                response = self.client.get(response.data["next"])
+
+            self.assertEqual(sorted(ids), [movie.id for movie in movies])
+            self.assertEqual(len(ids), len(set(ids)))
+
+        response = self.client.get(url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_movie_cache(self):
+        """
+        Ensure cached movie payloads are shared and invalidated by the write paths.
+        """
+        url = reverse("movies-list")
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        movie_id = self.client.post(url, NEW_MOVIE).data["id"]
+        self.client.put(f"{url}/{movie_id}/rate", {"rate": 7})
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["results"][0]["user_rate"], 7)
+
+        models.Movie.objects.filter(id=movie_id).update(title="Stale")
+        other_user = User.objects.create_user(username="other", password="other")
+        refresh = RefreshToken.for_user(other_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        response = self.client.get(url)
+        self.assertEqual(response.data["results"][0]["title"], NEW_MOVIE["title"])
+        self.assertEqual(response.data["results"][0]["user_rate"], None)
+
+        self.client.put(f"{url}/{movie_id}/rate", {"rate": 3})
+        response = self.client.get(f"{url}/{movie_id}")
+        self.assertEqual(response.data["title"], "Stale")
+        self.assertEqual(response.data["rating_summary"]["count"], 3)
+
+        self.client.put(f"{url}/{movie_id}", {**NEW_MOVIE, "title": "Fresh"})
+        self.client.post(url, {**NEW_MOVIE, "title": "Second"})
+        response = self.client.get(url)
+        titles = [movie["title"] for movie in response.data["results"]]
+        self.assertEqual(titles, ["Fresh", "Second"])
+
+        self.client.delete(f"{url}/{movie_id}")
+        response = self.client.get(f"{url}/{movie_id}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_conditional_movie_detail(self):
+        """
+        Ensure unchanged movies are answered with 304 before being serialized.
+        """
+        url = reverse("movies-list")
+
+        movie = baker.make(models.Movie)
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        response = self.client.get(f"{url}/{movie.id}")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{url}/{movie.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any("api_actor" in query["sql"] for query in queries))
+
+        response = self.client.get(
+            f"{url}/{movie.id}", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        for write in (
+            lambda: self.client.put(f"{url}/{movie.id}/favorite"),
+            lambda: self.client.put(f"{url}/{movie.id}/rate", {"rate": 5}),
+        ):
+            write()
+            response = self.client.get(f"{url}/{movie.id}", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response["ETag"], etag)
+            etag = response["ETag"]
+
+        self.assertIn("Authorization", response["Vary"])
+        self.assertIn("private", response["Cache-Control"])
+        # The ETag tells users apart, as the body carries their rate.
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        response = self.client.get(f"{url}/{movie.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["user_rate"])
+
+        # A write of another process bumps the version: the payload cached by
+        # this process is not served under the new ETag.
+        models.Movie.objects.filter(id=movie.id).update(
+            title="Renamed", version=F("version") + 1
+        )
+        response = self.client.get(f"{url}/{movie.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data["title"], "Renamed")
+
     def test_create_movie(self):
         """
         Ensure we can create a new movie object.
@@ -137,6 +843,152 @@ class MovieTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(self.active_user.movie_set.count(), 0)
 
+    def test_favorites_list(self):
+        """
+        Ensure the favorites list follows favorite writes, by page or by cursor.
+        """
+        url = reverse("movies-list")
+
+        movies = baker.make(models.Movie, _quantity=12)
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        for movie in reversed(movies):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.put(f"{url}/{movie.id}/favorite")
+            updates = [
+                query["sql"]
+                for query in queries
+                if query["sql"].startswith('UPDATE "api_movie"')
+            ]
+            self.assertEqual(len(updates), 1)
+            self.assertIn('SET "favorites_count" = COALESCE', updates[0])
+            self.assertNotIn('"version"', updates[0])
+        self.client.delete(f"{url}/{movies[0].id}/favorite")
+
+        expected = [movie.id for movie in movies[1:]]
+        response = self.client.get(f"{url}/favorites")
+        self.assertEqual(response.data["total_pages"], 2)
+        response = self.client.get(f"{url}/favorites", {"page": 2})
+        self.assertEqual(
+            [movie["id"] for movie in response.data["results"]], expected[10:]
+        )
+
+        ids = []
+        response = self.client.get(f"{url}/favorites", {"cursor": ""})
+        while True:
+            ids += [movie["id"] for movie in response.data["results"]]
+            self.assertTrue(
+                all(movie["favorite"] for movie in response.data["results"])
+            )
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(ids, expected)
+
+        # The cache of another process still holds the array before a write.
+        key = favorites._key(self.active_user.id)
+        stale = cache.get(key)
+        favorites.remove(self.active_user.id, movies[1].id)
+        cache.set(key, stale)
+        response = self.client.get(f"{url}/favorites")
+        self.assertEqual(
+            [movie["id"] for movie in response.data["results"]], expected[1:]
+        )
+
+    def test_batch_operations(self):
+        """
+        Ensure batches of ratings and favorites are applied in order with few queries.
+        """
+        url = reverse("movies-list")
+
+        movies = baker.make(models.Movie, _quantity=3)
+        models.Rating.objects.create(movie=movies[0], user=self.active_user, value=3)
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"{url}/batch/rate",
+                [
+                    {"movieId": movies[0].id, "rate": 7},
+                    {"movieId": movies[1].id, "rate": 5},
+                    {"movieId": movies[2].id, "rate": 4},
+                    {"movieId": movies[2].id, "rate": None},
+                    {"movieId": 0, "rate": 1},
+                ],
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["updated", "created", "created", "deleted", "not_found"],
+        )
+        self.assertLess(len(queries), 15)
+        self.assertEqual(
+            dict(self.active_user.ratings.values_list("movie_id", "value")),
+            {movies[0].id: 7, movies[1].id: 5},
+        )
+        self.assertEqual(models.Movie.objects.get(id=movies[0].id).rating_mean, 7)
+
+        # A rating created by another writer after the read is read again and
+        # updated, not inserted twice.
+        committed = rates._committed
+
+        def racing(keys):
+            if racing.first:
+                racing.first = False
+                return {}
+            return committed(keys)
+
+        racing.first = True
+        with mock.patch.object(rates, "_committed", racing):
+            rates.write({(self.active_user.id, movies[0].id): 2})
+        self.assertEqual(self.active_user.ratings.get(movie=movies[0]).value, 2)
+        movie = models.Movie.objects.get(id=movies[0].id)
+        self.assertEqual((movie.rating_count, movie.rating_mean), (1, 2))
+
+        response = self.client.post(
+            f"{url}/batch/favorite",
+            [
+                {"movieId": movies[0].id, "favorite": True},
+                {"movieId": movies[1].id, "favorite": True},
+                {"movieId": movies[1].id, "favorite": False},
+                {"movieId": movies[2].id, "favorite": False},
+                {"movieId": 0, "favorite": True},
+            ],
+        )
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["added", "added", "removed", "unchanged", "not_found"],
+        )
+        response = self.client.get(f"{url}/favorites")
+        self.assertEqual(
+            [movie["id"] for movie in response.data["results"]], [movies[0].id]
+        )
+
+        # Decisions follow the database, not a cached array that lags behind.
+        current = favorites.get(self.active_user.id)
+        cache.set(
+            favorites._key(self.active_user.id),
+            (current.version, current.changed_at, array.array("q", [movies[2].id])),
+        )
+        response = self.client.post(
+            f"{url}/batch/favorite",
+            [
+                {"movieId": movies[0].id, "favorite": False},
+                {"movieId": movies[2].id, "favorite": True},
+            ],
+        )
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["removed", "added"],
+        )
+        self.assertEqual(
+            set(self.active_user.movie_set.values_list("id", flat=True)),
+            {movies[2].id},
+        )
+
     def test_rate_movie(self):
         """
         Ensure we can rate a movie
@@ -153,6 +1005,59 @@ class MovieTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(self.active_user.ratings.count(), 1)
 
+    def test_write_behind_ratings(self):
+        """
+        Ensure write-behind ratings are served before being flushed, then coalesced.
+        """
+        url = reverse("movies-list")
+
+        movie, other = baker.make(models.Movie, _quantity=2)
+        models.Rating.objects.create(movie=movie, user=self.active_user, value=2)
+        aggregates.rebuild([movie.id])
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        with tempfile.TemporaryDirectory() as log_dir, self.settings(
+            RATING_WRITE_BEHIND=True,
+            RATING_LOG_DIR=log_dir,
+            RATING_FLUSH_INTERVAL=3600,
+        ):
+            for rate in (9, 8):
+                response = self.client.put(f"{url}/{movie.id}/rate", {"rate": rate})
+                self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertEqual(self.active_user.ratings.get().value, 2)
+
+            response = self.client.get(f"{url}/{movie.id}")
+            self.assertEqual(response.data["user_rate"], 8)
+            self.assertEqual(response.data["rating_summary"]["mean"], 8)
+
+            # Logs of dead processes are replayed as well, but never over a
+            # rating given after their entries.
+            third = baker.make(models.Movie)
+            rates.apply(self.active_user.id, [(third.id, 6)])
+            orphan = os.path.join(log_dir, "ratings-999999999.log")
+            with open(orphan, "w") as log:
+                for movie_id, rate in ((other.id, 5), (third.id, 1)):
+                    entry = [self.active_user.id, movie_id, rate, time.time() - 60]
+                    log.write(json.dumps(entry) + "\n")
+
+            rate_log.flush()
+            self.assertEqual(os.listdir(log_dir), [])
+            # An orphan claimed by another process in the meantime is skipped.
+            open(orphan, "w").close()
+            with mock.patch("os.rename", side_effect=FileNotFoundError):
+                self.assertEqual(rate_log.flush(), set())
+            os.remove(orphan)
+
+        self.assertEqual(
+            dict(self.active_user.ratings.values_list("movie_id", "value")),
+            {movie.id: 8, other.id: 5, third.id: 6},
+        )
+        response = self.client.get(f"{url}/{movie.id}")
+        self.assertEqual(response.data["user_rate"], 8)
+        self.assertEqual(response.data["rating_summary"]["histogram"][8], 1)
+
     def test_delete_rate_movie(self):
         """
         Ensure we can delete a movie rate
@@ -175,6 +1080,35 @@ class MovieTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(self.active_user.ratings.count(), 0)
 
+    def test_rating_summary(self):
+        """
+        Ensure the rating summary follows rate changes and raw ratings are opt-in
+        """
+        url = reverse("movies-list")
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        movie_id = self.client.post(url, {**NEW_MOVIE, "ratings": [2, 4]}).data["id"]
+
+        self.client.put(f"{url}/{movie_id}/rate", {"rate": 10})
+        self.client.put(f"{url}/{movie_id}/rate", {"rate": 6})
+        response = self.client.get(f"{url}/{movie_id}")
+        self.assertEqual(response.data["rating_summary"]["count"], 3)
+        self.assertEqual(response.data["rating_summary"]["mean"], 4.0)
+        self.assertEqual(
+            response.data["rating_summary"]["histogram"],
+            [0, 0, 1, 0, 1, 0, 1, 0, 0, 0, 0],
+        )
+        self.assertNotIn("ratings", response.data)
+
+        response = self.client.get(f"{url}/{movie_id}/ratings")
+        self.assertEqual(sorted(response.data["results"]), [2, 4, 6])
+
+        self.client.delete(f"{url}/{movie_id}/rate")
+        response = self.client.get(f"{url}/{movie_id}")
+        self.assertEqual(response.data["rating_summary"]["count"], 2)
+        self.assertEqual(response.data["rating_summary"]["mean"], 3.0)
+
     def test_bulk_load(self):
         """
         Ensure we can bulk load
@@ -188,12 +1122,404 @@ class MovieTestCase(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
         response = self.client.post(url, [first_movie, second_movie])
 
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"inserted": 2, "skipped": 0})
+        self.assertEqual(models.Movie.objects.count(), 2)
+
+        # A title created by another writer after the lookup is skipped too.
+        lookup = ingest._ids_by_field
+
+        def racing(model, field, values, batch_size):
+            if model is models.Movie and racing.first:
+                racing.first = False
+                return {}
+            return lookup(model, field, values, batch_size)
+
+        racing.first = True
+        third_movie = {**NEW_MOVIE, "title": "third-movie"}
+        with mock.patch.object(ingest, "_ids_by_field", racing):
+            response = self.client.post(url, [first_movie, third_movie])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"inserted": 1, "skipped": 1})
+        self.assertEqual(models.Movie.objects.count(), 3)
+
+    def test_bulk_load_matches_create(self):
+        """
+        Ensure bulk load skips known titles and reuses actors and genres like create
+        """
+        url = reverse("movies-bulk-load")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.client.post(reverse("movies-list"), NEW_MOVIE)
+
+        new_movie = {
+            **NEW_MOVIE,
+            "title": "Another Movie",
+            "actors": ["Actor 2", "Actor 3", "Actor 3"],
+            "ratings": [4, 4, 5],
+            "imdbRating": "",
+        }
+        response = self.client.post(url, [NEW_MOVIE, new_movie, new_movie])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"inserted": 1, "skipped": 2})
         self.assertEqual(models.Movie.objects.count(), 2)
+        self.assertEqual(models.Actor.objects.count(), 3)
+        self.assertEqual(models.Genre.objects.count(), 3)
+
+        movie = models.Movie.objects.get(title="Another Movie")
+        self.assertEqual(movie.imdb_rating, 0.0)
+        self.assertEqual(
+            sorted(movie.actors.values_list("name", flat=True)), ["Actor 2", "Actor 3"]
+        )
+        self.assertEqual(movie.genres.count(), 3)
+        self.assertEqual(
+            sorted(movie.ratings.values_list("value", flat=True)), [4, 4, 5]
+        )
+
+    def test_export_round_trip(self):
+        """
+        Ensure the NDJSON export can be bulk loaded back
+        """
+        url = reverse("movies-export")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        movies = [
+            {**NEW_MOVIE, "title": f"Movie {index}", "ratings": [index, 2]}
+            for index in range(3)
+        ]
+        self.client.post(reverse("movies-bulk-load"), movies)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        records = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            [record["title"] for record in records], ["Movie 0", "Movie 1", "Movie 2"]
+        )
+        self.assertEqual(records[1]["ratings"], [1, 2])
+        self.assertEqual(records[1]["ratingSummary"]["mean"], 1.5)
+
+        models.Movie.objects.all().delete()
+        response = self.client.post(reverse("movies-bulk-load"), records)
+        self.assertEqual(response.data, {"inserted": 3, "skipped": 0})
+
+        response = self.client.get(url, {"output": "csv"})
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual(
+            [row["title"] for row in rows], ["Movie 0", "Movie 1", "Movie 2"]
+        )
+        self.assertEqual(rows[1]["genres"], "Action|Comedy|Crime")
+        self.assertEqual(rows[1]["ratings"], "1|2")
+        self.assertEqual(rows[1]["ratingMean"], "1.5")
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AsyncReadTestCase(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.reset()
+        leaderboards.reset()
+        autocomplete.reset()
+
+        self.active_user = User.objects.create_user(
+            username="active", email="active@active.com", password="active"
+        )
+
+    def test_async_reads_match_sync_reads(self):
+        """
+        Ensure the async read endpoints answer like the sync ones.
+        """
+        movies = baker.make(models.Movie, _quantity=3)
+        movies[0].genres.add(baker.make(models.Genre))
+        movies[1].user_favorites.add(self.active_user)
+        models.Rating.objects.create(movie=movies[1], user=self.active_user, value=8)
+
+        refresh = RefreshToken.for_user(self.active_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+        for sync_url, async_url in (
+            (reverse("movies-list"), reverse("async-movies-list")),
+            (reverse("movies-favorites"), reverse("async-movies-favorites")),
+            (
+                reverse("movies-detail", args=[movies[1].id]),
+                reverse("async-movies-detail", args=[movies[1].id]),
+            ),
+            (reverse("genres-list"), reverse("async-genres-list")),
+        ):
+            sync_response = self.client.get(sync_url)
+            async_response = self.client.get(async_url)
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+        for sync_url, async_url in (
+            (reverse("movies-list"), reverse("async-movies-list")),
+            (reverse("movies-favorites"), reverse("async-movies-favorites")),
+        ):
+            params = {"fields": "title,genres,favorite"}
+            sync_response = self.client.get(sync_url, params)
+            async_response = self.client.get(async_url, params)
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+        response = self.client.get(reverse("async-movies-detail", args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.credentials()
+        response = self.client.get(reverse("async-movies-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ImportMoviesTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as file:
+            file.write(content)
+        return path
+
+    def import_movies(self, path, **options):
+        output = io.StringIO()
+        call_command("import_movies", path, stdout=output, **options)
+        return output.getvalue()
+
+    def titles(self):
+        return set(models.Movie.objects.values_list("title", flat=True))
+
+    def test_import_json_array(self):
+        """
+        Ensure valid records are imported and invalid ones rejected one by one.
+        """
+        records = [
+            NEW_MOVIE,
+            {**NEW_MOVIE, "title": "Amélie"},
+            {**NEW_MOVIE, "title": "Unrated", "averageRating": "high"},
+            NEW_MOVIE,
+        ]
+        path = self.write("movies.json", json.dumps(records, ensure_ascii=False))
+
+        output = self.import_movies(path, workers=0, batch_size=3)
+
+        self.assertEqual(self.titles(), {"Testing Movie", "Amélie"})
+        self.assertIn("4 read, 2 imported, 1 skipped, 1 rejected", output)
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+        with open(f"{path}.rejects.ndjson") as rejects:
+            (reject,) = [json.loads(line) for line in rejects]
+        self.assertEqual(reject["record"], 2)
+        self.assertIn("average_rating", reject["errors"])
+        self.assertEqual(reject["data"]["title"], "Unrated")
+
+    def test_resume_ndjson(self):
+        """
+        Ensure an import resumes after the last checkpointed record.
+        """
+        lines = [
+            json.dumps({**NEW_MOVIE, "title": f"Movie {number}"}) for number in range(4)
+        ]
+        path = self.write("movies.ndjson", "\n".join([*lines, "{oops", ""]))
+
+        records = importer.iter_records(path)
+        _, offset = next(itertools.islice(records, 1, None))
+        checkpoint = importer.Checkpoint(f"{path}.checkpoint", path)
+        checkpoint.counts.update(read=2, imported=2)
+        checkpoint.save(offset, rejects_offset=0)
+        # Written by the interrupted run after its last checkpoint.
+        self.write("movies.ndjson.rejects.ndjson", '{"record": 4}\n')
+
+        output = self.import_movies(path, workers=2, batch_size=1)
+
+        self.assertIn("Resuming", output)
+        self.assertEqual(self.titles(), {"Movie 2", "Movie 3"})
+        self.assertIn("5 read, 4 imported, 0 skipped, 1 rejected", output)
+        with open(f"{path}.rejects.ndjson") as rejects:
+            (reject,) = [json.loads(line) for line in rejects]
+        self.assertEqual(reject["record"], 4)
+        self.assertEqual(reject["data"], "{oops")
+
+        checkpoint.save(offset)
+        with open(path, "a") as file:
+            file.write(lines[0] + "\n")
+        with self.assertRaises(CommandError):
+            self.import_movies(path, workers=0)
+
+    def test_stream_json_array(self):
+        """
+        Ensure array elements are found across read chunks, from any offset.
+        """
+        records = [{"title": "Ça", "n": 1}, {"title": "B" * 20}, 12345, []]
+        path = self.write(
+            "values.json", " [\n" + " ,\n".join(map(json.dumps, records)) + "]"
+        )
+
+        with mock.patch.object(importer, "CHUNK_SIZE", 4):
+            read = list(importer.iter_records(path))
+            self.assertEqual([record for record, _ in read], records)
+            resumed = importer.iter_records(path, read[1][1])
+            self.assertEqual([record for record, _ in resumed], records[2:])
+
+        path = self.write("broken.json", '[{"title": "A"}, {"title": ]')
+        with self.assertRaises(importer.ImportFileError):
+            list(importer.iter_records(path))
+
+
+class BenchmarkTestCase(TestCase):
+    SIZES = {
+        "movies": 60,
+        "actors": 120,
+        "genres": 6,
+        "users": 10,
+        "ratings": 300,
+        "favorites": 60,
+    }
+
+    def setUp(self):
+        cache.clear()
+        catalog.reset()
+        autocomplete.reset()
+        leaderboards.reset()
+
+    def test_endpoints_within_budgets(self):
+        """
+        Ensure every scenario stays within its query budget.
+        """
+        seeded = benchmark.seed_catalog(self.SIZES)
+        self.assertEqual(len(seeded.movie_ids), 60)
+        self.assertEqual(models.Rating.objects.count(), 300)
+        self.assertEqual(
+            sum(models.Movie.objects.values_list("favorites_count", flat=True)), 60
+        )
+
+        results = benchmark.run(seeded, iterations=3, warmup=1)
+        self.assertEqual(benchmark.check(results, latency=False), [])
+        self.assertTrue(all(len(result.latencies) == 3 for result in results))
+
+        # An extra query per movie, as a serializer reading a relation would do.
+        serialize_movies = views.MovieViewSet.serialize_movies
+
+        def one_query_per_movie(view, movie_ids):
+            for movie_id in movie_ids:
+                models.Movie.objects.filter(id=movie_id).exists()
+            return serialize_movies(view, movie_ids)
+
+        scenarios = [benchmark.SCENARIOS[0]]
+        with mock.patch.object(
+            views.MovieViewSet, "serialize_movies", one_query_per_movie
+        ):
+            results = benchmark.run(seeded, scenarios, iterations=2, warmup=0)
+        failures = benchmark.check(results, latency=False)
+        self.assertEqual(len(failures), 1)
+        self.assertIn("over the budget of", failures[0])
+
+    def test_benchmark_command_baseline(self):
+        """
+        Ensure the command reports every scenario and fails over its baseline.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "baseline.json")
+        options = [f"--{size}={count}" for size, count in self.SIZES.items()]
+        options += ["--iterations=2", "--warmup=0", "--scenario=detail"]
+
+        output = io.StringIO()
+        call_command("benchmark_endpoints", *options, save_baseline=path, stdout=output)
+        self.assertIn("detail", output.getvalue())
+        self.assertFalse(models.Movie.objects.exists())
+
+        with open(path) as file:
+            baseline = json.load(file)
+        self.assertEqual(
+            set(baseline["detail"]),
+            {"p50_ms", "p95_ms", "p99_ms", "throughput", "queries"},
+        )
+        baseline["detail"]["p95_ms"] = 0.001
+        with open(path, "w") as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, "times the baseline"):
+            call_command(
+                "benchmark_endpoints", *options, baseline=path, stdout=io.StringIO()
+            )
+
+
+class UniqueKeysMigrationTestCase(TransactionTestCase):
+    before = [("api", "0007_movie_typed_columns")]
+    after = [("api", "0008_unique_natural_keys")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        """
+        Ensure the migration keeps the oldest of each duplicated name or title.
+        """
+        apps = self.migrate(self.before)
+        Actor = apps.get_model("api", "Actor")
+        Movie = apps.get_model("api", "Movie")
+        Rating = apps.get_model("api", "Rating")
+
+        actors = [Actor.objects.create(name="Jane Doe") for _ in range(2)]
+        movies = [
+            Movie.objects.create(title="Heist", average_rating=0, imdb_rating=0)
+            for _ in range(2)
+        ]
+        for movie, value in zip(movies, [4, 6]):
+            movie.actors.add(*actors)
+            Rating.objects.create(movie=movie, value=value)
+
+        apps = self.migrate(self.after)
+        Actor = apps.get_model("api", "Actor")
+        Movie = apps.get_model("api", "Movie")
+
+        self.assertEqual(
+            list(Actor.objects.values_list("id", flat=True)), [actors[0].id]
+        )
+        movie = Movie.objects.get()
+        self.assertEqual(movie.id, movies[0].id)
+        self.assertEqual(
+            list(movie.actors.values_list("id", flat=True)), [actors[0].id]
+        )
+        self.assertEqual(movie.ratings.count(), 2)
+        self.assertEqual(movie.rating_count, 2)
+        self.assertEqual(movie.rating_mean, 5)
+
+    def test_natural_keys_use_indexes(self):
+        """
+        Ensure name and title lookups search the unique indexes.
+        """
+        querysets = [
+            models.Genre.objects.filter(name="Action"),
+            models.Actor.objects.filter(name__in=["Jane Doe", "John Doe"]),
+            models.Movie.objects.filter(title="Heist"),
+        ]
+        for queryset in querysets:
+            plan = queryset.explain()
+            self.assertIn("SEARCH", plan)
+            self.assertRegex(plan, r"USING (COVERING )?INDEX")
 
 
 class GenreTestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+
         self.admin_user = User.objects.create_superuser(
             username="admin", email="admin@admin.com", password="admin"
         )
@@ -225,8 +1551,48 @@ class GenreTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
 
+    def test_conditional_genres_list(self):
+        """
+        Ensure the genre list is revalidated against the genre version.
+        """
+        url = reverse("genres-list")
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(reverse("movies-bulk-load"), [NEW_MOVIE])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+
+class ActorTestCase(APITestCase):
+    def test_get_actors_list(self):
+        """
+        Ensure we can page through actors.
+        """
+        url = reverse("actors-list")
+
+        user = User.objects.create_user(username="active", password="active")
+        baker.make(models.Actor, _quantity=12)
+
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_pages"], 2)
+        self.assertEqual(len(response.data["results"]), 10)
+
 
 class AuthTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_register(self):
         """
         Ensure we can register
@@ -250,3 +1616,45 @@ class AuthTestCase(APITestCase):
 
         response = self.client.post(url, {"email": email, "password": password})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_claims_authentication(self):
+        """
+        Ensure authenticated requests use the cached user flags instead of loading
+        the user, and saving the user refreshes them.
+        """
+        url = reverse("movies-bulk-load")
+        email = "admin@test.com"
+        password = "123456"
+        user = User.objects.create_user(
+            username="admin", email=email, password=password, is_staff=True
+        )
+
+        response = self.client.post(
+            reverse("auth-login"), {"email": email, "password": password}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.client.post(url, [])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, [])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any("auth_user" in query["sql"] for query in queries))
+
+        # Tokens do not carry privileges: a demoted admin loses them at once.
+        user.is_staff = False
+        user.save()
+        response = self.client.post(url, [])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_active = False
+        user.save()
+        response = self.client.post(url, [])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Other processes only see changes made behind their back after the TTL.
+        User.objects.filter(id=user.id).update(is_active=True)
+        response = self.client.post(url, [])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        authentication.forget_user(user.id)
+        response = self.client.post(url, [])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
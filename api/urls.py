@@ -3,14 +3,26 @@ from rest_framework import routers
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
+from api import async_views
 from api import views
 
 router = routers.SimpleRouter(trailing_slash=False)
 router.register("auth", views.AuthViewSet, basename="auth")
 router.register("movies", views.MovieViewSet, basename="movies")
 router.register("genres", views.GenresViewSet, basename="genres")
+router.register("actors", views.ActorsViewSet, basename="actors")
 
 urlpatterns = [
     path("", include(router.urls)),
     path("auth/refresh", TokenRefreshView.as_view(), name="token_refresh"),
+    path("async/movies", async_views.movie_list, name="async-movies-list"),
+    path(
+        "async/movies/favorites",
+        async_views.movie_favorites,
+        name="async-movies-favorites",
+    ),
+    path(
+        "async/movies/<int:pk>", async_views.movie_detail, name="async-movies-detail"
+    ),
+    path("async/genres", async_views.genre_list, name="async-genres-list"),
 ]
\ No newline at end of file
@@ -1,11 +1,41 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from api import autocomplete
+from api import caching
+from api import catalog
+from api import conditional
+from api import export
+from api import favorites
+from api import leaderboards
 from api import models
+from api import rate_log
+from api import rates
+from api import recommendations
+from api import search
 from api import serializers
+from api import similarity
+from api.pagination import KeysetPagination, Pagination
+
+PAGINATION_PARAMS = {Pagination.page_query_param, KeysetPagination.cursor_query_param}
+# Query parameters that do not filter the movies of a page.
+REPRESENTATION_PARAMS = PAGINATION_PARAMS | serializers.FieldsetSerializer.PARAMS
+
+
+def batch_results(operations, statuses):
+    return {
+        "results": [
+            {"movie_id": movie_id, "status": result}
+            for (movie_id, _), result in zip(operations, statuses)
+        ]
+    }
 
 
 class MovieViewSet(viewsets.ModelViewSet):
@@ -19,16 +49,177 @@ class MovieViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = self.queryset
+        ordering = ["id"]
+
+        filters = serializers.MovieFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
 
         q = self.request.query_params.get("q")
         if q:
-            queryset = queryset.filter(title__icontains=q)
+            queryset = search.filter_queryset(queryset, q)
+            ordering = ["search_rank", "id"]
+
+        conditions = filters.to_index_conditions()
+        if conditions:
+            movie_ids = catalog.filter_movies(**conditions)
+            queryset = queryset.filter(catalog.id_filter(movie_ids))
+
+        duration_max = filters.validated_data.get("duration_max")
+        if duration_max is not None:
+            queryset = queryset.filter(duration__lte=duration_max * 60)
+
+        released_after = filters.validated_data.get("released_after")
+        if released_after:
+            queryset = queryset.filter(release_date__gt=released_after)
+
+        if "ordering" in filters.validated_data:
+            ordering = [filters.validated_data["ordering"], "id"]
+        return queryset.order_by(*ordering)
+
+    def movie_fields(self):
+        """
+        The sparse fieldset requested with ``fields`` / ``exclude``, or ``None``.
+        """
+        if not hasattr(self, "_movie_fields"):
+            fieldset = serializers.FieldsetSerializer(data=self.request.query_params)
+            fieldset.is_valid(raise_exception=True)
+            self._movie_fields = fieldset.to_fieldset()
+        return self._movie_fields
+
+    def movie_payloads(self, movie_ids, fields=None, versions=None):
+        """
+        ``MovieSerializer`` payloads of ``movie_ids`` from the shared movie cache,
+        built from the database on misses, or on cached payloads of other
+        ``versions`` (``{movie_id: version}``) if given.
+
+        With a sparse fieldset, misses only read the needed columns and
+        relations and, being partial, are not cached.
+        """
+
+        def load(missing_ids):
+            movies = self.queryset.filter(id__in=missing_ids)
+            return {
+                payload["id"]: payload
+                for payload in serializers.movie_rows(movies, fields)
+            }
+
+        payloads = caching.get_movie_payloads(
+            movie_ids, load, store=fields is None, versions=versions
+        )
+        payloads = serializers.select_fields(payloads, fields)
+        if fields is None or "rating_summary" in fields:
+            payloads = rate_log.with_pending_summaries(payloads)
+        return payloads
+
+    def serialize_movies(self, movie_ids, versions=None):
+        """
+        ``GetMovieSerializer`` payloads of ``movie_ids``, restricted to the
+        requested fields.
+        """
+        fields = self.movie_fields()
+        payloads = self.movie_payloads(movie_ids, fields, versions)
+        return serializers.with_user_state(payloads, self.request.user, fields)
+
+    def get_movie_id(self):
+        try:
+            return int(self.kwargs["pk"])
+        except ValueError:
+            raise Http404
+
+    def paginate_ids(self, queryset):
+        """
+        Movie ids of a page of ``queryset``, reading only the columns the
+        pagination needs.
+        """
+        columns = {field.name for field in models.Movie._meta.concrete_fields}
+        ordering = [field.lstrip("-") for field in queryset.query.order_by]
+        queryset = queryset.only(*(field for field in ordering if field in columns))
+        return [movie.id for movie in self.paginate_queryset(queryset)]
+
+    def list_page(self):
+        """
+        The paginated list response with movie ids as results, cached per query
+        unless ordered by a counter.
+        """
+
+        def load():
+            queryset = self.filter_queryset(self.get_queryset())
+            page_ids = self.paginate_ids(queryset)
+            return self.get_paginated_response(page_ids).data
+
+        ordering = self.request.query_params.get("ordering", "").lstrip("-")
+        if ordering in serializers.MovieFilterSerializer.COUNTER_ORDERINGS:
+            return load()
+        return caching.get_list_page(self.request, load)
+
+    def favorites_page(self):
+        """
+        Movie ids of a page of the user's favorites. Unfiltered pages are sliced
+        from the cached favorites array.
+        """
+        if set(self.request.query_params) <= REPRESENTATION_PARAMS:
+            user_favorites = favorites.of(self.request.user)
+            return self.paginator.paginate_ids(user_favorites.ids, self.request)
+
+        queryset = self.get_queryset().filter(user_favorites=self.request.user.id)
+        return self.paginate_ids(queryset)
+
+    def list(self, request):
+        page = self.list_page()
+        return Response({**page, "results": self.serialize_movies(page["results"])})
+
+    def movie_version(self, movie_id):
+        """
+        ``(version, updated_at)`` of a movie, or ``None`` if there is no such
+        movie.
+        """
+        return (
+            models.Movie.objects.filter(id=movie_id)
+            .values_list("version", "updated_at")
+            .first()
+        )
 
-        genre = self.request.query_params.get("genre")
-        if genre:
-            genres = models.Genre.objects.filter(name=genre)
-            queryset = queryset.filter(genres__in=genres)
-        return queryset.order_by("id")
+    def detail_validators(self, movie_id, version, updated_at):
+        """
+        ETag and Last-Modified of a ``retrieve`` response, from the movie
+        version and the state of the requesting user, whose ``user_rate`` and
+        ``favorite`` the response carries.
+        """
+        user_favorites = favorites.of(self.request.user)
+        pending = rate_log.pending_marker(movie_id)
+        favorite = movie_id in user_favorites
+        fields = self.movie_fields()
+        etag = conditional.etag(
+            self.request,
+            "movie",
+            movie_id,
+            version,
+            self.request.user.id,
+            favorite,
+            pending,
+            sorted(fields) if fields is not None else "*",
+        )
+        last_modified = max(updated_at, user_favorites.changed_at)
+        if pending:
+            last_modified = timezone.now()
+        return etag, last_modified
+
+    def retrieve(self, request, pk=None):
+        movie_id = self.get_movie_id()
+        row = self.movie_version(movie_id)
+        if row is None:
+            raise Http404
+        validators = self.detail_validators(movie_id, *row)
+
+        response = conditional.not_modified(request, *validators)
+        if response is None:
+            # Served at the version of the ETag, whatever this process cached.
+            payloads = self.serialize_movies([movie_id], {movie_id: row[0]})
+            if not payloads:
+                raise Http404
+            response = Response(payloads[0])
+        response = conditional.with_validators(response, *validators)
+        return conditional.private(response)
 
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -57,6 +248,42 @@ class MovieViewSet(viewsets.ModelViewSet):
 
         return Response(response_serializer.data)
 
+    def perform_create(self, serializer):
+        serializer.save()
+        movies = serializer.instance
+        if isinstance(movies, models.Movie):
+            movies = [movies]
+        catalog.update_movies([movie.id for movie in movies])
+        autocomplete.update_movies([movie.id for movie in movies])
+        leaderboards.update_movies([movie.id for movie in movies])
+        similarity.schedule([movie.id for movie in movies])
+        caching.invalidate_catalog()
+
+    def perform_update(self, serializer):
+        features = similarity.features_of([serializer.instance.id])
+        serializer.save()
+        catalog.update_movies([serializer.instance.id])
+        autocomplete.update_movies([serializer.instance.id])
+        leaderboards.update_movies([serializer.instance.id])
+        # Most updates leave the genres and actors, so the neighbors, alone.
+        if similarity.features_of([serializer.instance.id]) != features:
+            similarity.schedule([serializer.instance.id])
+        caching.invalidate_movies([serializer.instance.id])
+        caching.invalidate_catalog()
+
+    def perform_destroy(self, instance):
+        search.remove_movies([instance.id])
+        catalog.remove_movies([instance.id])
+        autocomplete.remove_movies([instance.id])
+        leaderboards.remove_movies([instance.id])
+        caching.invalidate_movies([instance.id])
+        favorites.forget_movie(instance.id)
+        # Read before the delete cascades to the lists naming the movie.
+        listing = similarity.referencing([instance.id])
+        instance.delete()
+        similarity.schedule([], stale=listing)
+        caching.invalidate_catalog()
+
     @action(
         detail=False, methods=["POST"], permission_classes=[permissions.IsAdminUser]
     )
@@ -67,52 +294,178 @@ class MovieViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
 
-        return Response({}, status=status.HTTP_204_NO_CONTENT)
+        inserted = len(serializer.instance)
+        return Response(
+            {
+                "inserted": inserted,
+                "skipped": len(serializer.validated_data) - inserted,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["GET"], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get("output", "ndjson")
+        if output not in export.FORMATS:
+            raise ValidationError({"output": f"Must be one of {list(export.FORMATS)}."})
+
+        content_type, stream = export.FORMATS[output]
+        response = StreamingHttpResponse(
+            stream(export.iter_movies()), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="movies.{output}"'
+        return response
 
     @action(detail=False, methods=["GET"])
-    def favorites(self, request):
-        queryset = self.get_queryset().filter(id__in=request.user.movie_set.all())
-        page = self.paginate_queryset(queryset)
-        serializer = serializers.GetMovieSerializer(
-            page, many=True, context={"request": request}
+    def autocomplete(self, request):
+        """
+        Most popular titles and actors starting with ``q`` (or one of its words).
+        """
+        params = serializers.AutocompleteSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            autocomplete.suggest(
+                params.validated_data["q"], params.validated_data["limit"]
+            )
         )
-        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["GET"])
+    def facets(self, request):
+        filters = serializers.MovieFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+
+        movie_ids = None
+        q = request.query_params.get("q")
+        if q:
+            # Read before taking the catalog lock.
+            movie_ids = set(
+                search.filter_queryset(self.queryset, q).values_list("id", flat=True)
+            )
+        return Response(
+            catalog.facets(filters.to_index_conditions() or {}, movie_ids)
+        )
+
+    @action(detail=False, methods=["GET"])
+    def leaderboard(self, request):
+        """
+        The best movies by a rating or their number of favorites, overall or
+        in a genre.
+        """
+        params = serializers.LeaderboardSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        movie_ids = leaderboards.top(
+            params.validated_data["by"],
+            params.validated_data.get("genre"),
+            params.validated_data["limit"],
+        )
+        return Response(self.serialize_movies(movie_ids))
+
+    @action(detail=False, methods=["GET"])
+    def favorites(self, request):
+        movie_ids = self.favorites_page()
+        return self.get_paginated_response(self.serialize_movies(movie_ids))
 
     @action(detail=True, methods=["PUT", "DELETE"])
     def favorite(self, request, pk=None):
         movie = self.get_object()
         if request.method == "PUT":
-            movie.user_favorites.add(self.request.user)
+            favorites.add(request.user.id, movie.id)
         else:
-            movie.user_favorites.remove(self.request.user)
+            favorites.remove(request.user.id, movie.id)
 
-        movie.save()
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=["PUT", "DELETE"])
     def rate(self, request, pk=None):
         movie = self.get_object()
-        
+
+        rate = None
         if request.method == "PUT":
             serializer = serializers.UserRateSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
+            rate = serializer.validated_data["rate"]
 
-            rates = self.request.user.ratings.filter(movie=movie)
-            if rates.exists():
-                rate = rates.get()
-                rate.value = serializer.validated_data["rate"]
-                rate.save()
-            else:
-                models.Rating.objects.create(
-                    movie=movie,
-                    user=request.user,
-                    value=serializer.validated_data["rate"],
-                )
+        if settings.RATING_WRITE_BEHIND:
+            rate_log.append(request.user.id, movie.id, rate)
         else:
-            self.request.user.ratings.filter(movie=movie).delete()
-
+            rates.apply(request.user.id, [(movie.id, rate)])
+            caching.invalidate_movies([movie.id])
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=["POST"], url_path="batch/rate")
+    def batch_rate(self, request):
+        """
+        Apply many ``{movieId, rate}`` operations (a null rate deletes).
+        """
+        serializer = serializers.RateOperationSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        operations = [(op["movie_id"], op["rate"]) for op in serializer.validated_data]
+        if settings.RATING_WRITE_BEHIND:
+            # Written after the ratings already accepted.
+            rate_log.flush()
+        statuses = rates.apply(request.user.id, operations)
+
+        caching.invalidate_movies(
+            {
+                movie_id
+                for (movie_id, _), result in zip(operations, statuses)
+                if result in rates.CHANGED
+            }
+        )
+        return Response(batch_results(operations, statuses), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["POST"], url_path="batch/favorite")
+    def batch_favorite(self, request):
+        """
+        Apply many ``{movieId, favorite}`` operations.
+        """
+        serializer = serializers.FavoriteOperationSerializer(
+            data=request.data, many=True
+        )
+        serializer.is_valid(raise_exception=True)
+
+        operations = [
+            (op["movie_id"], op["favorite"]) for op in serializer.validated_data
+        ]
+        statuses = favorites.apply(request.user.id, operations)
+        return Response(batch_results(operations, statuses), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["GET"])
+    def similar(self, request, pk=None):
+        """
+        The movies most like this one by genres and actors, best first.
+        """
+        params = serializers.SimilarSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        movie_id = self.get_movie_id()
+        movie_ids = similarity.similar_ids(movie_id, params.validated_data["limit"])
+        if not movie_ids and not models.Movie.objects.filter(id=movie_id).exists():
+            raise Http404
+        return Response(self.serialize_movies(movie_ids))
+
+    @action(detail=False, methods=["GET"])
+    def recommended(self, request):
+        """
+        Movies the user has not rated or favorited, picked from those liked by
+        the users who like the same movies.
+        """
+        params = serializers.RecommendedSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        movie_ids = recommendations.recommend(
+            request.user.id, params.validated_data["limit"]
+        )
+        return Response(self.serialize_movies(movie_ids))
+
+    @action(detail=True, methods=["GET"])
+    def ratings(self, request, pk=None):
+        movie = self.get_object()
+        page = self.paginate_queryset(movie.ratings.only("id", "value").order_by("id"))
+        return self.get_paginated_response([rating.value for rating in page])
+
 
 class GenresViewSet(viewsets.ModelViewSet):
     queryset = models.Genre.objects.all()
@@ -120,11 +473,22 @@ class GenresViewSet(viewsets.ModelViewSet):
     pagination_class = None
     http_method_names = ["head", "get"]
 
+    def list_validators(self):
+        genres = models.ResourceVersion.get("genre")
+        etag = conditional.etag(self.request, "genres", genres.version)
+        return etag, genres.updated_at
+
+    def list(self, request):
+        validators = self.list_validators()
+        response = conditional.not_modified(request, *validators)
+        if response is None:
+            response = super().list(request)
+        return conditional.with_validators(response, *validators)
+
 
 class ActorsViewSet(viewsets.ModelViewSet):
-    queryset = models.Actor.objects.all()
-    serializer_class = serializers.GetGenreSerializer
-    pagination_class = None
+    queryset = models.Actor.objects.order_by("name")
+    serializer_class = serializers.GetActorSerializer
     http_method_names = ["head", "get"]
 
 
@@ -157,4 +521,4 @@ class AuthViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        return Response(None, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(None, status=status.HTTP_204_NO_CONTENT)
@@ -39,7 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "corsheaders",
     "rest_framework",
-    "api",
+    "api.apps.ApiConfig",
 ]
 
 MIDDLEWARE = [
@@ -85,6 +85,46 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# Seconds before the in-memory catalog index (api.catalog) is rebuilt to pick
+# up writes made by other processes.
+CATALOG_INDEX_MAX_AGE = 300
+
+# Same for the title and actor autocomplete index (api.autocomplete).
+AUTOCOMPLETE_INDEX_MAX_AGE = 300
+
+# Same for the leaderboards (api.leaderboards), of LEADERBOARD_SIZE movies each.
+LEADERBOARD_MAX_AGE = 300
+LEADERBOARD_SIZE = 100
+
+# Seconds between the background updates of the similar movies of the movies
+# written (api.similarity).
+SIMILAR_MOVIES_FLUSH_INTERVAL = 5.0
+
+# Seconds the user flags read by api.authentication are cached.
+AUTH_USER_CHECK_TTL = 60
+
+# Write-behind mode of the rate endpoint (api.rate_log): accepted ratings are
+# logged to RATING_LOG_DIR and written every RATING_FLUSH_INTERVAL seconds.
+RATING_WRITE_BEHIND = False
+RATING_LOG_DIR = BASE_DIR / "rating-log"
+RATING_FLUSH_INTERVAL = 1.0
+
+# Item-item model of the recommended endpoint, written by
+# `manage.py train_recommendations` (api.recommendations).
+RECOMMENDATION_MODEL_PATH = BASE_DIR / "recommendations.bin"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -126,11 +166,11 @@ STATIC_URL = "/static/"
 # Django Rest Framework (DRF)
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_RENDERER_CLASSES": (
-        "djangorestframework_camel_case.render.CamelCaseJSONRenderer",
+        "api.renderers.CamelCaseJSONRenderer",
     ),
     "DEFAULT_PARSER_CLASSES": (
         "djangorestframework_camel_case.parser.CamelCaseJSONParser",